@@ -0,0 +1,89 @@
+"""
+Benchmark do codificador adaptativo contra os presets fixos antigos
+
+Compara, para uma foto, uma captura de tela (line art) e uma foto
+panorâmica, o que cada preset envia ao Gemini:
+- fixo: thumbnail + JPEG em qualidade fixa (384px q70 do /analisar,
+  256px q30 bilinear do /analisar-ultra)
+- adaptativo: adaptive_encoder.encode com ENCODER_PRESETS
+
+Mostra formato, dimensões, bytes, tokens estimados e tempo de
+codificação (mediana de N execuções).
+
+Uso:
+    python benchmarks/bench_adaptive_encoder.py [iteracoes]
+"""
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw
+from bench_quality_gate import make_scene
+from config import ENCODER_PRESETS
+from utils.adaptive_encoder import encode, estimate_image_tokens
+
+FIXED = {
+    "detalhado": {"size": (384, 384), "quality": 70, "resample": Image.Resampling.LANCZOS},
+    "ultra": {"size": (256, 256), "quality": 30, "resample": Image.Resampling.BILINEAR},
+}
+
+
+def make_screenshot(size=(1280, 800)):
+    """Captura de tela: fundo liso, texto e algumas caixas de cor sólida"""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, size[0], 40), fill=(40, 60, 120))
+    for i in range(28):
+        draw.text((24, 60 + i * 25), f"Item {i:02d}  Arquivo  Editar  Exibir  R$ {i * 3},90", fill="black")
+    draw.rectangle((640, 80, 1240, 720), outline=(0, 120, 200), width=4)
+    draw.ellipse((760, 200, 1120, 560), fill=(230, 180, 40), outline="black", width=3)
+    return image
+
+
+def fixed_encode(image, preset):
+    thumb = image.copy()
+    thumb.thumbnail(preset["size"], preset["resample"])
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="JPEG", quality=preset["quality"], optimize=True)
+    return {"format": "JPEG", "image": thumb, "data": buffer.getvalue()}
+
+
+def timed(function, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(times)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    scene = make_scene()
+    images = {
+        "foto": scene,
+        "captura_tela": make_screenshot(),
+        "panoramica": scene.resize((4000, 1000)),
+    }
+
+    print(f"{'imagem':<13} {'preset':<10} {'modo':<11} {'formato':<7} {'dimensões':>10} "
+          f"{'bytes':>7} {'tokens':>6} {'ms':>7}")
+    for name, image in images.items():
+        for preset, fixed in FIXED.items():
+            rows = [
+                ("fixo",) + timed(lambda: fixed_encode(image, fixed), iterations),
+                ("adaptativo",) + timed(lambda: encode(image, ENCODER_PRESETS[preset]), iterations),
+            ]
+            for mode, result, ms in rows:
+                width, height = result["image"].size
+                print(f"{name:<13} {preset:<10} {mode:<11} {result['format']:<7} {f'{width}x{height}':>10} "
+                      f"{len(result['data']):>7} {estimate_image_tokens((width, height)):>6} {ms:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark do modo câmera: quadros recebidos vs. chamadas ao Gemini
+
+Simula uma sessão de câmera a 5 quadros/s: a pessoa segura o celular
+parado diante de uma mesa (ruído do sensor e tremor de poucos pixels),
+alguém coloca um objeto na cena, depois a câmera vira para outro lado.
+Passa cada quadro por CameraSession.handle_frame com o Gemini trocado por
+um stub e compara o número de chamadas com o modo anterior (um POST ao
+/analisar-rapido por quadro). Também mede o custo da comparação por
+miniatura em cada quadro.
+
+Uso:
+    python benchmarks/bench_camera_gating.py [segundos] [quadros_por_segundo]
+"""
+import io
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+os.environ.setdefault("SHARED_CACHE_PATH", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageDraw
+import services.camera_service as camera_service
+from config import CAMERA_CONFIG
+from utils.image_payload import ImagePayload
+
+
+class StubResponse:
+    text = "Descrição simulada."
+    parts = [text]
+    candidates = [type("Candidate", (), {"finish_reason": 1, "safety_ratings": []})()]
+
+
+def make_scene(size, seed):
+    random.seed(seed)
+    noise = Image.effect_noise((size[0] // 16, size[1] // 16), 40).resize(size, Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient("L").resize(size)
+    image = Image.merge("RGB", (noise, gradient, noise))
+    draw = ImageDraw.Draw(image)
+    for _ in range(10):
+        x, y = random.randrange(size[0] - 200), random.randrange(size[1] - 200)
+        draw.rectangle((x, y, x + 180, y + 150), fill=tuple(random.randrange(256) for _ in range(3)),
+                       outline=(0, 0, 0), width=5)
+    return image
+
+
+def camera_frame(scene, shake):
+    """Quadro da câmera: tremor de até `shake` pixels e ruído do sensor"""
+    dx, dy = random.randint(-shake, shake), random.randint(-shake, shake)
+    frame = ImageChops.offset(scene, dx, dy)
+    noise = Image.merge("RGB", [Image.effect_noise(scene.size, 6)] * 3)
+    frame = ImageChops.add(frame, noise, 1, -128)
+    buffer = io.BytesIO()
+    frame.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    fps = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    size = (1280, 960)
+
+    # Relógio simulado: o limite por minuto conta o tempo da sessão, não o do benchmark
+    clock = [0.0]
+    camera_service.time = types.SimpleNamespace(time=lambda: clock[0], perf_counter=time.perf_counter)
+
+    calls = []
+    camera_service._call_gemini = lambda profile, contents, **kwargs: calls.append(profile) or StubResponse()
+
+    table = make_scene(size, 1)
+    with_object = table.copy()
+    ImageDraw.Draw(with_object).ellipse((350, 250, 850, 750), fill=(230, 200, 40), outline=(0, 0, 0), width=8)
+    other_side = make_scene(size, 2)
+
+    timeline = [(0.0, table), (seconds / 3, with_object), (2 * seconds / 3, other_side)]
+    session = camera_service.CameraSession()
+    gating_ms, narrations = [], []
+
+    for index in range(seconds * fps):
+        now = clock[0] = index / fps
+        scene = [image for start, image in timeline if start <= now][-1]
+        data = camera_frame(scene, shake=8)
+
+        start = time.perf_counter()
+        reference = session.reference
+        thumbnail = camera_service.frame_thumbnail(ImagePayload(data))
+        if reference is not None:
+            camera_service.scene_change(thumbnail, reference)
+        gating_ms.append((time.perf_counter() - start) * 1000)
+
+        for event in session.handle_frame(data):
+            if event["evento"] == "narracao":
+                narrations.append((round(now, 1), event["tipo"], event["mudanca"]))
+
+    frames = seconds * fps
+    print(f"sessão: {seconds}s a {fps} quadros/s ({frames} quadros), limiar {CAMERA_CONFIG['SCENE_CHANGE_THRESHOLD']}")
+    print(f"modo anterior (POST por quadro): {frames} chamadas ao Gemini")
+    print(f"modo câmera: {len(calls)} chamadas ao Gemini ({100 * (1 - len(calls) / frames):.1f}% a menos)")
+    print(f"narrações (s, tipo, mudança): {narrations}")
+    print(f"comparação por quadro: p50 {statistics.median(gating_ms):.2f} ms, "
+          f"p95 {statistics.quantiles(gating_ms, n=20)[-1]:.2f} ms")
+    print(f"contadores: {session.stats()}")
+
+
+if __name__ == "__main__":
+    main()
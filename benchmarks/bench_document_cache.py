@@ -0,0 +1,63 @@
+"""
+Benchmark do cache de resultados de documentos (utils/document_cache.py)
+
+Usa resultados de extract_text_from_pdf de PDFs sintéticos como valor e
+mede, num SQLite temporário:
+- tamanho em JSON vs. gravado (comprimido com zstd ou gzip);
+- tempo de set e de get (mediana), que é o custo de um hit, contra o
+  tempo de extrair o documento de novo (sem contar o Gemini, que leva
+  dezenas de segundos).
+
+Uso:
+    python benchmarks/bench_document_cache.py [iteracoes]
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_document_router import make_pdf
+from services.document_service import extract_text_from_pdf
+from utils.document_cache import DocumentResultCache, zstandard
+from utils.shared_cache import SQLiteCacheBackend
+
+
+def timed(function, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(times)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    directory = tempfile.mkdtemp()
+    cache = DocumentResultCache(SQLiteCacheBackend(os.path.join(directory, "documentos.sqlite3"),
+                                                   max_bytes=512 * 1024 * 1024))
+    print(f"compressão: {'zstd' if zstandard is not None else 'gzip'}")
+    print(f"{'páginas':>7} {'json bytes':>10} {'gravado':>9} {'taxa':>5} {'set ms':>7} {'get ms':>7} "
+          f"{'extração ms':>11}")
+    for pages in (5, 40, 200):
+        data = make_pdf(pages)
+        result, extract_ms = timed(lambda: extract_text_from_pdf(data), 3)
+        key = cache.key_for(data, "pdf", {"resumo": True, "imagens": True}, "bench")
+
+        _, set_ms = timed(lambda: cache.set(key, result), iterations)
+        (cached, _), get_ms = timed(lambda: cache.get(key), iterations)
+        assert cached == json.loads(json.dumps(result))
+
+        raw = len(json.dumps(result, ensure_ascii=False).encode("utf-8"))
+        stored = len(cache.backend.get(key)[0])
+        print(f"{pages:>7} {raw:>10} {stored:>9} {raw / stored:>5.1f} {set_ms:>7.2f} {get_ms:>7.2f} "
+              f"{extract_ms:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark do roteamento híbrido de PDF (local vs. Gemini)
+
+Gera PDFs sintéticos (só texto nativo, relatório com algumas páginas
+escaneadas e com figuras, documento todo escaneado) e mede, sem chamar
+o Gemini:
+- classificação: classify_pdf_page em todas as páginas;
+- extração local: _extract_pdf_page nas páginas de texto nativo;
+- bytes enviados: PDF só com as páginas remotas vs. o documento inteiro.
+Compare o tempo local por página com a latência do Gemini por página
+("tempo_economizado_ms_estimado" nas respostas de /documento/processar).
+
+Uso:
+    python benchmarks/bench_document_router.py [paginas]
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from PIL import Image
+from config import DOCUMENT_CONFIG
+from services.document_service import _extract_pdf_page, classify_pdf_page
+
+
+def make_pdf(pages, scanned=(), figures=()):
+    document = fitz.open()
+    for n in range(pages):
+        page = document.new_page()
+        if n in scanned:
+            noise = Image.effect_noise((1240, 1754), 40).convert("RGB")
+            buffer = io.BytesIO()
+            noise.save(buffer, "JPEG", quality=80)
+            page.insert_image(page.rect, stream=buffer.getvalue())
+            continue
+        page.insert_text((72, 60), f"Capítulo {n + 1}", fontsize=20)
+        for line in range(45):
+            page.insert_text((72, 90 + line * 15), f"Linha {line} da página {n + 1}: texto corrido de exemplo.",
+                             fontsize=11)
+        if n in figures:
+            chart = Image.linear_gradient("L").resize((600, 400)).convert("RGB")
+            buffer = io.BytesIO()
+            chart.save(buffer, "PNG")
+            page.insert_image(fitz.Rect(72, 420, 520, 720), stream=buffer.getvalue())
+    return document.tobytes()
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    cases = {
+        "texto": make_pdf(pages),
+        "relatorio": make_pdf(pages, scanned=range(0, pages, 10), figures=range(5, pages, 10)),
+        "escaneado": make_pdf(pages, scanned=range(pages)),
+    }
+
+    print(f"{'caso':<10} {'locais':>6} {'remotas':>7} {'classif ms':>10} {'local ms/pág':>12} "
+          f"{'bytes remotos':>13} {'bytes total':>11} {'rota':>10}")
+    for name, data in cases.items():
+        document = fitz.open(stream=data, filetype="pdf")
+
+        start = time.perf_counter()
+        routes = [classify_pdf_page(document.load_page(n))[0] for n in range(len(document))]
+        classify_ms = (time.perf_counter() - start) * 1000
+
+        local = [n for n, route in enumerate(routes) if route == "local"]
+        remote = [n for n, route in enumerate(routes) if route == "gemini"]
+
+        start = time.perf_counter()
+        for n in local:
+            _extract_pdf_page(document.load_page(n), n)
+        local_ms = (time.perf_counter() - start) * 1000
+
+        subset = fitz.open()
+        for n in remote:
+            subset.insert_pdf(document, from_page=n, to_page=n)
+        remote_bytes = len(subset.tobytes(garbage=3, deflate=True)) if remote else 0
+
+        whole = len(remote) / len(routes) > DOCUMENT_CONFIG['MAX_REMOTE_FRACTION']
+        print(f"{name:<10} {len(local):>6} {len(remote):>7} {classify_ms:>10.1f} "
+              f"{local_ms / max(len(local), 1):>12.2f} {remote_bytes:>13} {len(data):>11} "
+              f"{'inteiro' if whole else 'híbrida':>10}")
+
+
+if __name__ == "__main__":
+    main()
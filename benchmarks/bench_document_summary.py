@@ -0,0 +1,64 @@
+"""
+Benchmark do resumo map-reduce de documentos longos
+
+Gera PDFs sintéticos de vários tamanhos e, sem chamar o Gemini (cada
+chamada é simulada com uma latência fixa), mede:
+- cobertura: quanto do texto o resumo antigo (text_content[:15000])
+  enxergava vs. o map-reduce (todo o texto);
+- trechos, chamadas e tempo total com SUMMARY_CONCURRENCY chamadas em
+  paralelo;
+- reaproveitamento: chamadas ao resumir de novo depois de editar uma
+  linha no meio do documento (só o trecho editado e o reduce são refeitos).
+
+Uso:
+    python benchmarks/bench_document_summary.py [latencia_ms]
+"""
+import os
+import sys
+import time
+import types
+
+os.environ.setdefault("SUMMARY_CACHE_PATH", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_document_router import make_pdf
+from services import document_service
+from services.gemini_registry import gemini_registry
+
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 800) / 1000
+    calls = []
+
+    def fake_generate(profile, contents, **kwargs):
+        calls.append(len(contents))
+        time.sleep(latency)
+        return types.SimpleNamespace(text=f"Resumo simulado de {len(contents)} caracteres.")
+
+    gemini_registry.generate = fake_generate
+
+    print(f"{'páginas':>7} {'caracteres':>10} {'cobertura antiga':>16} {'trechos':>7} {'chamadas':>8} "
+          f"{'s':>6} {'após edição':>11}")
+    for pages in (5, 40, 200):
+        extracted = document_service.extract_text_from_pdf(make_pdf(pages))
+        text = extracted["text_content"]
+        headings = extracted["structure"]["headings"]
+        document_service.summary_cache.clear()
+
+        calls.clear()
+        start = time.perf_counter()
+        summary = document_service.generate_document_summary(text, headings)
+        elapsed = time.perf_counter() - start
+        first_calls = len(calls)
+
+        middle = f"Linha 10 da página {pages // 2 + 1}:"
+        calls.clear()
+        document_service.generate_document_summary(text.replace(middle, middle + " (editada)"), headings)
+
+        print(f"{pages:>7} {len(text):>10} {min(1.0, 15000 / len(text)):>16.0%} "
+              f"{summary['resumo_info']['trechos']:>7} {first_calls:>8} {elapsed:>6.2f} {len(calls):>11}")
+
+
+if __name__ == "__main__":
+    main()
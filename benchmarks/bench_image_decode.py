@@ -0,0 +1,126 @@
+"""
+Micro-benchmark da decodificação reduzida (draft) no ImageOptimizer
+
+Compara, para JPEGs de câmera em vários tamanhos, o caminho antigo
+(decodificação completa + LANCZOS/BILINEAR) com o atual
+(ImageOptimizer.encode_for_preset: draft + resample final) nos presets
+detalhado e rapido. O detalhado atual inclui a busca de qualidade do
+codificador adaptativo, que o ruído sintético força ao máximo. Cada caso
+roda num processo novo e o pico de RSS é lido de /proc/self/status
+(VmHWM), zerado antes da medição (Linux).
+
+Uso:
+    python benchmarks/bench_image_decode.py [repeticoes]
+"""
+import io
+import os
+import sys
+import time
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from utils.image_optimizer import ImageOptimizer
+
+SIZES = {
+    "2MP": (1600, 1200),
+    "8MP": (3264, 2448),
+    "12MP": (4032, 3024),
+    "24MP": (6000, 4000),
+}
+
+
+def make_jpeg(size):
+    """Foto sintética com ruído suficiente para não comprimir trivialmente"""
+    noise = Image.effect_noise(size, 64).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    image = Image.blend(noise, gradient, 0.5)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def legacy_detailed(content):
+    image = Image.open(io.BytesIO(content))
+    image.load()
+    image = image.resize(
+        _fit((512, 512), image.size), Image.Resampling.LANCZOS
+    )
+    image.save(io.BytesIO(), format="JPEG", quality=70, optimize=True)
+
+
+def legacy_fast(content):
+    image = Image.open(io.BytesIO(content))
+    image.load()
+    image = image.resize(_fit((256, 256), image.size), Image.Resampling.BILINEAR)
+    image.save(io.BytesIO(), format="JPEG", quality=70)
+
+
+def current_detailed(content):
+    ImageOptimizer.encode_for_preset(io.BytesIO(content), "detalhado")
+
+
+def current_fast(content):
+    ImageOptimizer.encode_for_preset(io.BytesIO(content), "rapido")
+
+
+def _fit(box, size):
+    ratio = min(box[0] / size[0], box[1] / size[1])
+    return max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio))
+
+
+CASES = {
+    "detalhado antes": legacy_detailed,
+    "detalhado depois": current_detailed,
+    "rapido antes": legacy_fast,
+    "rapido depois": current_fast,
+}
+
+
+def _rss_kb(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _reset_peak_rss():
+    # ru_maxrss é herdado do processo pai; o VmHWM pode ser zerado
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+
+def run_case(case, content, repeats, queue):
+    func = CASES[case]
+    func(content)  # aquece imports e codecs fora da medição
+
+    _reset_peak_rss()
+    baseline_rss = _rss_kb("VmRSS")
+    start = time.process_time()
+    for _ in range(repeats):
+        func(content)
+    cpu_ms = (time.process_time() - start) / repeats * 1000
+    peak_rss = _rss_kb("VmHWM")
+    queue.put((cpu_ms, (peak_rss - baseline_rss) / 1024))
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    ctx = mp.get_context("spawn")
+
+    print(f"{'entrada':<8} {'caso':<24} {'CPU ms/img':>11} {'pico RSS +MB':>13}")
+    for label, size in SIZES.items():
+        content = make_jpeg(size)
+        for case in CASES:
+            queue = ctx.Queue()
+            process = ctx.Process(target=run_case, args=(case, content, repeats, queue))
+            process.start()
+            cpu_ms, rss_mb = queue.get()
+            process.join()
+            print(f"{label:<8} {case:<24} {cpu_ms:>11.1f} {rss_mb:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
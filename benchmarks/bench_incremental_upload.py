@@ -0,0 +1,128 @@
+"""
+Benchmark do upload com decodificação incremental num uplink lento
+
+Entrega o corpo multipart de uma foto de câmera na velocidade de um uplink
+móvel e roda a etapa de recepção + encode_for_preset do /analisar-ultra
+dentro de um contexto de requisição Flask, comparando:
+- buffered: request.files lê o corpo inteiro antes do Image.open
+- incremental: receive_image decodifica cada trecho enquanto chega
+Mede o tempo entre o último byte entregue e a imagem comprimida pronta
+para o Gemini (o que o usuário espera depois do upload) e o pico de RSS
+(VmHWM, Linux), cada caso num processo novo.
+
+Uso:
+    python benchmarks/bench_incremental_upload.py [uplink_mbps] [megapixels]
+"""
+import io
+import os
+import sys
+import time
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK = 16 * 1024
+
+
+class UplinkStream:
+    """Entrega o corpo em trechos, no ritmo de uma conexão de `mbps` megabits/s"""
+
+    def __init__(self, body, mbps):
+        self.body = memoryview(body)
+        self.position = 0
+        self.seconds_per_byte = 8 / (mbps * 1_000_000)
+        self.last_byte_at = None
+
+    def read(self, size=-1):
+        if self.position >= len(self.body):
+            return b""
+        size = CHUNK if size is None or size < 0 else min(size, CHUNK)
+        chunk = bytes(self.body[self.position:self.position + size])
+        time.sleep(len(chunk) * self.seconds_per_byte)
+        self.position += len(chunk)
+        if self.position >= len(self.body):
+            self.last_byte_at = time.perf_counter()
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def make_body(megapixels):
+    from PIL import Image
+    from werkzeug.datastructures import FileStorage
+    from werkzeug.test import encode_multipart
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    size = (width, width * 3 // 4)
+    noise = Image.effect_noise((size[0] // 8, size[1] // 8), 60).resize(size)
+    gradient = Image.linear_gradient("L").resize(size)
+    buffer = io.BytesIO()
+    Image.merge("RGB", (noise, gradient, noise)).save(buffer, format="JPEG", quality=90)
+
+    boundary, body = encode_multipart({"imagem": FileStorage(io.BytesIO(buffer.getvalue()), "foto.jpg")})
+    return boundary, body
+
+
+def _rss_kb(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def receive_and_compress(incremental, stream, content_type, length):
+    from flask import Flask, request
+    from utils.image_optimizer import ImageOptimizer
+    from utils.image_payload import ImagePayload
+    from utils.streaming_upload import receive_image
+
+    app = Flask(__name__)
+    environ = {"wsgi.input": stream, "CONTENT_TYPE": content_type, "CONTENT_LENGTH": str(length)}
+    with app.test_request_context("/analisar-ultra", method="POST", environ_overrides=environ):
+        if incremental:
+            imagem = receive_image(request, "imagem", (256, 256))
+        else:
+            imagem = ImagePayload.from_upload(request.files["imagem"])
+        result = ImageOptimizer.encode_for_preset(imagem, "ultra")
+        assert result["success"], result
+
+
+def run_case(incremental, boundary, body, mbps, queue):
+    content_type = f"multipart/form-data; boundary={boundary}"
+
+    # Aquece imports e codecs fora da medição
+    receive_and_compress(incremental, io.BytesIO(body), content_type, len(body))
+
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+    baseline_rss = _rss_kb("VmRSS")
+
+    stream = UplinkStream(body, mbps)
+    start = time.perf_counter()
+    receive_and_compress(incremental, stream, content_type, len(body))
+    end = time.perf_counter()
+
+    queue.put((end - start, end - stream.last_byte_at, (_rss_kb("VmHWM") - baseline_rss) / 1024))
+
+
+def main():
+    mbps = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    megapixels = float(sys.argv[2]) if len(sys.argv) > 2 else 12.0
+    boundary, body = make_body(megapixels)
+    ctx = mp.get_context("spawn")
+
+    print(f"corpo: {len(body) / 1024:.0f} KB, {megapixels:g} MP, uplink {mbps:g} Mbit/s")
+    print(f"{'caso':<12} {'total s':>8} {'após último byte ms':>20} {'pico RSS +MB':>13}")
+    for name, incremental in (("buffered", False), ("incremental", True)):
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_case, args=(incremental, boundary, body, mbps, queue))
+        process.start()
+        total, tail, rss_mb = queue.get()
+        process.join()
+        print(f"{name:<12} {total:>8.2f} {tail * 1000:>20.1f} {rss_mb:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark da triagem de OCR local (fotos dominadas por texto)
+
+Gera fotos sintéticas (nota fiscal, rótulo, cena de mesa, placa sobre a
+cena, textura) e mede, a partir dos bytes JPEG de uma foto de câmera:
+- triagem: decodificação reduzida + densidade de bordas e bimodalidade,
+  o custo acrescentado a toda foto antes do Gemini;
+- ocr: leitura com tesseract das fotos classificadas como texto, quando
+  o tesseract e o pacote "por" estão instalados.
+Compare o tempo da rota ocr_local com a latência do Gemini nas
+estatísticas de /cache/estatisticas ("roteamento").
+
+Uso:
+    python benchmarks/bench_ocr_route.py [iteracoes]
+"""
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+import services.ocr_service as ocr_service
+from utils.image_payload import ImagePayload
+
+
+def receipt(size=(3024, 4032), font_size=90, lines=28):
+    image = Image.new("RGB", size, (236, 234, 228))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+    for i in range(lines):
+        draw.text((120, 120 + i * int(font_size * 1.4)), f"{i:02d} ARROZ INTEGRAL 1KG   R$ {i * 3.17:6.2f}",
+                  fill=(25, 25, 25), font=font)
+    return image
+
+
+def label(size=(4032, 3024)):
+    image = Image.new("RGB", size, (250, 250, 245))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=220)
+    for i, text in enumerate(("LEITE INTEGRAL", "1 LITRO", "VALIDADE 12/2026")):
+        draw.text((200, 400 + i * 700), text, fill=(20, 40, 120), font=font)
+    return image
+
+
+def scene(size=(4032, 3024)):
+    noise = Image.effect_noise((size[0] // 16, size[1] // 16), 40).resize(size, Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient("L").resize(size)
+    image = Image.merge("RGB", (noise, gradient, noise))
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x, y = 200 + (i % 4) * 950, 200 + (i // 4) * 900
+        draw.rectangle((x, y, x + 600, y + 500), fill=(30 * i % 255, 200, 60), outline=(0, 0, 0), width=12)
+    return image
+
+
+def sign_on_scene():
+    image = scene()
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((1200, 1000, 2800, 1900), fill=(240, 240, 240))
+    draw.text((1350, 1250), "SAIDA", fill=(10, 10, 10), font=ImageFont.load_default(size=300))
+    return image
+
+
+def texture(size=(4032, 3024)):
+    return Image.effect_noise((size[0] // 20, size[1] // 20), 90).resize(size).convert("RGB")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    cases = {"nota": receipt(), "rotulo": label(), "cena": scene(), "placa": sign_on_scene(), "textura": texture()}
+
+    print(f"tesseract disponível: {ocr_service.TESSERACT_AVAILABLE}")
+    print(f"{'caso':<8} {'bordas':>7} {'bimodal':>8} {'texto?':>7} {'triagem ms':>11} {'ocr ms':>8} {'conf':>5}")
+    for name, image in cases.items():
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        payload = ImagePayload(buffer.getvalue())
+
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            metricas = ocr_service.text_dominance(ocr_service._detection_image(payload))
+            times.append((time.perf_counter() - start) * 1000)
+        dominant = ocr_service.is_text_dominant(metricas)
+
+        ocr_ms, confianca = "-", "-"
+        if dominant and ocr_service.TESSERACT_AVAILABLE:
+            start = time.perf_counter()
+            _, conf, _ = ocr_service.read_text(ocr_service._ocr_image(payload))
+            ocr_ms, confianca = f"{(time.perf_counter() - start) * 1000:.0f}", f"{conf:.0f}"
+
+        print(f"{name:<8} {metricas['densidade_bordas']:>7.3f} {metricas['bimodalidade']:>8.3f} "
+              f"{'sim' if dominant else 'não':>7} {statistics.median(times):>11.1f} {ocr_ms:>8} {confianca:>5}")
+
+
+if __name__ == "__main__":
+    main()
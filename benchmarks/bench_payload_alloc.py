@@ -0,0 +1,120 @@
+"""
+Benchmark de alocações: arquivo relido a cada etapa vs. ImagePayload
+
+Reproduz o que cada etapa fazia com os bytes antes do ImagePayload:
+- ImageOptimizer: seek/getvalue do buffer de saída
+- AsyncImageProcessor: read() e type(image_file)(content), uma cópia
+- process_image_cached: _read_image_content (getvalue) e um hash dos
+  bytes em ImageCache.lookup, key_for (single-flight) e set
+e compara com o caminho atual (ImagePayload.from_upload -> ImageOptimizer
+-> process_image_cached), com o Gemini trocado por um stub.
+
+A decodificação da foto domina o pico de memória das duas versões, então
+o pico é medido só da saída do otimizador até a chamada ao Gemini, numa
+imagem já otimizada. Também conta quantos bytes passaram por funções de
+hash por requisição.
+
+Uso:
+    python benchmarks/bench_payload_alloc.py [iteracoes]
+"""
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SHARED_CACHE_PATH", "")
+os.environ.setdefault("NEAR_DUPLICATE_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+import services.image_service as image_service
+import utils.cache as cache_module
+import utils.image_payload as image_payload
+from utils.cache import image_cache
+from utils.image_optimizer import ImageOptimizer
+from utils.image_payload import ImagePayload, content_digest
+
+STUB_RESULT = [{"objeto": "Descrição simulada.", "confianca": None}]
+HASHED = [0]
+
+
+def make_photo(size=(4032, 3024)):
+    noise = Image.effect_noise((size[0] // 8, size[1] // 8), 60).resize(size)
+    gradient = Image.linear_gradient("L").resize(size)
+    buffer = io.BytesIO()
+    Image.merge("RGB", (noise, gradient, noise)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def legacy_pipeline(optimized):
+    """Sequência de leituras, cópias e hashes da versão anterior"""
+    optimized.seek(0)
+    content = optimized.read()
+    image_copy = type(optimized)(content)
+
+    image_copy.seek(0)
+    content = image_copy.getvalue()
+
+    # Cache e single-flight chaveados pelos bytes: cada chamada hasheia de novo
+    if image_cache.lookup(content, "detalhado", image_service.IMAGE_PROMPT) is None:
+        image_cache.key_for(content, "detalhado", image_service.IMAGE_PROMPT)
+        image_cache.set(content, "detalhado", STUB_RESULT, image_service.IMAGE_PROMPT)
+    return STUB_RESULT
+
+
+def payload_pipeline(optimized):
+    return image_service.process_image_cached(optimized, mode="detalhado")
+
+
+def measure(name, optimize, pipeline, upload_bytes, iterations):
+    HASHED[0] = 0
+    times, peaks = [], []
+
+    for _ in range(iterations):
+        image_cache.clear()
+        start = time.perf_counter()
+        optimized = optimize(upload_bytes)
+
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        pipeline(optimized)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        times.append(time.perf_counter() - start)
+        peaks.append(peak - base)
+
+    print(f"{name:>8}: pico pós-otimização {statistics.median(peaks) / 1024:7.1f} KB  "
+          f"hash {HASHED[0] / iterations / 1024:7.1f} KB/req  "
+          f"tempo total {statistics.median(times) * 1000:6.1f} ms")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    image_service._generate_description = lambda payload, prompt, profile="image-detailed": (STUB_RESULT, True)
+
+    def counting_digest(data):
+        HASHED[0] += len(data)
+        return content_digest(data)
+    cache_module.content_digest = counting_digest
+    image_payload.content_digest = counting_digest
+
+    upload_bytes = make_photo()
+    print(f"upload: {len(upload_bytes) / 1024:.0f} KB, preset: detalhado, iterações: {iterations}")
+
+    measure(
+        "anterior",
+        lambda data: io.BytesIO(ImageOptimizer.encode_for_preset(io.BytesIO(data), "detalhado")["payload"].content),
+        legacy_pipeline, upload_bytes, iterations
+    )
+    measure(
+        "payload",
+        lambda data: ImageOptimizer.encode_for_preset(ImagePayload.from_upload(io.BytesIO(data)), "detalhado")["payload"],
+        payload_pipeline, upload_bytes, iterations
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark da extração de PDF em paralelo (extract_text_from_pdf)
+
+Gera um relatório sintético com N páginas de texto nativo (títulos e
+parágrafos) e mede páginas por segundo com o pdf_pool em 1, 2, 4 e 8
+processos. 1 processo é a extração em série, no próprio processo. Os
+processos são aquecidos antes da medição (o spawn custa ~1 s uma vez por
+worker do gunicorn) e cada resultado é comparado com o da série.
+
+O ganho é limitado pelos núcleos da máquina (os.cpu_count()).
+
+Uso:
+    python benchmarks/bench_pdf_parallel.py [paginas] [repeticoes]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+import services.document_service as document_service
+from utils.process_pool import ProcessPool
+
+WORKERS = (1, 2, 4, 8)
+
+
+def make_report(pages):
+    document = fitz.open()
+    for n in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 60), f"Capítulo {n + 1}", fontsize=20)
+        page.insert_text((72, 90), f"Seção {n + 1}.1", fontsize=16)
+        for line in range(45):
+            page.insert_text((72, 110 + line * 15),
+                             f"Linha {line} da página {n + 1}: texto corrido de um relatório longo.", fontsize=11)
+    return document.tobytes()
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    data = make_report(pages)
+    print(f"{pages} páginas, {len(data) // 1024} KB, {os.cpu_count()} CPUs")
+
+    reference = None
+    print(f"{'processos':>9} {'mediana ms':>10} {'páginas/s':>10} {'igual à série':>14}")
+    for workers in WORKERS:
+        pool = ProcessPool("bench", workers)
+        document_service.pdf_pool = pool
+        if workers > 1:
+            pool.warm_up()
+
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = document_service.extract_text_from_pdf(data)
+            times.append(time.perf_counter() - start)
+        pool.shutdown()
+
+        if reference is None:
+            reference = result
+        median = statistics.median(times)
+        print(f"{workers:>9} {median * 1000:>10.0f} {pages / median:>10.0f} {str(result == reference):>14}")
+
+
+if __name__ == "__main__":
+    main()
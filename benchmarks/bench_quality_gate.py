@@ -0,0 +1,95 @@
+"""
+Benchmark do quality_gate: custo por imagem e decisões em casos sintéticos
+
+Gera uma cena com bordas e texturas e variações dela (escura, estourada,
+lente coberta, parede lisa, borrada) e uma página branca com texto
+(recibo), que deve ser aprovada. Reduz cada uma ao thumbnail dos presets
+do ImageOptimizer (/analisar 512px, 384px, /analisar-ultra 256px) e
+mede o tempo de quality_gate.assess sobre o thumbnail, que é o que a
+etapa acrescenta a cada requisição. O alvo é ficar abaixo de 5 ms por
+imagem (p95).
+
+Uso:
+    python benchmarks/bench_quality_gate.py [iteracoes]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+from utils.quality_gate import assess
+
+BUDGET_MS = 5.0
+PRESETS = {"detalhado": (512, 512), "analisar": (384, 384), "ultra": (256, 256)}
+
+
+def make_scene(size=(1600, 1200)):
+    """Objetos com bordas definidas sobre um fundo com textura, como uma foto de mesa"""
+    noise = Image.effect_noise((size[0] // 16, size[1] // 16), 40).resize(size, Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient("L").resize(size)
+    scene = Image.merge("RGB", (noise, gradient, noise))
+    draw = ImageDraw.Draw(scene)
+    for i in range(12):
+        x, y = 80 + (i % 4) * 380, 80 + (i // 4) * 360
+        draw.rectangle((x, y, x + 240, y + 200), fill=(30 * i % 255, 200, 60), outline=(0, 0, 0), width=6)
+        draw.text((x + 20, y + 80), "LUMINUS 123", fill=(255, 255, 255))
+    return scene
+
+
+def make_receipt(size=(1200, 1600), lines=4):
+    """Página branca com poucas linhas de texto escuro: clara, mas com contraste"""
+    page = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=28)
+    for i in range(lines):
+        draw.text((80, 100 + i * 70), f"Item {i + 1}  Total R$ 123,45", fill="black", font=font)
+    return page
+
+
+def variants(scene):
+    covered = Image.effect_noise(scene.size, 2).point(lambda v: v // 16).convert("RGB")
+    return {
+        "nitida": scene,
+        "pouca_luz": ImageEnhance.Brightness(scene).enhance(0.3),
+        "escura": ImageEnhance.Brightness(scene).enhance(0.12),
+        "estourada": Image.blend(scene, Image.new("RGB", scene.size, "white"), 0.92),
+        "coberta": covered,
+        "parede": Image.new("RGB", scene.size, (170, 165, 150)),
+        "borrada_leve": scene.filter(ImageFilter.GaussianBlur(3)),
+        "borrada": scene.filter(ImageFilter.GaussianBlur(12)),
+        "recibo": make_receipt(),
+    }
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    scene = make_scene()
+
+    print(f"{'preset':<9} {'caso':<13} {'decisão':<10} {'lum':>6} {'contr':>6} {'nitidez':>9} "
+          f"{'p50 ms':>7} {'p95 ms':>7}")
+    worst = 0.0
+    for preset, size in PRESETS.items():
+        for name, image in variants(scene).items():
+            thumb = image.copy()
+            thumb.thumbnail(size, Image.Resampling.BILINEAR)
+
+            times = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                report = assess(thumb)
+                times.append((time.perf_counter() - start) * 1000)
+            p95 = statistics.quantiles(times, n=20)[-1]
+            worst = max(worst, p95)
+
+            m = report["metricas"]
+            print(f"{preset:<9} {name:<13} {report['motivo'] or 'aprovada':<10} {m['luminancia']:>6.1f} "
+                  f"{m['contraste']:>6.1f} {m['nitidez']:>9.1f} {statistics.median(times):>7.3f} {p95:>7.3f}")
+
+    print(f"pior p95: {worst:.3f} ms ({'dentro' if worst < BUDGET_MS else 'ACIMA'} do alvo de {BUDGET_MS:g} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark de latência do modo /analisar-ultra contra um Gemini simulado
+
+Mede o caminho completo do modo ultra (encode_for_preset "ultra" + cache +
+chamada ao modelo) com o upstream substituído por um stub que dorme uma
+latência fixa por requisição mais um custo proporcional ao payload.
+Cada iteração usa uma foto diferente e o índice de quase-duplicatas fica
+desligado, então todas são cache miss.
+
+Uso:
+    python benchmarks/bench_ultra.py [iteracoes] [latencia_stub_s]
+"""
+import io
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SHARED_CACHE_PATH", "")
+os.environ.setdefault("NEAR_DUPLICATE_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+import services.image_service as image_service
+from utils.image_optimizer import ImageOptimizer
+
+TARGET_SECONDS = 3.0
+# Custo de upload simulado do stub: ~1 ms a cada 10 KB enviados
+STUB_SECONDS_PER_BYTE = 0.001 / 10240
+
+
+def make_photo(seed, size=(4032, 3024)):
+    noise = Image.effect_noise((size[0] // 8, size[1] // 8), 40 + seed % 50).resize(size)
+    gradient = Image.linear_gradient("L").rotate(seed * 7).resize(size)
+    image = Image.merge("RGB", (noise, gradient, noise))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    buffer.seek(0)
+    return buffer
+
+
+def install_stub(latency):
+    sent = []
+
+    def fake_generate(payload, prompt, profile="image-detailed"):
+        sent.append((len(payload), payload.mime_type))
+        time.sleep(latency + len(payload) * STUB_SECONDS_PER_BYTE)
+        return [{"objeto": "Descrição simulada.", "confianca": None}], True
+
+    image_service._generate_description = fake_generate
+    return sent
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 1.5
+    sent = install_stub(latency)
+
+    photos = [make_photo(seed) for seed in range(iterations)]
+    compress_times, totals = [], []
+
+    for photo in photos:
+        start = time.perf_counter()
+        compressed = ImageOptimizer.encode_for_preset(photo, "ultra")
+        compress_times.append(time.perf_counter() - start)
+        image_service.process_image_cached(compressed["payload"], mode="ultra")
+        totals.append(time.perf_counter() - start)
+
+    p95 = statistics.quantiles(totals, n=20)[-1]
+    formats = {}
+    for _, mime_type in sent:
+        formats[mime_type] = formats.get(mime_type, 0) + 1
+
+    print(f"iterações: {iterations}, stub: {latency}s + upload simulado")
+    print(f"compressão p50: {statistics.median(compress_times) * 1000:.1f} ms")
+    print(f"payload médio: {statistics.mean(size for size, _ in sent) / 1024:.1f} KB, formatos: {formats}")
+    print(f"total p50: {statistics.median(totals):.3f}s  p95: {p95:.3f}s  alvo: {TARGET_SECONDS}s")
+
+    if p95 >= TARGET_SECONDS:
+        print("FALHOU: p95 acima do alvo")
+        sys.exit(1)
+    print("OK: p95 abaixo do alvo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Teste de carga do modo de serviço: worker sync, gthread + loop e o loop sozinho
+
+Modo simulado (padrão): o Gemini é trocado por um stub de latência fixa e
+o processo atual simula os 2 workers do Dockerfile multiplicando as vagas
+(o trabalho de CPU por requisição é pequeno perto da latência do upstream):
+- sync: deploy anterior (--workers 2, worker sync), uma requisição por vez
+  por worker, bloqueando no cliente síncrono do Gemini;
+- gthread: o deploy atual e o caminho real das rotas (--workers 2
+  --threads 32): cada requisição ocupa uma thread bloqueada em
+  AsyncRuntime.run, então no máximo 64 ficam em voo;
+- loop: as mesmas requisições como corrotinas direto no loop do worker
+  (AsyncImageProcessor.process_with_cache), sem thread por requisição. É o
+  teto de um servidor assíncrono de ponta a ponta, que o Flask síncrono não
+  atinge; o limite aí é o semáforo GEMINI_CONCURRENCY.
+"em voo" é o máximo de chamadas simultâneas que chegaram ao stub.
+
+Modo HTTP: com --url, dispara as requisições contra um servidor rodando
+(/analisar-ultra), para comparar os dois CMDs do Dockerfile de verdade.
+
+Uso:
+    python benchmarks/loadtest_serving.py [requisicoes] [clientes] [latencia_stub_s]
+    python benchmarks/loadtest_serving.py --url http://localhost:5000 [requisicoes] [clientes] [imagem]
+"""
+import asyncio
+import concurrent.futures
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SHARED_CACHE_PATH", "")
+os.environ.setdefault("NEAR_DUPLICATE_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKERS = 2
+THREADS_PER_WORKER = 32
+
+
+def report(name, latencies, elapsed, in_flight=None):
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    extra = f"  em voo {in_flight}" if in_flight is not None else ""
+    print(f"{name:>7}: {len(latencies) / elapsed:7.1f} req/s  "
+          f"p50 {statistics.median(latencies):.3f}s  p95 {p95:.3f}s  total {elapsed:.2f}s{extra}")
+
+
+def run_clients(requests, clients, slots, handle):
+    """Simula `clients` clientes concorrentes contra `slots` vagas de atendimento"""
+    gate = concurrent.futures.ThreadPoolExecutor(max_workers=slots)
+
+    def client_request(index):
+        start = time.perf_counter()
+        gate.submit(handle, index).result()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(client_request, range(requests)))
+    elapsed = time.perf_counter() - start
+    gate.shutdown()
+    return latencies, elapsed
+
+
+def simulated(requests, clients, latency):
+    from config import ASYNC_CONFIG
+    from services.gemini_registry import gemini_registry
+    import services.image_service as image_service
+    from utils.async_processor import async_processor
+    from utils.async_runtime import async_runtime
+    from utils.image_payload import ImagePayload
+
+    class StubResponse:
+        text = "Descrição simulada."
+        parts = [text]
+        candidates = [type("Candidate", (), {"finish_reason": 1, "safety_ratings": []})()]
+
+    counter = {"now": 0, "max": 0}
+
+    def enter():
+        counter["now"] += 1
+        counter["max"] = max(counter["max"], counter["now"])
+
+    def generate(name, contents, **kwargs):
+        enter()
+        time.sleep(latency)
+        counter["now"] -= 1
+        return StubResponse()
+
+    async def generate_async(name, contents, **kwargs):
+        enter()
+        await asyncio.sleep(latency)
+        counter["now"] -= 1
+        return StubResponse()
+
+    gemini_registry.generate = generate
+    gemini_registry.generate_async = generate_async
+
+    def new_payload(index):
+        # Conteúdo único por requisição: todas são cache miss
+        return ImagePayload(f"imagem-{time.perf_counter_ns()}-{index}".encode(), mime_type="image/jpeg")
+
+    def handle(index):
+        image_service.process_image_cached(new_payload(index), mode="ultra")
+
+    print(f"requisições: {requests}, clientes: {clients}, latência do stub: {latency}s")
+
+    ASYNC_CONFIG['ENABLED'] = False
+    counter["max"] = 0
+    report("sync", *run_clients(requests, clients, WORKERS, handle), counter["max"])
+
+    ASYNC_CONFIG['ENABLED'] = True
+    counter["max"] = 0
+    report("gthread", *run_clients(requests, clients, WORKERS * THREADS_PER_WORKER, handle), counter["max"])
+
+    async def loop_clients():
+        gate = asyncio.Semaphore(clients)
+
+        async def client_request(index):
+            start = time.perf_counter()
+            async with gate:
+                await async_processor.process_with_cache(new_payload(index), "ultra")
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(client_request(i) for i in range(requests)))
+        return latencies, time.perf_counter() - start
+
+    counter["max"] = 0
+    latencies, elapsed = async_runtime.run(loop_clients())
+    report("loop", latencies, elapsed, counter["max"])
+
+
+def http(url, requests, clients, image_path):
+    import requests as http_client
+
+    with open(image_path, "rb") as f:
+        image = f.read()
+
+    def handle(index):
+        # Um byte extra no fim muda o hash sem afetar a decodificação do JPEG
+        payload = image + index.to_bytes(4, "big")
+        start = time.perf_counter()
+        r = http_client.post(f"{url}/analisar-ultra", files={"imagem": ("foto.jpg", payload, "image/jpeg")})
+        r.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(handle, range(requests)))
+    report("http", latencies, time.perf_counter() - start)
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == "--url":
+        url = args[1]
+        requests = int(args[2]) if len(args) > 2 else 100
+        clients = int(args[3]) if len(args) > 3 else 32
+        image_path = args[4] if len(args) > 4 else "foto.jpg"
+        http(url, requests, clients, image_path)
+        return
+
+    requests = int(args[0]) if len(args) > 0 else 200
+    clients = int(args[1]) if len(args) > 1 else 256
+    latency = float(args[2]) if len(args) > 2 else 0.5
+    simulated(requests, clients, latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Caches em disco (SQLite) ficam num diretório privado da aplicação (0700),
+# não no /tmp compartilhado, onde outro usuário poderia gravar no arquivo
+DATA_DIR = os.getenv("LUMINUS_DATA_DIR", os.path.join(os.path.expanduser("~"), ".cache", "luminus"))
+
 PERFORMANCE_CONFIG = {
     'API_TIMEOUT': 10,
     'GEMINI_TIMEOUT': 8,
@@ -12,6 +16,9 @@ PERFORMANCE_CONFIG = {
     'IMAGE_QUALITY': 70,
     'ULTRA_FAST_SIZE': (256, 256),
     'ULTRA_FAST_QUALITY': 30,
+    # Só JPEG: o WebP (method=0) na mesma qualidade sai maior e mais lento em fotos
+    'ULTRA_FAST_FORMATS': ('JPEG',),
+    'ULTRA_FAST_GRAYSCALE': os.getenv("ULTRA_FAST_GRAYSCALE", "false").lower() == "true",
     
     'GEMINI_MAX_TOKENS': 150,
     'GEMINI_TEMPERATURE': 0.1,
@@ -19,5 +26,231 @@ PERFORMANCE_CONFIG = {
     'GEMINI_TOP_K': 20,
 }
 
+# Codificador adaptativo (utils/adaptive_encoder.py): por preset, o maior
+# tamanho dentro do orçamento de tokens e a maior qualidade dentro do
+# orçamento de bytes. Line art (poucas cores) vai em PNG com paleta.
+ENCODER_PRESETS = {
+    'detalhado': {
+        'MAX_SIZE': PERFORMANCE_CONFIG['MAX_IMAGE_SIZE'],
+        'TARGET_TOKENS': 258,
+        'TARGET_BYTES': 32 * 1024,
+        'QUALITY_RANGE': (40, PERFORMANCE_CONFIG['IMAGE_QUALITY']),
+        'FORMATS': ('JPEG', 'WEBP'),
+        'RESAMPLE': 'LANCZOS',
+        # Decodificação (draft) em até 2x o tamanho final, para o LANCZOS
+        'REDUCING_GAP': 2,
+        'GRAYSCALE': False,
+    },
+    'rapido': {
+        'MAX_SIZE': (256, 256),
+        'TARGET_TOKENS': 258,
+        'TARGET_BYTES': 12 * 1024,
+        'QUALITY_RANGE': (35, 70),
+        'FORMATS': ('JPEG', 'WEBP'),
+        'RESAMPLE': 'BILINEAR',
+        'REDUCING_GAP': 1,
+        'GRAYSCALE': False,
+    },
+    'ultra': {
+        'MAX_SIZE': PERFORMANCE_CONFIG['ULTRA_FAST_SIZE'],
+        'TARGET_TOKENS': 258,
+        # Qualidade fixa, sem bissecção: o orçamento só reduz o tamanho de
+        # fotos muito detalhadas, e o custo fica no de um único JPEG
+        'TARGET_BYTES': 8 * 1024,
+        'QUALITY_RANGE': (PERFORMANCE_CONFIG['ULTRA_FAST_QUALITY'], PERFORMANCE_CONFIG['ULTRA_FAST_QUALITY']),
+        'FORMATS': PERFORMANCE_CONFIG['ULTRA_FAST_FORMATS'],
+        'RESAMPLE': 'BILINEAR',
+        'REDUCING_GAP': 1,
+        'GRAYSCALE': PERFORMANCE_CONFIG['ULTRA_FAST_GRAYSCALE'],
+    },
+}
+
+ENCODER_CONFIG = {
+    # Tentativas de codificação por imagem na busca da qualidade
+    'MAX_ATTEMPTS': 4,
+    # Reduções de 25% no tamanho quando nem a qualidade mínima cabe no orçamento
+    'MAX_DOWNSCALES': 2,
+    # Line art: as N cores mais frequentes cobrem quase toda a imagem
+    'LINE_ART_COLORS': 16,
+    'LINE_ART_COVERAGE': 0.9,
+    'PNG_PALETTE_COLORS': 64,
+    # Faixas (KB) do histograma de bytes enviados vs. latência do Gemini
+    'HISTOGRAM_BUCKETS_KB': (4, 8, 16, 32, 64),
+}
+
+UPLOAD_CONFIG = {
+    # Decodifica a imagem em trechos enquanto o corpo da requisição chega
+    'INCREMENTAL_DECODE': os.getenv("INCREMENTAL_UPLOAD", "true").lower() == "true",
+    'MAX_BODY_BYTES': 20 * 1024 * 1024,
+    'CHUNK_BYTES': 64 * 1024,
+    'MAX_PIXELS': 50_000_000,
+    # Bytes aceitos antes de o cabeçalho da imagem ser reconhecido
+    'MAX_HEADER_BYTES': 1024 * 1024,
+}
+
+ASYNC_CONFIG = {
+    # Chamadas ao Gemini passam pelo loop assíncrono do worker (cliente gRPC async)
+    'ENABLED': os.getenv("ASYNC_UPSTREAM", "true").lower() == "true",
+    'GEMINI_CONCURRENCY': 64,
+    'TTS_CONCURRENCY': 8,
+    'BLOCKING_WORKERS': 16,
+    'UPSTREAM_TIMEOUT': 90,
+    # /analisar-modos: no máximo este número de modos (presets) por requisição
+    'MAX_MODES_PER_REQUEST': 3,
+}
+
+QUALITY_GATE_CONFIG = {
+    # Recusa localmente fotos escuras, estouradas, lisas ou borradas, sem chamar o Gemini
+    'ENABLED': os.getenv("QUALITY_GATE", "true").lower() == "true",
+    # Lado máximo da versão em tons de cinza analisada
+    'ANALYSIS_SIZE': 256,
+    # Luminância média (0-255)
+    'MIN_LUMINANCE': float(os.getenv("QUALITY_MIN_LUMINANCE", 25)),
+    'MAX_LUMINANCE': float(os.getenv("QUALITY_MAX_LUMINANCE", 240)),
+    # Desvio padrão da luminância; abaixo disso o quadro é praticamente uniforme
+    'MIN_CONTRAST': float(os.getenv("QUALITY_MIN_CONTRAST", 4)),
+    # Variância do Laplaciano na versão analisada; abaixo disso a foto está borrada
+    'MIN_SHARPNESS': float(os.getenv("QUALITY_MIN_SHARPNESS", 15)),
+}
+
+OCR_CONFIG = {
+    # Fotos dominadas por texto (rótulos, notas, placas) são lidas com tesseract, sem Gemini
+    'ENABLED': os.getenv("LOCAL_OCR", "true").lower() == "true",
+    'LANG': 'por',
+    'TESSERACT_CONFIG': '--oem 3 --psm 6',
+    'TIMEOUT_SECONDS': 5,
+    # Triagem na versão reduzida: densidade de bordas e histograma bimodal (papel + tinta)
+    'DETECTION_SIZE': 256,
+    'EDGE_THRESHOLD': 60,
+    'MIN_EDGE_DENSITY': 0.02,
+    'MIN_BIMODALITY': 0.6,
+    # Lado máximo da imagem entregue ao tesseract
+    'MAX_SIDE': 2000,
+    # Abaixo disso a leitura local é descartada e a foto vai para o Gemini
+    'MIN_CONFIDENCE': float(os.getenv("LOCAL_OCR_MIN_CONFIDENCE", 75)),
+    'MIN_WORDS': 3,
+    # Pool de OCR das páginas escaneadas e imagens de documentos (services/ocr_pool.py)
+    'PDF_WORKERS': int(os.getenv("OCR_WORKERS", min(2, os.cpu_count() or 1))),
+    # Páginas entre agendadas e em andamento; além disso a requisição espera vaga até o prazo
+    'PDF_MAX_QUEUE': int(os.getenv("OCR_MAX_QUEUE", 32)),
+    'PDF_PAGE_TIMEOUT_SECONDS': int(os.getenv("OCR_PAGE_TIMEOUT_SECONDS", 30)),
+    # Prazo único de um documento (vaga na fila + OCR de todas as páginas)
+    'PDF_REQUEST_TIMEOUT_SECONDS': int(os.getenv("OCR_REQUEST_TIMEOUT_SECONDS", 120)),
+    # DPI adaptativo: prévia em PROBE_DPI mede a altura das linhas, que deve chegar a ~TARGET px
+    'PDF_PROBE_DPI': 72,
+    'PDF_TARGET_LINE_HEIGHT_PX': 30,
+    'PDF_MIN_DPI': 100,
+    'PDF_MAX_DPI': 300,
+    'PDF_DEFAULT_DPI': 150,
+}
+
+CAMERA_CONFIG = {
+    # Modo câmera contínuo (WebSocket /camera): autentica uma vez por conexão
+    'REQUIRE_AUTH': os.getenv("CAMERA_REQUIRE_AUTH", "true").lower() == "true",
+    'AUTH_TIMEOUT_SECONDS': 10,
+    'IDLE_TIMEOUT_SECONDS': 60,
+    'MAX_FRAME_BYTES': 2 * 1024 * 1024,
+    # Miniatura em tons de cinza comparada entre quadros
+    'THUMBNAIL_SIZE': (32, 32),
+    # Diferença média absoluta (0-1, sem o brilho médio) que conta como mudança de cena
+    'SCENE_CHANGE_THRESHOLD': float(os.getenv("CAMERA_SCENE_CHANGE", 0.05)),
+    'MIN_INTERVAL_SECONDS': 1.5,
+    'MAX_CALLS_PER_MINUTE': int(os.getenv("CAMERA_MAX_CALLS_PER_MINUTE", 12)),
+    # Cada sessão ocupa uma thread do worker; o resto fica para as rotas HTTP
+    'MAX_SESSIONS_PER_WORKER': 16,
+}
+
+BATCH_CONFIG = {
+    'MAX_IMAGES': 20,
+    'MAX_IMAGES_PER_REQUEST': 8,
+    
+    # Uma imagem de até 384px custa ~258 tokens de entrada no Gemini
+    'TOKENS_PER_IMAGE': 258,
+    'INPUT_TOKEN_BUDGET': 8192,
+    'OUTPUT_TOKENS_PER_IMAGE': 200,
+    'OUTPUT_TOKEN_BUDGET': 4096,
+    
+    'MAX_PARALLEL_REQUESTS': 3,
+    'OPTIMIZE_WORKERS': 4,
+}
+
+CACHE_CONFIG = {
+    'RESULT_TTL_SECONDS': 1800,
+    'LOCAL_CACHE_MAX_BYTES': 8 * 1024 * 1024,
+    
+    # Cache compartilhado entre workers (SQLite local); vazio desativa
+    'SHARED_CACHE_PATH': os.getenv(
+        "SHARED_CACHE_PATH",
+        os.path.join(DATA_DIR, "luminus_cache.sqlite3")
+    ),
+    'SHARED_CACHE_MAX_BYTES': 64 * 1024 * 1024,
+    'WARM_START_ENTRIES': 500,
+    
+    # Reaproveita a descrição de uma foto quase igual (distância de Hamming do dHash)
+    'NEAR_DUPLICATE_ENABLED': os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true",
+    'NEAR_DUPLICATE_MAX_DISTANCE': int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", 4)),
+    'NEAR_DUPLICATE_MAX_ENTRIES': 20000,
+    
+    # Requisições idênticas simultâneas esperam a primeira em vez de chamar o Gemini
+    # O lease precisa durar mais que a chamada mais longa do líder; mais curto,
+    # os outros workers chamariam o Gemini de novo no meio da primeira chamada
+    'SINGLE_FLIGHT_LEASE_SECONDS': ASYNC_CONFIG['UPSTREAM_TIMEOUT'] + 5,
+    'SINGLE_FLIGHT_POLL_SECONDS': 0.05,
+}
+
+DOCUMENT_CONFIG = {
+    # Registro digest -> arquivo já enviado ao Gemini (SQLite local, entre workers); vazio usa só memória
+    'FILE_REGISTRY_PATH': os.getenv(
+        "FILE_REGISTRY_PATH",
+        os.path.join(DATA_DIR, "luminus_gemini_files.sqlite3")
+    ),
+    # O Files API guarda cada arquivo por 48h; usado se a resposta não trouxer a expiração
+    'FILE_LIFETIME_SECONDS': 48 * 3600,
+    # Arquivos que expiram antes disso são reenviados (a chamada precisa terminar antes)
+    'FILE_REUSE_MARGIN_SECONDS': 600,
+    
+    # Documentos até este tamanho vão como parte inline do próprio generate_content, sem upload
+    'INLINE_MAX_BYTES': int(os.getenv("DOCUMENT_INLINE_MAX_BYTES", 4 * 1024 * 1024)),
+    # Tipos que o Gemini aceita inline; os demais (DOCX) continuam pelo Files API
+    'INLINE_MIME_TYPES': ('application/pdf',),
+    
+    # Roteamento híbrido: páginas com texto nativo são extraídas localmente,
+    # só as digitalizadas ou com figuras vão ao Gemini
+    'HYBRID_ROUTING': os.getenv("DOCUMENT_HYBRID_ROUTING", "true").lower() == "true",
+    'MIN_PAGE_TEXT_CHARS': 80,
+    'FIGURE_COVERAGE': 0.2,
+    # Acima desta fração de páginas remotas o documento inteiro vai ao Gemini numa chamada só
+    'MAX_REMOTE_FRACTION': 0.5,
+    # Estimativa inicial do tempo do Gemini por página, refinada pelas chamadas observadas
+    'REMOTE_MS_PER_PAGE': 1500,
+    
+    # Extração de PDFs grandes em paralelo, por faixas de páginas, num pool de processos
+    'PDF_WORKERS': int(os.getenv("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1))),
+    'PARALLEL_MIN_PAGES': 48,
+    'TASKS_PER_WORKER': 2,
+    'PARALLEL_TIMEOUT_SECONDS': 60,
+    
+    # Resumo map-reduce: trechos de até SUMMARY_CHUNK_CHARS, cortados nos títulos/páginas
+    'SUMMARY_CHUNK_CHARS': int(os.getenv("SUMMARY_CHUNK_CHARS", 12000)),
+    'SUMMARY_CONCURRENCY': int(os.getenv("SUMMARY_CONCURRENCY", 4)),
+    # Resumos por trecho (chave: hash do texto + prompt), compartilhados entre workers; vazio usa só memória
+    'SUMMARY_CACHE_PATH': os.getenv(
+        "SUMMARY_CACHE_PATH",
+        os.path.join(DATA_DIR, "luminus_summaries.sqlite3")
+    ),
+    'SUMMARY_CACHE_MAX_BYTES': 32 * 1024 * 1024,
+    'SUMMARY_CACHE_TTL_SECONDS': 7 * 24 * 3600,
+    
+    # Resultados de /documento/processar por digest do arquivo + opções, comprimidos em disco; vazio desativa
+    'RESULT_CACHE_PATH': os.getenv(
+        "DOCUMENT_CACHE_PATH",
+        os.path.join(DATA_DIR, "luminus_documents.sqlite3")
+    ),
+    'RESULT_CACHE_MAX_BYTES': int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+    'RESULT_CACHE_TTL_SECONDS': 30 * 24 * 3600,
+    # Suba ao mudar a extração/roteamento de um jeito que os prompts não mostram
+    'RESULT_CACHE_VERSION': 1,
+}
+
 GOOGLE_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
\ No newline at end of file
@@ -0,0 +1,142 @@
+from flask import Blueprint, request
+from flask_sock import Sock
+from services.auth_service import AuthService
+from services.camera_service import CameraSession
+from config import CAMERA_CONFIG
+import json
+import threading
+
+camera_bp = Blueprint("camera", __name__)
+sock = Sock()
+
+# Cada conexão ocupa uma thread do worker gthread durante toda a sessão
+_sessions_lock = threading.Lock()
+_active_sessions = [0]
+
+
+def _send(ws, event):
+    ws.send(json.dumps(event, ensure_ascii=False))
+
+
+def _parse_control(message):
+    try:
+        control = json.loads(message)
+    except ValueError:
+        return {}
+    return control if isinstance(control, dict) else {}
+
+
+def _authenticate(ws):
+    """
+    Autentica a conexão uma única vez
+
+    O token vem no header Authorization do handshake ou, para clientes que
+    não conseguem enviar headers (navegadores), na primeira mensagem:
+    {"token": "..."}. Retorna (user_id, primeira mensagem ainda não
+    processada, erro).
+    """
+    token = request.headers.get('Authorization')
+    pending = None
+
+    if not token:
+        pending = ws.receive(timeout=CAMERA_CONFIG['AUTH_TIMEOUT_SECONDS'])
+        if isinstance(pending, str):
+            token = _parse_control(pending).get("token")
+            pending = None
+
+    if token:
+        resultado = AuthService.verify_token(token)
+        if not resultado['sucesso']:
+            return None, None, "Token inválido ou expirado"
+        return resultado['uid'], pending, None
+
+    if CAMERA_CONFIG['REQUIRE_AUTH']:
+        return None, None, "Token de autenticação não fornecido"
+    return None, pending, None
+
+
+def _latest_frame(ws, frame):
+    """
+    Fica só com o quadro mais recente que já chegou
+
+    Quadros recebidos enquanto o anterior era narrado já estão velhos.
+    Retorna (quadro, descartados, mensagem de controle pendente ou None).
+    """
+    dropped = 0
+    while True:
+        message = ws.receive(timeout=0)
+        if message is None:
+            return frame, dropped, None
+        if isinstance(message, str):
+            return frame, dropped, message
+        frame = message
+        dropped += 1
+
+
+@sock.route("/camera", bp=camera_bp)
+def camera(ws):
+    """
+    Modo câmera contínuo (WebSocket)
+
+    Depois de autenticar, o cliente envia quadros da câmera como mensagens
+    binárias (JPEG, PNG ou WebP) e recebe eventos JSON:
+    - pronto: sessão aberta, com os limites da sessão
+    - narracao: descrição inicial ("tipo": "inicial") e depois só o que
+      mudou na cena ("tipo": "mudanca")
+    - qualidade: foto escura, borrada ou lente coberta (uma vez por motivo)
+    - limite: mudanças além de MAX_CALLS_PER_MINUTE; a narração volta sozinha
+    - erro / fim (com as estatísticas da sessão)
+
+    Só quadros em que a cena mudou vão ao Gemini. Mensagens de texto são
+    comandos: {"comando": "estatisticas"} ou {"comando": "fim"}.
+    """
+    with _sessions_lock:
+        if _active_sessions[0] >= CAMERA_CONFIG['MAX_SESSIONS_PER_WORKER']:
+            _send(ws, {"evento": "erro", "mensagem": "Servidor ocupado, tente novamente em instantes"})
+            ws.close(reason=1013, message="Servidor ocupado")
+            return
+        _active_sessions[0] += 1
+
+    try:
+        user_id, pending, erro = _authenticate(ws)
+        if erro:
+            _send(ws, {"evento": "erro", "mensagem": erro})
+            ws.close(reason=1008, message=erro)
+            return
+
+        session = CameraSession(user_id)
+        _send(ws, {
+            "evento": "pronto",
+            "limites": {
+                "chamadas_por_minuto": CAMERA_CONFIG['MAX_CALLS_PER_MINUTE'],
+                "intervalo_minimo_s": CAMERA_CONFIG['MIN_INTERVAL_SECONDS'],
+                "bytes_por_quadro": CAMERA_CONFIG['MAX_FRAME_BYTES']
+            }
+        })
+
+        while True:
+            message = pending if pending is not None else ws.receive(timeout=CAMERA_CONFIG['IDLE_TIMEOUT_SECONDS'])
+            pending = None
+
+            if message is None:
+                _send(ws, {"evento": "erro", "mensagem": "Conexão encerrada por inatividade"})
+                break
+
+            if isinstance(message, str):
+                comando = _parse_control(message).get("comando")
+                if comando == "fim":
+                    break
+                if comando == "estatisticas":
+                    _send(ws, {"evento": "estatisticas", "estatisticas": session.stats()})
+                continue
+
+            frame, dropped, pending = _latest_frame(ws, message)
+            session.counters["quadros_descartados"] += dropped
+            for event in session.handle_frame(frame):
+                _send(ws, event)
+
+        _send(ws, {"evento": "fim", "estatisticas": session.stats()})
+        print(f"Sessão de câmera encerrada: {session.stats()}")
+    finally:
+        with _sessions_lock:
+            _active_sessions[0] -= 1
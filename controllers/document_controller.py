@@ -1,9 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from services.document_service import (
+    pdf_pool,
     process_document,
-    search_text_in_document
+    search_text_in_document,
+    stream_document,
+    summary_cache
 )
+from services.ocr_pool import ocr_pool
+from utils.document_cache import document_cache
 from services.tts_service import TTSService, prepare_document_audio
+import itertools
+import json
 
 document_bp = Blueprint("document", __name__)
 
@@ -24,6 +31,8 @@ def processar_documento():
     - resumo: resumo gerado por IA (se solicitado)
     - palavras_chave: palavras-chave principais
     - imagens_analisadas: número de imagens processadas
+    - cache: {"hit", "idade_segundos"}; o mesmo arquivo com as mesmas opções
+      volta do cache de documentos em disco, sem reprocessar
     """
     if "arquivo" not in request.files:
         return jsonify({"erro": "Nenhum arquivo enviado no campo 'arquivo'"}), 400
@@ -47,6 +56,57 @@ def processar_documento():
     except Exception as e:
         return jsonify({"erro": f"Erro ao processar documento: {str(e)}"}), 500
 
+@document_bp.route("/processar-stream", methods=["POST"])
+def processar_documento_stream():
+    """
+    Extração de PDF ou DOCX parte por parte, enviada assim que cada parte fica pronta
+    
+    Aceita:
+    - arquivo: PDF ou DOCX
+    - formato: ndjson (padrão, um JSON por linha) ou sse (Server-Sent
+      Events; também com Accept: text/event-stream)
+    
+    Eventos (campo "evento"): inicio, pagina (PDF) ou secao/tabela (DOCX),
+    fim (palavras-chave e tempo) e erro. O cliente pode ler em voz alta a
+    página 1 enquanto as seguintes ainda estão sendo extraídas. A extração
+    é só local: para resumo e análise de imagens use /processar.
+    """
+    if "arquivo" not in request.files:
+        return jsonify({"erro": "Nenhum arquivo enviado no campo 'arquivo'"}), 400
+    
+    arquivo = request.files["arquivo"]
+    formato = (request.args.get("formato") or request.form.get("formato") or "").lower()
+    sse = formato == "sse" or (not formato and request.accept_mimetypes.best == "text/event-stream")
+    
+    events = stream_document(arquivo.read(), arquivo.filename or "documento", arquivo.content_type or "")
+    try:
+        # O primeiro evento abre o documento: erros de formato ainda viram 400
+        first = next(events)
+    except Exception as e:
+        return jsonify({"erro": f"Erro ao processar documento: {str(e)}"}), 400
+    if first["evento"] == "erro":
+        return jsonify({"erro": first["mensagem"], "tipos_aceitos": first.get("tipos_aceitos")}), 400
+    
+    def serialize(event):
+        data = json.dumps(event, ensure_ascii=False)
+        if sse:
+            return f"event: {event['evento']}\ndata: {data}\n\n"
+        return data + "\n"
+    
+    def generate():
+        try:
+            for event in itertools.chain([first], events):
+                yield serialize(event)
+        except Exception as e:
+            yield serialize({"evento": "erro", "mensagem": f"Erro ao processar documento: {str(e)}"})
+    
+    response = Response(stream_with_context(generate()),
+                        mimetype="text/event-stream" if sse else "application/x-ndjson")
+    response.headers['Cache-Control'] = 'no-cache'
+    # Evita que proxies (nginx/Render) acumulem o stream antes de repassar
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @document_bp.route("/buscar-no-documento", methods=["POST"])
 def buscar_no_documento():
     """
@@ -125,3 +185,24 @@ def listar_vozes():
         
     except Exception as e:
         return jsonify({"erro": f"Erro ao listar vozes: {str(e)}"}), 500
+
+
+@document_bp.route("/estatisticas", methods=["GET"])
+def estatisticas_documento():
+    """
+    Estatísticas do processamento de documentos deste worker
+
+    Retorna:
+    - ocr: pool de OCR das páginas escaneadas (páginas por segundo,
+      profundidade da fila, tempo e DPI médios, timeouts)
+    - extracao_pdf: pool de extração paralela de PDFs grandes
+    - resumos: cache dos resumos por trecho (acertos, bytes, nível compartilhado)
+    - resultados: cache de documentos processados (hits, tempo de hit,
+      taxa de compressão, ocupação do disco)
+    """
+    return jsonify({
+        "ocr": ocr_pool.stats(),
+        "extracao_pdf": pdf_pool.stats(),
+        "resumos": summary_cache.stats(),
+        "resultados": document_cache.stats()
+    })
@@ -1,7 +1,19 @@
-from flask import Blueprint, request, jsonify
-from services.image_service import process_image_gemini
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from services.gemini_files import gemini_files
+from services.image_service import process_image_cached, process_images_batch, result_events, stream_image_cached
+from services.ocr_service import route_stats, try_local_ocr
 from utils.image_optimizer import ImageOptimizer
 from middleware.auth_middleware import optional_auth
+from utils.adaptive_encoder import encoder_stats
+from utils.cache import image_cache
+from utils.perceptual_index import perceptual_index
+from utils.singleflight import image_singleflight
+from utils.async_processor import async_processor
+from utils.image_payload import ImagePayload
+from utils.streaming_upload import StreamedImage, UploadError, receive_image, wants_incremental_upload
+from config import ASYNC_CONFIG, BATCH_CONFIG, ENCODER_PRESETS
+import concurrent.futures
+import json
 import traceback
 import time
 import io
@@ -9,37 +21,161 @@ import io
 image_bp = Blueprint("image", __name__)
 
 
+def _wants_stream(fields):
+    """Streaming é opcional: ?stream=true, campo stream=true ou Accept: text/event-stream"""
+    flag = request.args.get("stream") or fields.get("stream") or ""
+    return flag.lower() == "true" or request.accept_mimetypes.best == "text/event-stream"
+
+
+def _draft_size(preset):
+    """Tamanho pedido ao draft do JPEG durante o upload: o mesmo que encode_for_preset usaria"""
+    config = ENCODER_PRESETS[preset]
+    return tuple(side * config['REDUCING_GAP'] for side in config['MAX_SIZE'])
+
+
+def _receive_upload(draft_size, draft_mode='RGB'):
+    """
+    Recebe o campo "imagem"
+    
+    Em multipart, a imagem é decodificada em trechos enquanto o corpo chega
+    (já reduzida para draft_size quando JPEG) e volta um StreamedImage. Com
+    UPLOAD_CONFIG['INCREMENTAL_DECODE'] desligado, o arquivo é lido inteiro
+    do request.files e volta um ImagePayload.
+    
+    Retorna (imagem, campos do formulário, resposta de erro ou None).
+    """
+    if wants_incremental_upload(request):
+        try:
+            streamed = receive_image(request, "imagem", draft_size, draft_mode)
+        except UploadError as e:
+            return None, {}, (jsonify({"erro": str(e)}), e.status)
+        print(f"Upload incremental: {streamed.stats()}")
+        return streamed, streamed.fields, None
+    
+    if "imagem" not in request.files:
+        return None, {}, (jsonify({"erro": "Nenhuma imagem foi enviada"}), 400)
+    return ImagePayload.from_upload(request.files["imagem"]), request.form, None
+
+
+def _original_payload(imagem):
+    """Reserva quando a otimização falha; um StreamedImage não guarda os bytes originais"""
+    if isinstance(imagem, StreamedImage):
+        raise ValueError("não foi possível otimizar a imagem recebida")
+    return imagem
+
+
+def _route_name(cache_info, triagem=None, curto_circuito=False):
+    """Rota que atendeu a requisição, para o relatório de latência por rota"""
+    if curto_circuito:
+        return "qualidade"
+    if cache_info.get("hit"):
+        return "cache"
+    return "gemini_apos_ocr" if triagem and triagem.get("ocr_tentado") else "gemini"
+
+
+def _sse_response(events, start_time, extra=None, modo=None, triagem=None):
+    """
+    Envia os eventos de stream_image_cached como Server-Sent Events
+    
+    O evento final recebe processing_time, a rota que atendeu (com modo
+    informado) e os campos de extra.
+    """
+    def generate():
+        for event in events:
+            if event["evento"] == "fim":
+                processing_time = time.time() - start_time
+                event["processing_time"] = round(processing_time, 2)
+                if modo:
+                    rota = event.pop("rota", None) or _route_name(
+                        event.get("cache", {}), triagem, event.get("curto_circuito", False)
+                    )
+                    route_stats.record(f"{modo}/{rota}", processing_time * 1000)
+                    event["rota"] = rota
+                    if triagem:
+                        event["triagem"] = triagem
+                event.update(extra or {})
+            yield f"event: {event['evento']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    # Evita que proxies (nginx/Render) acumulem o stream antes de repassar
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _json_result(resultado, cache_info, start_time, modo, triagem=None, rota=None):
+    """Resposta JSON das rotas de descrição, com a rota que atendeu e o tempo de cada etapa"""
+    processing_time = time.time() - start_time
+    rota = rota or _route_name(cache_info, triagem, resultado[0].get("curto_circuito", False))
+    route_stats.record(f"{modo}/{rota}", processing_time * 1000)
+    
+    resposta = resultado[0]
+    resposta["processing_time"] = round(processing_time, 2)
+    resposta["cache"] = cache_info
+    resposta["rota"] = rota
+    if triagem:
+        resposta["triagem"] = triagem
+    return resposta
+
+
+def _read_text_locally(imagem, campos, start_time, modo, extra=None):
+    """
+    Triagem de texto antes do Gemini (ocr_service.try_local_ocr)
+    
+    Retorna (resposta pronta quando o tesseract leu a foto com confiança,
+    ou None para seguir ao Gemini; triagem).
+    """
+    resultado, triagem = try_local_ocr(imagem)
+    if resultado is None:
+        return None, triagem
+    
+    cache_info = {"hit": False, "idade_segundos": 0}
+    if _wants_stream(campos):
+        events = result_events(resultado, cache_info, rota="ocr_local")
+        return _sse_response(events, start_time, extra, modo, triagem), triagem
+    
+    resposta = _json_result(resultado, cache_info, start_time, modo, triagem, rota="ocr_local")
+    resposta.update(extra or {})
+    return jsonify(resposta), triagem
+
+
 @image_bp.route("/analisar", methods=["POST"])
 @optional_auth
 def analisar():
     """
     Analisa imagem com Gemini AI (descrição detalhada para acessibilidade)
+    
+    Com stream=true a descrição chega em trechos via Server-Sent Events.
     """
     start_time = time.time()
     
-    if "imagem" not in request.files:
-        return jsonify({"erro": "Nenhuma imagem foi enviada"}), 400
-
-    imagem = request.files["imagem"]
+    imagem, campos, erro = _receive_upload(_draft_size("detalhado"))
+    if erro:
+        return erro
 
     try:
+        # Rótulos, notas e placas: lidos localmente antes de reduzir a imagem
+        resposta, triagem = _read_text_locally(imagem, campos, start_time, "detalhado")
+        if resposta is not None:
+            return resposta
+        
         # Reduz MUITO o tamanho para evitar finish_reason=2 (MAX_TOKENS)
         # Fotos da câmera vêm muito grandes e excedem o limite
-        optimizer_result = ImageOptimizer.optimize_for_ai(imagem, max_size=(384, 384), quality=60)
+        optimizer_result = ImageOptimizer.encode_for_preset(imagem, "detalhado")
         
         if optimizer_result["success"]:
-            optimized_image = optimizer_result["optimized_image"]
-            print(f"Imagem otimizada: {optimizer_result['compression_ratio']}% menor")
+            optimized_image = optimizer_result["payload"]
+            print(f"Imagem otimizada: {optimizer_result['compression_ratio']}% menor "
+                  f"({optimizer_result['format']}, {optimizer_result['new_dimensions']}, q={optimizer_result['encode_quality']})")
         else:
-            optimized_image = imagem
-            imagem.seek(0)
-        
-        resultado = process_image_gemini(optimized_image)
+            optimized_image = _original_payload(imagem)
         
-        processing_time = time.time() - start_time
-        resultado[0]["processing_time"] = round(processing_time, 2)
+        if _wants_stream(campos):
+            events = stream_image_cached(optimized_image, mode="detalhado")
+            return _sse_response(events, start_time, modo="detalhado", triagem=triagem)
         
-        return jsonify(resultado[0])
+        resultado, cache_info = process_image_cached(optimized_image, mode="detalhado")
+        return jsonify(_json_result(resultado, cache_info, start_time, "detalhado", triagem))
         
     except Exception as e:
         print("ERRO AO PROCESSAR IMAGEM:")
@@ -55,24 +191,27 @@ def analisar_rapido():
     """
     start_time = time.time()
     
-    if "imagem" not in request.files:
-        return jsonify({"erro": "Nenhuma imagem foi enviada"}), 400
-
-    imagem = request.files["imagem"]
+    imagem, campos, erro = _receive_upload(_draft_size("rapido"))
+    if erro:
+        return erro
     
     try:
-        quick_image = ImageOptimizer.quick_resize(imagem, target_size=(256, 256))
-        if not quick_image:
-            quick_image = imagem
-            imagem.seek(0)
+        resposta, triagem = _read_text_locally(imagem, campos, start_time, "rapido", {"mode": "rapido"})
+        if resposta is not None:
+            return resposta
+        
+        encoded = ImageOptimizer.encode_for_preset(imagem, "rapido")
+        quick_image = encoded["payload"] if encoded["success"] else _original_payload(imagem)
         
-        resultado = process_image_gemini(quick_image)
+        if _wants_stream(campos):
+            events = stream_image_cached(quick_image, mode="rapido")
+            return _sse_response(events, start_time, {"mode": "rapido"}, "rapido", triagem)
         
-        processing_time = time.time() - start_time
-        resultado[0]["processing_time"] = round(processing_time, 2)
-        resultado[0]["mode"] = "rapido"
+        resultado, cache_info = process_image_cached(quick_image, mode="rapido")
         
-        return jsonify(resultado[0])
+        resposta = _json_result(resultado, cache_info, start_time, "rapido", triagem)
+        resposta["mode"] = "rapido"
+        return jsonify(resposta)
         
     except Exception as e:
         return jsonify({"erro": f"Erro no processamento rápido: {str(e)}"}), 500
@@ -81,31 +220,47 @@ def analisar_rapido():
 @image_bp.route("/analisar-ultra", methods=["POST"])
 @optional_auth
 def analisar_ultra_rapido():
-    """Versão ultra-otimizada para máxima velocidade (sub 3 segundos)"""
+    """
+    Versão ultra-otimizada para máxima velocidade (sub 3 segundos)
+    
+    Não passa pela triagem de OCR: a imagem é decodificada perto de 256px,
+    pequena demais para o tesseract ler texto com confiança.
+    """
     start_time = time.time()
     
-    if "imagem" not in request.files:
-        return jsonify({"erro": "Nenhuma imagem foi enviada"}), 400
-
-    imagem = request.files["imagem"]
+    imagem, campos, erro = _receive_upload(
+        _draft_size("ultra"),
+        'L' if ENCODER_PRESETS['ultra']['GRAYSCALE'] else 'RGB'
+    )
+    if erro:
+        return erro
     
     try:
-        compressed_image = ImageOptimizer.compress_for_api(
-            imagem, 
-            max_size=(256, 256),
-            quality=30,
-            optimize=True
-        )
+        compressed = ImageOptimizer.encode_for_preset(imagem, "ultra")
+        compressed_image = compressed["payload"] if compressed["success"] else _original_payload(imagem)
         
-        resultado = process_image_gemini(compressed_image)
+        if _wants_stream(campos):
+            events = stream_image_cached(compressed_image, mode="ultra")
+            return _sse_response(events, start_time, {"modo": "ultra-rapido"}, "ultra")
         
-        processing_time = round(time.time() - start_time, 2)
+        resultado, cache_info = process_image_cached(compressed_image, mode="ultra")
+        
+        elapsed = time.time() - start_time
+        processing_time = round(elapsed, 2)
+        rota = _route_name(cache_info, curto_circuito=bool(resultado and resultado[0].get("curto_circuito")))
+        route_stats.record(f"ultra/{rota}", elapsed * 1000)
         
         response_data = {
             "objeto": resultado[0]["objeto"] if resultado else "Não foi possível analisar",
             "tempo_processamento": f"{processing_time}s",
-            "modo": "ultra-rapido"
+            "modo": "ultra-rapido",
+            "cache": cache_info,
+            "rota": rota
         }
+        if resultado and resultado[0].get("curto_circuito"):
+            # Foto recusada localmente: "objeto" traz a orientação ao usuário
+            response_data["curto_circuito"] = True
+            response_data["qualidade"] = resultado[0]["qualidade"]
         
         response = jsonify(response_data)
         response.headers['Cache-Control'] = 'no-cache, no-store'
@@ -121,3 +276,133 @@ def analisar_ultra_rapido():
         }), 500
 
 
+def _optimize_batch_item(imagem):
+    """Mesmo preset do /analisar, para compartilhar o cache com ele"""
+    payload = ImagePayload.from_upload(imagem)
+    optimizer_result = ImageOptimizer.encode_for_preset(payload, "detalhado")
+    return optimizer_result["payload"] if optimizer_result["success"] else payload
+
+
+@image_bp.route("/analisar-lote", methods=["POST"])
+@optional_auth
+def analisar_lote():
+    """
+    Analisa várias imagens de uma vez
+    
+    Aceita:
+    - imagens: vários arquivos no mesmo campo (máximo BATCH_CONFIG['MAX_IMAGES'])
+    
+    As imagens são otimizadas em paralelo e empacotadas em poucas chamadas
+    ao Gemini. Retorna as descrições na ordem de envio; falhas e bloqueios
+    de segurança aparecem no item correspondente, sem derrubar o lote.
+    """
+    start_time = time.time()
+    
+    imagens = request.files.getlist("imagens")
+    if not imagens:
+        return jsonify({"erro": "Nenhuma imagem foi enviada no campo 'imagens'"}), 400
+    
+    if len(imagens) > BATCH_CONFIG['MAX_IMAGES']:
+        return jsonify({"erro": f"Máximo de {BATCH_CONFIG['MAX_IMAGES']} imagens por lote"}), 400
+    
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_CONFIG['OPTIMIZE_WORKERS']) as executor:
+            items = list(executor.map(_optimize_batch_item, imagens))
+        
+        resultados, chamadas = process_images_batch(items)
+        
+        itens = []
+        for index, (imagem, (resultado, cache_info)) in enumerate(zip(imagens, resultados)):
+            item = dict(resultado[0])
+            item["indice"] = index
+            item["nome"] = imagem.filename
+            item["cache"] = cache_info
+            itens.append(item)
+        
+        return jsonify({
+            "resultados": itens,
+            "total": len(itens),
+            "chamadas_gemini": chamadas,
+            "processing_time": round(time.time() - start_time, 2)
+        })
+        
+    except Exception as e:
+        print("ERRO AO PROCESSAR LOTE:")
+        traceback.print_exc()
+        return jsonify({"erro": f"Erro no processamento do lote: {str(e)}"}), 500
+
+
+@image_bp.route("/analisar-modos", methods=["POST"])
+@optional_auth
+def analisar_modos():
+    """
+    Analisa a mesma imagem em vários modos ao mesmo tempo
+    
+    Aceita:
+    - imagem: arquivo de imagem
+    - modos: lista separada por vírgulas (padrão: "rapido,detalhado"); só
+      presets conhecidos (rapido, detalhado, ultra), sem repetição e até
+      ASYNC_CONFIG['MAX_MODES_PER_REQUEST']
+    
+    As chamadas ao Gemini de cada modo saem juntas no loop assíncrono do
+    worker, então o tempo total é o do modo mais lento, não a soma.
+    """
+    start_time = time.time()
+    
+    if "imagem" not in request.files:
+        return jsonify({"erro": "Nenhuma imagem foi enviada"}), 400
+    
+    modos = list(dict.fromkeys(
+        m.strip() for m in request.form.get("modos", "rapido,detalhado").split(",") if m.strip()
+    ))
+    if not modos:
+        return jsonify({"erro": "Nenhum modo informado"}), 400
+    invalidos = [m for m in modos if m not in ENCODER_PRESETS]
+    if invalidos:
+        return jsonify({"erro": f"Modos inválidos: {', '.join(invalidos)}",
+                        "modos_aceitos": list(ENCODER_PRESETS)}), 400
+    if len(modos) > ASYNC_CONFIG['MAX_MODES_PER_REQUEST']:
+        return jsonify({"erro": f"No máximo {ASYNC_CONFIG['MAX_MODES_PER_REQUEST']} modos por requisição"}), 400
+    
+    imagem = ImagePayload.from_upload(request.files["imagem"])
+    
+    try:
+        optimizer_result = ImageOptimizer.encode_for_preset(imagem, "detalhado")
+        optimized_image = optimizer_result["payload"] if optimizer_result["success"] else imagem
+        
+        resultados = async_processor.run_parallel(optimized_image, modos)
+        
+        return jsonify({
+            "resultados": resultados,
+            "processing_time": round(time.time() - start_time, 2)
+        })
+        
+    except Exception as e:
+        print("ERRO AO PROCESSAR MODOS:")
+        traceback.print_exc()
+        return jsonify({"erro": f"Erro no processamento: {str(e)}"}), 500
+
+
+@image_bp.route("/cache/estatisticas", methods=["GET"])
+def estatisticas_cache():
+    """
+    Estatísticas do cache de resultados deste worker
+    
+    Retorna:
+    - cache: acertos, falhas, despejos e expirações do LRU (e do nível compartilhado)
+    - quase_duplicatas: índice perceptual
+    - coalescencia: chamadas ao Gemini feitas e requisições coalescidas
+    - roteamento: latência (p50/p95) por modo e rota que atendeu
+      (ocr_local, gemini, gemini_apos_ocr, cache, qualidade)
+    - codificacao: por preset, formatos escolhidos, bytes e tempo médio de
+      codificação e o histograma de bytes enviados vs. latência do Gemini
+    - arquivos_gemini: documentos enviados ao Files API e reaproveitados
+    """
+    return jsonify({
+        "cache": image_cache.stats(),
+        "quase_duplicatas": perceptual_index.stats(),
+        "coalescencia": image_singleflight.stats(),
+        "roteamento": route_stats.stats(),
+        "codificacao": encoder_stats.stats(),
+        "arquivos_gemini": gemini_files.stats()
+    })
@@ -1,9 +1,12 @@
 import os
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 from controllers.image_controller import image_bp
 from controllers.document_controller import document_bp
 from controllers.auth_controller import auth_bp
+from controllers.camera_controller import camera_bp
+from services.gemini_registry import gemini_registry
+from utils.async_runtime import async_runtime
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,11 +20,22 @@ CORS(app)
 app.register_blueprint(auth_bp, url_prefix="/auth")
 app.register_blueprint(image_bp)
 app.register_blueprint(document_bp, url_prefix="/documento")
+app.register_blueprint(camera_bp)
+
+# Modelos Gemini criados uma vez por worker e reutilizados em todas as requisições
+gemini_registry.warm_up()
 
 @app.route("/")
 def home():
     return "Está rodando cidadão"
 
+@app.route("/estatisticas/gemini")
+def estatisticas_gemini():
+    """Tempo de construção dos modelos vs. tempo das chamadas, por perfil, e chamadas em voo"""
+    stats = gemini_registry.stats()
+    stats["assincrono"] = async_runtime.stats()
+    return jsonify(stats)
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,182 @@
+import collections
+import time
+from typing import Dict, List, Optional
+from PIL import Image
+import numpy as np
+from config import CAMERA_CONFIG, UPLOAD_CONFIG
+from services.image_service import _call_gemini, _interpret_response
+from utils.image_optimizer import ImageOptimizer
+from utils.image_payload import ImagePayload, detect_image_signature
+
+CAMERA_PROMPT = "Em 2 frases: o que está à frente da câmera? Seja direto e claro."
+
+CAMERA_DELTA_PROMPT = """Você narra a cena à frente da câmera para uma pessoa cega.
+Narração até agora: "{anterior}"
+Em 1 frase, diga apenas o que mudou nesta nova imagem. Se nada relevante mudou, responda apenas NADA."""
+
+NO_CHANGE = "NADA"
+
+
+class FrameTooLarge(ValueError):
+    """Quadro com mais pixels que o limite de upload"""
+
+
+def frame_thumbnail(payload: ImagePayload) -> np.ndarray:
+    """
+    Miniatura em tons de cinza (THUMBNAIL_SIZE) para comparar quadros
+
+    JPEG é decodificado direto em escala 1/8 (draft). O brilho médio é
+    subtraído para a exposição automática da câmera não contar como
+    mudança de cena. Quadros acima de UPLOAD_CONFIG['MAX_PIXELS'] são
+    recusados com FrameTooLarge pelas dimensões do cabeçalho, antes de
+    qualquer pixel ser decodificado (bomba de descompressão).
+    """
+    width, height = CAMERA_CONFIG['THUMBNAIL_SIZE']
+    image = Image.open(payload.stream())
+    if image.size[0] * image.size[1] > UPLOAD_CONFIG['MAX_PIXELS']:
+        raise FrameTooLarge(f"Quadro grande demais ({image.size[0]}x{image.size[1]} pixels).")
+    image.draft('L', (width * 4, height * 4))
+    image = image.convert('L').resize((width, height), Image.Resampling.BOX)
+    pixels = np.asarray(image, dtype=np.float32)
+    return pixels - pixels.mean()
+
+
+def scene_change(current: np.ndarray, reference: np.ndarray) -> float:
+    """Diferença média absoluta entre duas miniaturas, de 0 (iguais) a 1"""
+    return float(np.abs(current - reference).mean()) / 255
+
+
+class CallBudget:
+    """Chamadas ao upstream permitidas por sessão: intervalo mínimo e máximo por minuto (janela deslizante)"""
+
+    def __init__(self, per_minute: int, min_interval: float):
+        self.per_minute = per_minute
+        self.min_interval = min_interval
+        self.calls = collections.deque()
+
+    def wait_seconds(self, now: float) -> float:
+        """Segundos até a próxima chamada permitida (0 se já pode)"""
+        while self.calls and now - self.calls[0] >= 60:
+            self.calls.popleft()
+        wait = 0.0
+        if self.calls:
+            wait = self.min_interval - (now - self.calls[-1])
+        if len(self.calls) >= self.per_minute:
+            wait = max(wait, 60 - (now - self.calls[0]))
+        return max(wait, 0.0)
+
+    def spend(self, now: float) -> None:
+        self.calls.append(now)
+
+
+class CameraSession:
+    """
+    Narração contínua de uma conexão do modo câmera
+
+    Cada quadro é comparado, numa miniatura, com o último quadro narrado.
+    Só quando a cena mudou (SCENE_CHANGE_THRESHOLD) e o orçamento de
+    chamadas da sessão permite, o quadro passa pelo ImageOptimizer e pelo
+    quality_gate e vai ao Gemini, que recebe a narração anterior e devolve
+    só o que mudou. handle_frame devolve os eventos a enviar ao cliente.
+    """
+
+    def __init__(self, user_id: Optional[str] = None):
+        self.user_id = user_id
+        self.reference: Optional[np.ndarray] = None
+        # Últimas narrações, contexto para a próxima chamada
+        self.narrations = collections.deque(maxlen=3)
+        self.budget = CallBudget(CAMERA_CONFIG['MAX_CALLS_PER_MINUTE'], CAMERA_CONFIG['MIN_INTERVAL_SECONDS'])
+        self.last_quality_reason = None
+        self.limit_notified = False
+        self.started_at = time.time()
+        self.counters = collections.Counter()
+
+    def handle_frame(self, data: bytes) -> List[Dict]:
+        self.counters["quadros_recebidos"] += 1
+
+        if len(data) > CAMERA_CONFIG['MAX_FRAME_BYTES']:
+            return [{"evento": "erro", "mensagem": "Quadro grande demais"}]
+        if detect_image_signature(data) is None:
+            return [{"evento": "erro", "mensagem": "Formato de imagem inválido. Use JPG, PNG ou WebP."}]
+
+        payload = ImagePayload(data)
+        try:
+            thumbnail = frame_thumbnail(payload)
+        except FrameTooLarge as e:
+            return [{"evento": "erro", "mensagem": str(e)}]
+        except Exception as e:
+            return [{"evento": "erro", "mensagem": f"Não foi possível ler o quadro: {e}"}]
+
+        change = 1.0 if self.reference is None else scene_change(thumbnail, self.reference)
+        if change < CAMERA_CONFIG['SCENE_CHANGE_THRESHOLD']:
+            self.counters["quadros_sem_mudanca"] += 1
+            return []
+
+        now = time.time()
+        wait = self.budget.wait_seconds(now)
+        if wait > 0:
+            self.counters["quadros_limitados"] += 1
+            if self.limit_notified:
+                return []
+            # Avisa uma vez; a referência fica a mesma e o próximo quadro diferente tenta de novo
+            self.limit_notified = True
+            return [{
+                "evento": "limite",
+                "mensagem": "Muitas mudanças seguidas; a próxima narração sai em instantes.",
+                "retomar_em_s": round(wait, 1)
+            }]
+
+        compressed = ImageOptimizer.encode_for_preset(payload, "ultra")
+        if not compressed["success"]:
+            return [{"evento": "erro", "mensagem": compressed["error"]}]
+        frame = compressed["payload"]
+
+        if frame.quality is not None and not frame.quality["aprovada"]:
+            self.counters["quadros_recusados"] += 1
+            if frame.quality["motivo"] == self.last_quality_reason:
+                return []
+            self.last_quality_reason = frame.quality["motivo"]
+            return [{"evento": "qualidade", "motivo": frame.quality["motivo"], "mensagem": frame.quality["mensagem"]}]
+
+        return self._narrate(frame, thumbnail, change, now)
+
+    def _narrate(self, frame: ImagePayload, thumbnail: np.ndarray, change: float, now: float) -> List[Dict]:
+        self.budget.spend(now)
+        self.counters["chamadas_gemini"] += 1
+        inicial = not self.narrations
+        prompt = CAMERA_PROMPT if inicial else CAMERA_DELTA_PROMPT.format(anterior=" ".join(self.narrations))
+
+        start = time.perf_counter()
+        try:
+            resultado, cacheavel = _interpret_response(_call_gemini("image-fast", [prompt, frame.part()]))
+        except Exception as e:
+            return [{"evento": "erro", "mensagem": f"Erro ao narrar a cena: {e}"}]
+        tempo_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        if not cacheavel:
+            # Resposta vazia: a referência não muda e o próximo quadro tenta de novo
+            return [{"evento": "erro", "mensagem": resultado[0]["objeto"]}]
+
+        self.reference = thumbnail
+        self.last_quality_reason = None
+        self.limit_notified = False
+
+        texto = resultado[0]["objeto"].strip()
+        if not inicial and texto.rstrip(".").upper() == NO_CHANGE:
+            self.counters["narracoes_sem_mudanca"] += 1
+            return []
+
+        self.narrations.append(texto)
+        self.counters["narracoes"] += 1
+        return [{
+            "evento": "narracao",
+            "tipo": "inicial" if inicial else "mudanca",
+            "texto": texto,
+            "mudanca": round(change, 3),
+            "tempo_ms": tempo_ms
+        }]
+
+    def stats(self) -> Dict:
+        stats = dict(self.counters)
+        stats["duracao_s"] = round(time.time() - self.started_at, 1)
+        return stats
@@ -1,35 +1,28 @@
-import os
+import concurrent.futures
+import hashlib
 import io
-import tempfile
+import math
+import os
+import re
+import threading
+import time
+import zlib
 import fitz
 from docx import Document
 from PIL import Image
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from google.api_core import exceptions as google_exceptions
+from config import DOCUMENT_CONFIG
+from services.gemini_files import document_digest, gemini_files
+from services.gemini_registry import gemini_registry
+from services.ocr_pool import ocr_pool
+from services.ocr_service import TESSERACT_AVAILABLE
+from utils.cache import ImageCache
+from utils.document_cache import document_cache
+from utils.process_pool import ProcessPool, shared_file
+from utils.shared_cache import SQLiteCacheBackend
 
 
-def process_document_with_gemini(file_content, file_name, mime_type):
-    """
-    Envia arquivo direto pro Gemini 2.0 Flash para análise completa
-    """
-    try:
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        
-        # Salvar temporariamente para upload
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_name)[1]) as tmp_file:
-            tmp_file.write(file_content)
-            tmp_path = tmp_file.name
-        
-        try:
-            # Upload do arquivo para Gemini
-            print(f"📤 Enviando {file_name} para Gemini...")
-            uploaded_file = genai.upload_file(tmp_path, mime_type=mime_type)
-            print(f"✓ Arquivo enviado: {uploaded_file.uri}")
-            
-            # Processar com Gemini 2.5 Flash
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
-            prompt = """Analise este documento completamente e forneça:
+DOCUMENT_PROMPT = """Analise este documento completamente e forneça:
 
 1. **TEXTO COMPLETO**: Extraia TODO o texto do documento, incluindo:
    - Títulos e cabeçalhos
@@ -59,64 +52,270 @@ Formato da resposta:
 ===== IMAGENS =====
 [descrição das imagens, se houver]
 """
-            
-            response = model.generate_content(
-                [uploaded_file, prompt],
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                }
-            )
-            
-            # Parsear resposta
-            texto_completo = response.text
-            
-            # Tentar separar seções
-            resultado = {
-                "text_content": "",
-                "resumo": "",
-                "imagens_info": "",
-                "arquivo_info": {
-                    "nome": file_name,
-                    "tamanho_bytes": len(file_content),
-                    "processado_com": "Gemini 2.0 Flash"
-                }
+
+
+def _generate_with_document(file_content, file_name, mime_type, prompt, profile="document"):
+    """
+    Chama o Gemini com o documento anexado pelo caminho mais barato para o tamanho dele
+
+    - inline: até INLINE_MAX_BYTES, os bytes vão na própria chamada, como
+      as imagens em process_image_cached (sem upload separado)
+    - reaproveitado: o mesmo documento já está no Files API (gemini_files)
+    - upload: envia ao Files API e registra para as próximas vezes
+
+    Se o arquivo reaproveitado tiver sido apagado no servidor antes da
+    expiração registrada, esquece o registro e reenvia uma vez.
+    Retorna (resposta, caminho, tempos_ms por etapa).
+    """
+    tempos = {}
+    if len(file_content) <= DOCUMENT_CONFIG['INLINE_MAX_BYTES'] and mime_type in DOCUMENT_CONFIG['INLINE_MIME_TYPES']:
+        print(f"📎 Enviando {file_name} inline ({len(file_content)} bytes)")
+        start = time.perf_counter()
+        response = gemini_registry.generate(profile, [{"mime_type": mime_type, "data": file_content}, prompt])
+        tempos["geracao"] = round((time.perf_counter() - start) * 1000, 1)
+        return response, "inline", tempos
+
+    start = time.perf_counter()
+    uploaded_file, reused = gemini_files.get_or_upload(file_content, mime_type, display_name=file_name)
+    tempos["upload"] = round((time.perf_counter() - start) * 1000, 1)
+    if reused:
+        print(f"♻️ Reaproveitando {file_name} já enviado: {uploaded_file.uri}")
+    else:
+        print(f"✓ Arquivo enviado: {uploaded_file.uri}")
+
+    start = time.perf_counter()
+    try:
+        response = gemini_registry.generate(profile, [uploaded_file, prompt])
+    except (google_exceptions.NotFound, google_exceptions.PermissionDenied) as e:
+        if not reused:
+            raise
+        print(f"⚠️ Arquivo reaproveitado não está mais disponível ({e}), reenviando...")
+        gemini_files.forget(document_digest(file_content, mime_type))
+        start = time.perf_counter()
+        uploaded_file, reused = gemini_files.get_or_upload(file_content, mime_type, display_name=file_name)
+        tempos["upload"] = round((time.perf_counter() - start) * 1000, 1)
+        start = time.perf_counter()
+        response = gemini_registry.generate(profile, [uploaded_file, prompt])
+    tempos["geracao"] = round((time.perf_counter() - start) * 1000, 1)
+    return response, "reaproveitado" if reused else "upload", tempos
+
+
+def process_document_with_gemini(file_content, file_name, mime_type):
+    """
+    Envia arquivo direto pro Gemini 2.0 Flash para análise completa
+    """
+    try:
+        inicio = time.perf_counter()
+        gemini_registry.ensure_configured()
+        
+        # Inline, upload ou arquivo já enviado, conforme o tamanho e o registro
+        print(f"📤 Enviando {file_name} para Gemini...")
+        
+        # Processar com Gemini 2.5 Flash
+        response, envio, tempos = _generate_with_document(file_content, file_name, mime_type, DOCUMENT_PROMPT)
+        
+        # Parsear resposta
+        start = time.perf_counter()
+        texto_completo = response.text
+        
+        # Tentar separar seções
+        resultado = {
+            "text_content": "",
+            "resumo": "",
+            "imagens_info": "",
+            "arquivo_info": {
+                "nome": file_name,
+                "tamanho_bytes": len(file_content),
+                "processado_com": "Gemini 2.0 Flash",
+                "envio": envio,
+                "tempos_ms": tempos
             }
-            
-            if "===== TEXTO COMPLETO =====" in texto_completo:
-                partes = texto_completo.split("=====")
-                for i, parte in enumerate(partes):
-                    if "TEXTO COMPLETO" in parte and i+1 < len(partes):
-                        resultado["text_content"] = partes[i+1].strip()
-                    elif "RESUMO" in parte and i+1 < len(partes):
-                        resultado["resumo"] = partes[i+1].strip()
-                    elif "IMAGENS" in parte and i+1 < len(partes):
-                        resultado["imagens_info"] = partes[i+1].strip()
-            else:
-                # Se não tiver formatação, usa tudo como texto
-                resultado["text_content"] = texto_completo
-            
-            # Extrair palavras-chave do texto
-            if resultado["text_content"]:
-                resultado["palavras_chave"] = extract_keywords_from_text(resultado["text_content"])
-            
-            print("✅ Documento processado com Gemini!")
-            return resultado
-            
-        finally:
-            # Limpar arquivo temporário
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-            
+        }
+        
+        if "===== TEXTO COMPLETO =====" in texto_completo:
+            partes = texto_completo.split("=====")
+            for i, parte in enumerate(partes):
+                if "TEXTO COMPLETO" in parte and i+1 < len(partes):
+                    resultado["text_content"] = partes[i+1].strip()
+                elif "RESUMO" in parte and i+1 < len(partes):
+                    resultado["resumo"] = partes[i+1].strip()
+                elif "IMAGENS" in parte and i+1 < len(partes):
+                    resultado["imagens_info"] = partes[i+1].strip()
+        else:
+            # Se não tiver formatação, usa tudo como texto
+            resultado["text_content"] = texto_completo
+
+        # Extrair palavras-chave do texto
+        if resultado["text_content"]:
+            resultado["palavras_chave"] = extract_keywords_from_text(resultado["text_content"])
+
+        tempos["leitura_resposta"] = round((time.perf_counter() - start) * 1000, 1)
+        tempos["total"] = round((time.perf_counter() - inicio) * 1000, 1)
+        print(f"✅ Documento processado com Gemini! ({envio}, {tempos})")
+        return resultado
+        
     except Exception as e:
         print(f"❌ Erro ao processar com Gemini: {e}")
         return {"erro": f"Erro ao processar documento: {str(e)}"}
 
+def _extract_pdf_page(page, page_num):
+    """
+    Texto e estrutura de uma página de PDF
+
+    Retorna (texto da página com o marcador "--- Página N ---", estrutura
+    da página). Cada título da estrutura já traz o número da página.
+    """
+    # Sem as imagens: blocos de imagem não são usados e trariam os bytes de cada uma
+    blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+    lines = [f"\n--- Página {page_num + 1} ---\n"]
+    page_structure = {
+        "page_number": page_num + 1,
+        "headings": [],
+        "paragraphs": [],
+        "images": []
+    }
+    
+    for block in blocks["blocks"]:
+        if "lines" in block:
+            for line in block["lines"]:
+                line_text = "".join(span["text"] for span in line["spans"])
+                font_size = max((span["size"] for span in line["spans"]), default=0)
+                
+                if line_text.strip():
+                    if font_size > 14:
+                        page_structure["headings"].append({
+                            "text": line_text.strip(),
+                            "level": 1 if font_size > 18 else 2,
+                            "page": page_num + 1
+                        })
+                    else:
+                        page_structure["paragraphs"].append(line_text.strip())
+                    
+                    lines.append(line_text + "\n")
+    
+    return "".join(lines), page_structure
+
+
+def _needs_ocr(page_structure):
+    """Página sem nenhuma linha de texto (digitalizada): o texto só sai por OCR"""
+    return (TESSERACT_AVAILABLE and "erro" not in page_structure
+            and not page_structure["headings"] and not page_structure["paragraphs"])
+
+
+def _with_ocr_text(page_text, ocr_text):
+    if not ocr_text:
+        return page_text
+    print(f"  ✓ OCR extraiu {len(ocr_text)} caracteres")
+    return page_text + f"[OCR]: {ocr_text}\n"
+
+
+def _apply_ocr(file_content, pages):
+    """
+    OCR das páginas sem texto de [(texto, estrutura)], em lote no ocr_pool
+
+    As páginas escaneadas vão todas de uma vez para o pool, que as
+    renderiza em tons de cinza no DPI adequado e as lê em paralelo.
+    """
+    missing = [i for i, (_, page_structure) in enumerate(pages) if _needs_ocr(page_structure)]
+    if not missing:
+        return pages
+
+    page_numbers = [pages[i][1]["page_number"] - 1 for i in missing]
+    for n in page_numbers:
+        print(f"  Página {n + 1} sem texto, aplicando OCR...")
+    try:
+        ocr_texts = ocr_pool.ocr_pdf_pages(file_content, page_numbers)
+    except Exception as e:
+        print(f"  Erro no OCR das páginas {[n + 1 for n in page_numbers]}: {e}")
+        return pages
+    pages = list(pages)
+    for i, ocr_text in zip(missing, ocr_texts):
+        page_text, page_structure = pages[i]
+        pages[i] = (_with_ocr_text(page_text, ocr_text), page_structure)
+    return pages
+
+
+def _add_page_structure(structure, page_structure):
+    """Acrescenta a estrutura de uma página à estrutura do documento"""
+    structure["pages"].append(page_structure)
+    structure["headings"].extend(page_structure["headings"])
+    structure["paragraphs"].extend(
+        {"text": paragraph, "page": page_structure["page_number"]}
+        for paragraph in page_structure["paragraphs"]
+    )
+
+
+pdf_pool = ProcessPool("pdf", DOCUMENT_CONFIG['PDF_WORKERS'])
+
+
+def _extract_pdf_pages_task(path, page_numbers):
+    """Tarefa do pdf_pool: reabre o PDF pelo arquivo compartilhado e extrai as páginas pedidas"""
+    pdf_doc = fitz.open(path, filetype="pdf")
+    try:
+        return [_extract_pdf_page(pdf_doc.load_page(n), n) for n in page_numbers]
+    finally:
+        pdf_doc.close()
+
+
+def _extract_pdf_pages(pdf_doc, file_content, page_numbers, pool=None):
+    """
+    Extrai as páginas pedidas (números base 0) e devolve [(texto, estrutura)] na mesma ordem
+
+    Com PARALLEL_MIN_PAGES páginas ou mais e mais de um processo no pool,
+    as páginas são divididas em faixas contíguas (TASKS_PER_WORKER por
+    processo, para equilibrar páginas mais pesadas) e cada processo reabre
+    o documento a partir do arquivo compartilhado, sem receber os bytes
+    por pickle. O resultado é o mesmo da extração em série, que também é o
+    fallback se o pool falhar. Páginas sem texto passam depois pelo OCR
+    (_apply_ocr).
+    """
+    pool = pool or pdf_pool
+    if pool.workers > 1 and len(page_numbers) >= DOCUMENT_CONFIG['PARALLEL_MIN_PAGES']:
+        size = math.ceil(len(page_numbers) / (pool.workers * DOCUMENT_CONFIG['TASKS_PER_WORKER']))
+        ranges = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+        try:
+            with shared_file(file_content, ".pdf") as path:
+                chunks = pool.map_ordered(
+                    _extract_pdf_pages_task,
+                    [(path, pages) for pages in ranges],
+                    timeout=DOCUMENT_CONFIG['PARALLEL_TIMEOUT_SECONDS']
+                )
+        except Exception as e:
+            print(f"⚠️ Extração paralela falhou ({e}), extraindo em série")
+        else:
+            # Fora do try: uma falha no OCR não pode refazer a extração em série
+            return _apply_ocr(file_content, [page for chunk in chunks for page in chunk])
+
+    return _apply_ocr(file_content, [_extract_pdf_page(pdf_doc.load_page(n), n) for n in page_numbers])
+
+
+def iter_pdf_pages(pdf_doc):
+    """
+    Gerador: (texto, estrutura) de cada página do PDF aberto, na ordem, uma por vez
+
+    Mesmo resultado página a página de extract_text_from_pdf, mas em série
+    e sem acumular nada: a primeira página sai sem esperar as outras. Uma
+    página que falha vem com texto vazio e "erro" na estrutura, e as
+    seguintes continuam.
+    """
+    for n in range(len(pdf_doc)):
+        try:
+            page = pdf_doc.load_page(n)
+            page_text, page_structure = _extract_pdf_page(page, n)
+            if _needs_ocr(page_structure):
+                print(f"  Página {n + 1} sem texto, aplicando OCR...")
+                page_text = _with_ocr_text(page_text, ocr_pool.ocr_page(page))
+            yield page_text, page_structure
+        except Exception as e:
+            yield "", {"page_number": n + 1, "headings": [], "paragraphs": [], "images": [], "erro": str(e)}
+
+
 def extract_text_from_pdf(file_content):
     """
     Extrai texto de PDF com estrutura preservada
+
+    PDFs grandes são extraídos em paralelo no pdf_pool (_extract_pdf_pages),
+    com o mesmo resultado da extração em série.
     """
     try:
         pdf_doc = fitz.open(stream=file_content, filetype="pdf")
@@ -135,82 +334,71 @@ def extract_text_from_pdf(file_content):
             }
         }
         
-        full_text = ""
+        page_texts = []
         
-        for page_num in range(len(pdf_doc)):
-            page = pdf_doc.load_page(page_num)
-            
-            blocks = page.get_text("dict")
-            page_text = ""
-            page_structure = {
-                "page_number": page_num + 1,
-                "headings": [],
-                "paragraphs": [],
-                "images": []
-            }
-            
-            for block in blocks["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        line_text = ""
-                        font_size = 0
-                        
-                        for span in line["spans"]:
-                            line_text += span["text"]
-                            font_size = max(font_size, span["size"])
-                        
-                        if line_text.strip():
-                            if font_size > 14:
-                                page_structure["headings"].append({
-                                    "text": line_text.strip(),
-                                    "level": 1 if font_size > 18 else 2,
-                                    "page": page_num + 1
-                                })
-                                extracted_data["structure"]["headings"].append({
-                                    "text": line_text.strip(),
-                                    "level": 1 if font_size > 18 else 2,
-                                    "page": page_num + 1
-                                })
-                            else:
-                                page_structure["paragraphs"].append(line_text.strip())
-                                extracted_data["structure"]["paragraphs"].append({
-                                    "text": line_text.strip(),
-                                    "page": page_num + 1
-                                })
-                            
-                            page_text += line_text + "\n"
-            
-            extracted_data["structure"]["pages"].append(page_structure)
-            full_text += f"\n--- Página {page_num + 1} ---\n" + page_text
-            
-            # Se a página não tem texto, tentar OCR na imagem da página
-            if not page_text.strip() and TESSERACT_AVAILABLE:
-                try:
-                    print(f"  Página {page_num + 1} sem texto, aplicando OCR...")
-                    pix = page.get_pixmap(dpi=150)
-                    img_bytes = pix.tobytes("png")
-                    pil_img = Image.open(io.BytesIO(img_bytes))
-                    ocr_text = pytesseract.image_to_string(pil_img, lang='por', config='--oem 3 --psm 6').strip()
-                    if ocr_text:
-                        full_text += f"[OCR]: {ocr_text}\n"
-                        print(f"  ✓ OCR extraiu {len(ocr_text)} caracteres")
-                except Exception as e:
-                    print(f"  Erro no OCR página {page_num + 1}: {e}")
+        for page_text, page_structure in _extract_pdf_pages(pdf_doc, file_content, list(range(len(pdf_doc)))):
+            _add_page_structure(extracted_data["structure"], page_structure)
+            page_texts.append(page_text)
         
         pdf_doc.close()
-        extracted_data["text_content"] = full_text
+        extracted_data["text_content"] = "".join(page_texts)
         return extracted_data
         
     except Exception as e:
         return {"erro": f"Erro ao processar PDF: {str(e)}"}
 
+def iter_docx_sections(file_content):
+    """
+    Gerador: seções de um DOCX na ordem do documento, uma por vez
+
+    Cada título (estilo Heading N) abre uma seção; parágrafos antes do
+    primeiro título formam uma seção sem título. Depois das seções vêm as
+    tabelas. Produz ("secao", {"heading", "paragraphs", "text"}) e
+    ("tabela", {"data", "rows", "columns"}); concatenar os "text" das
+    seções dá o text_content de extract_text_from_docx.
+    """
+    doc = Document(io.BytesIO(file_content))
+    section = {"heading": None, "paragraphs": [], "text": ""}
+    lines = []
+    
+    for para in doc.paragraphs:
+        if para.text.strip():
+            if para.style.name.startswith('Heading'):
+                if lines:
+                    section["text"] = "".join(lines)
+                    yield "secao", section
+                level = int(para.style.name.split()[-1]) if para.style.name.split()[-1].isdigit() else 1
+                section = {"heading": {"text": para.text.strip(), "level": level}, "paragraphs": [], "text": ""}
+                lines = []
+            else:
+                section["paragraphs"].append({"text": para.text.strip()})
+            
+            lines.append(para.text + "\n")
+    
+    if lines:
+        section["text"] = "".join(lines)
+        yield "secao", section
+    
+    for table in doc.tables:
+        table_data = []
+        for row in table.rows:
+            row_data = []
+            for cell in row.cells:
+                row_data.append(cell.text.strip())
+            table_data.append(row_data)
+        
+        yield "tabela", {
+            "data": table_data,
+            "rows": len(table_data),
+            "columns": len(table_data[0]) if table_data else 0
+        }
+
+
 def extract_text_from_docx(file_content):
     """
     Extrai texto de DOCX preservando estrutura
     """
     try:
-        doc = Document(io.BytesIO(file_content))
-        
         extracted_data = {
             "text_content": "",
             "structure": {
@@ -220,109 +408,264 @@ def extract_text_from_docx(file_content):
             }
         }
         
-        full_text = ""
+        section_texts = []
         
-        for para in doc.paragraphs:
-            if para.text.strip():
-                if para.style.name.startswith('Heading'):
-                    level = int(para.style.name.split()[-1]) if para.style.name.split()[-1].isdigit() else 1
-                    extracted_data["structure"]["headings"].append({
-                        "text": para.text.strip(),
-                        "level": level
-                    })
-                else:
-                    extracted_data["structure"]["paragraphs"].append({
-                        "text": para.text.strip()
-                    })
-                
-                full_text += para.text + "\n"
-        
-        for table in doc.tables:
-            table_data = []
-            for row in table.rows:
-                row_data = []
-                for cell in row.cells:
-                    row_data.append(cell.text.strip())
-                table_data.append(row_data)
-            
-            extracted_data["structure"]["tables"].append({
-                "data": table_data,
-                "rows": len(table_data),
-                "columns": len(table_data[0]) if table_data else 0
-            })
+        for kind, item in iter_docx_sections(file_content):
+            if kind == "tabela":
+                extracted_data["structure"]["tables"].append(item)
+                continue
+            if item["heading"]:
+                extracted_data["structure"]["headings"].append(item["heading"])
+            extracted_data["structure"]["paragraphs"].extend(item["paragraphs"])
+            section_texts.append(item["text"])
         
-        extracted_data["text_content"] = full_text
+        extracted_data["text_content"] = "".join(section_texts)
         return extracted_data
         
     except Exception as e:
         return {"erro": f"Erro ao processar DOCX: {str(e)}"}
 
 
+PAGE_MARKER = re.compile(r"^--- Página \d+ ---$")
+
+SUMMARY_PROMPT = """Analise o seguinte texto e gere um resumo estruturado e acessível:
+
+1. Resumo principal (2-3 frases)
+2. Pontos-chave (máximo 5 tópicos)
+3. Estrutura do documento (tipo de documento, seções principais)
+
+Texto para resumir:
+"""
+
+CHUNK_SUMMARY_PROMPT = """Resuma o trecho abaixo, que faz parte de um documento maior.
+Mantenha fatos, números, nomes, definições e conclusões importantes, em tópicos curtos.
+Não comente que se trata de um trecho.
+
+Trecho:
+"""
+
+REDUCE_SUMMARY_PROMPT = """Abaixo estão os resumos das partes de um documento, na ordem em que aparecem.
+Com base neles, gere um resumo estruturado e acessível do documento inteiro:
+
+1. Resumo principal (2-3 frases)
+2. Pontos-chave (máximo 5 tópicos)
+3. Estrutura do documento (tipo de documento, seções principais)
+
+Resumos das partes:
+"""
+
+
+def _create_summary_backend():
+    path = DOCUMENT_CONFIG['SUMMARY_CACHE_PATH']
+    if not path:
+        return None
+    try:
+        return SQLiteCacheBackend(
+            path,
+            max_bytes=DOCUMENT_CONFIG['SUMMARY_CACHE_MAX_BYTES'],
+            ttl_seconds=DOCUMENT_CONFIG['SUMMARY_CACHE_TTL_SECONDS']
+        )
+    except Exception as e:
+        print(f"Cache de resumos compartilhado indisponível, usando só memória: {e}")
+        return None
+
+
+# Resumo de cada trecho pelo hash do texto (e do prompt): editar um documento
+# só refaz os trechos que mudaram
+summary_cache = ImageCache(
+    max_bytes=DOCUMENT_CONFIG['SUMMARY_CACHE_MAX_BYTES'] // 4,
+    ttl_seconds=DOCUMENT_CONFIG['SUMMARY_CACHE_TTL_SECONDS'],
+    backend=_create_summary_backend()
+)
+
+
+def _split_lines(text, is_boundary):
+    """Corta text antes de cada linha em que is_boundary(linha sem espaços) é verdadeiro"""
+    pieces = []
+    current = []
+    for line in text.splitlines(keepends=True):
+        if current and is_boundary(line.strip()):
+            pieces.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def _is_cut_point(piece):
+    # Decidido só pela primeira linha (título ou marcador de página): editar o
+    # corpo de uma seção não muda onde os trechos seguintes começam
+    first_line = piece.lstrip("\n").split("\n", 1)[0]
+    return zlib.crc32(first_line.encode("utf-8")) % 4 == 0
+
+
+def _pack(pieces, max_chars):
+    """
+    Junta pedaços consecutivos em trechos de até max_chars
+
+    Além do limite, um trecho com pelo menos 1/4 de max_chars também fecha
+    antes de um pedaço que seja ponto de corte (_is_cut_point). Como isso
+    depende do conteúdo e não da posição, os cortes se realinham logo depois
+    de uma edição e os trechos seguintes continuam iguais (e em cache).
+    """
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and (len(current) + len(piece) > max_chars
+                        or (len(current) >= max_chars // 4 and _is_cut_point(piece))):
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_into_chunks(text_content, headings=None, max_chars=None):
+    """
+    Divide o texto do documento em trechos para o resumo
+
+    Os cortes seguem os títulos encontrados pelos extratores (headings da
+    estrutura); uma seção maior que max_chars é cortada nos marcadores de
+    página ("--- Página N ---") e, se ainda for grande, entre linhas.
+    """
+    max_chars = max_chars or DOCUMENT_CONFIG['SUMMARY_CHUNK_CHARS']
+    if len(text_content) <= max_chars:
+        return [text_content]
+    heading_texts = {heading["text"].strip() for heading in headings or [] if heading.get("text")}
+
+    pieces = []
+    for section in _split_lines(text_content, lambda line: line in heading_texts):
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for part in _split_lines(section, PAGE_MARKER.match):
+            if len(part) <= max_chars:
+                pieces.append(part)
+                continue
+            lines = []
+            for line in part.splitlines(keepends=True):
+                lines.extend(line[i:i + max_chars] for i in range(0, len(line), max_chars))
+            pieces.extend(_pack(lines, max_chars))
+    return _pack(pieces, max_chars)
+
+
+def _summarize_cached(prompt, text):
+    """Resumo de text com prompt, pelo summary_cache; retorna (resumo, veio_do_cache)"""
+    content = text.encode("utf-8")
+    cached = summary_cache.get(content, "resumo", prompt)
+    if cached is not None:
+        return cached["resumo"], True
+
+    response = gemini_registry.generate("summary", prompt + text)
+    resumo = response.text.strip()
+    summary_cache.set(content, "resumo", {"resumo": resumo}, prompt)
+    return resumo, False
+
+
+def _summarize_chunks(chunks):
+    """
+    Resume os trechos em paralelo (até SUMMARY_CONCURRENCY chamadas por vez)
+
+    Retorna (resumos na ordem dos trechos, em cache, com erro); um trecho
+    que falha fica de fora em vez de derrubar o resumo inteiro.
+    """
+    summaries = [None] * len(chunks)
+    cached = 0
+    errors = 0
+    workers = max(1, min(DOCUMENT_CONFIG['SUMMARY_CONCURRENCY'], len(chunks)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_summarize_cached, CHUNK_SUMMARY_PROMPT, chunk) for chunk in chunks]
+        for index, future in enumerate(futures):
+            try:
+                summaries[index], hit = future.result()
+                cached += hit
+            except Exception as e:
+                errors += 1
+                print(f"  Erro no resumo do trecho {index + 1}/{len(chunks)}: {e}")
+    return [summary for summary in summaries if summary], cached, errors
+
 
-def generate_document_summary(text_content):
+def generate_document_summary(text_content, headings=None):
     """
     Gera resumo automático do documento usando Gemini
+
+    Documentos que cabem num trecho (SUMMARY_CHUNK_CHARS) são resumidos
+    numa chamada só. Os maiores passam por map-reduce: split_into_chunks
+    corta o texto nos títulos/páginas, cada trecho é resumido em paralelo
+    (map) e os resumos dos trechos viram o resumo final (reduce). Se os
+    resumos juntos ainda forem maiores que um trecho, são resumidos de novo
+    em grupos antes do reduce. Todos os resumos ficam no summary_cache pelo
+    hash do texto.
     """
     try:
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        model = genai.GenerativeModel(model_name="gemini-2.5-flash")
-        
-        prompt = f"""
-        Analise o seguinte texto e gere um resumo estruturado e acessível:
-        
-        1. Resumo principal (2-3 frases)
-        2. Pontos-chave (máximo 5 tópicos)
-        3. Estrutura do documento (tipo de documento, seções principais)
-        
-        Texto para resumir:
-        {text_content[:15000]}
-        """
-        
-        response = model.generate_content(
-            prompt,
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            }
-        )
-        
+        max_chars = DOCUMENT_CONFIG['SUMMARY_CHUNK_CHARS']
+        chunks = split_into_chunks(text_content, headings, max_chars)
+        info = {"trechos": len(chunks), "trechos_em_cache": 0, "trechos_com_erro": 0, "niveis": 1}
+
+        if len(chunks) <= 1:
+            resumo, hit = _summarize_cached(SUMMARY_PROMPT, text_content)
+            info["trechos_em_cache"] = int(hit)
+        else:
+            summaries, info["trechos_em_cache"], info["trechos_com_erro"] = _summarize_chunks(chunks)
+            if not summaries:
+                return {"erro": "Erro ao gerar resumo: nenhum trecho foi resumido"}
+
+            separator = "\n\n---\n\n"
+            while len(summaries) > 1 and len(separator.join(summaries)) > max_chars:
+                info["niveis"] += 1
+                groups = _pack([summary + separator for summary in summaries], max_chars)
+                if len(groups) == len(summaries):
+                    # Cada resumo já ocupa um trecho: juntar mais não reduziria nada
+                    break
+                summaries, _, errors = _summarize_chunks(groups)
+                info["trechos_com_erro"] += errors
+                if not summaries:
+                    return {"erro": "Erro ao gerar resumo: nenhum grupo de resumos foi resumido"}
+
+            resumo, _ = _summarize_cached(REDUCE_SUMMARY_PROMPT, separator.join(summaries))
+            info["niveis"] += 1
+
         return {
-            "resumo": response.text.strip(),
-            "palavras_chave": extract_keywords_from_text(text_content)
+            "resumo": resumo,
+            "palavras_chave": extract_keywords_from_text(text_content),
+            "resumo_info": info
         }
         
     except Exception as e:
         return {"erro": f"Erro ao gerar resumo: {str(e)}"}
 
+STOP_WORDS = {
+    'o', 'a', 'os', 'as', 'um', 'uma', 'uns', 'umas', 'de', 'do', 'da', 'dos', 'das',
+    'em', 'no', 'na', 'nos', 'nas', 'por', 'para', 'com', 'sem', 'sob', 'sobre',
+    'e', 'ou', 'mas', 'se', 'que', 'quando', 'como', 'onde', 'porque', 'então',
+    'ele', 'ela', 'eles', 'elas', 'eu', 'tu', 'você', 'nós', 'vós', 'vocês',
+    'este', 'esta', 'estes', 'estas', 'esse', 'essa', 'esses', 'essas',
+    'aquele', 'aquela', 'aqueles', 'aquelas', 'isto', 'isso', 'aquilo'
+}
+
+
+def count_keywords(text, word_count):
+    """Soma as ocorrências das palavras de text em word_count (permite contar por partes)"""
+    for word in text.lower().split():
+        clean_word = ''.join(c for c in word if c.isalnum())
+        if len(clean_word) > 3 and clean_word not in STOP_WORDS:
+            word_count[clean_word] = word_count.get(clean_word, 0) + 1
+
+
+def top_keywords(word_count):
+    sorted_words = sorted(word_count.items(), key=lambda x: x[1], reverse=True)
+    return [word for word, count in sorted_words[:10]]
+
+
 def extract_keywords_from_text(text):
     """
     Extrai palavras-chave importantes do texto
     """
-    words = text.lower().split()
-    
-    stop_words = {
-        'o', 'a', 'os', 'as', 'um', 'uma', 'uns', 'umas', 'de', 'do', 'da', 'dos', 'das',
-        'em', 'no', 'na', 'nos', 'nas', 'por', 'para', 'com', 'sem', 'sob', 'sobre',
-        'e', 'ou', 'mas', 'se', 'que', 'quando', 'como', 'onde', 'porque', 'então',
-        'ele', 'ela', 'eles', 'elas', 'eu', 'tu', 'você', 'nós', 'vós', 'vocês',
-        'este', 'esta', 'estes', 'estas', 'esse', 'essa', 'esses', 'essas',
-        'aquele', 'aquela', 'aqueles', 'aquelas', 'isto', 'isso', 'aquilo'
-    }
-    
-    keywords = []
     word_count = {}
-    
-    for word in words:
-        clean_word = ''.join(c for c in word if c.isalnum())
-        if len(clean_word) > 3 and clean_word not in stop_words:
-            word_count[clean_word] = word_count.get(clean_word, 0) + 1
-    
-    sorted_words = sorted(word_count.items(), key=lambda x: x[1], reverse=True)
-    keywords = [word for word, count in sorted_words[:10]]
-    
-    return keywords
+    count_keywords(text, word_count)
+    return top_keywords(word_count)
 
 def search_text_in_document(text_content, search_term):
     """
@@ -397,7 +740,7 @@ def analyze_image_with_ocr(pil_image, document_context="", page_num=None):
         print(f"  🔍 Contexto recebido: {len(document_context)} caracteres")
         
         # OCR
-        texto_ocr = pytesseract.image_to_string(pil_image, lang='por', config='--oem 3 --psm 6').strip()
+        texto_ocr = ocr_pool.ocr_image(pil_image)
         if not texto_ocr or len(texto_ocr) < 10:
             print(f"  ⚠️ OCR muito curto ou vazio ({len(texto_ocr)} chars)")
             return None, ""
@@ -405,9 +748,6 @@ def analyze_image_with_ocr(pil_image, document_context="", page_num=None):
         print(f"  ✓ OCR extraiu {len(texto_ocr)} caracteres")
         
         # Análise com Gemini COM CONTEXTO
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
         # Usar contexto mais amplo do documento (até 3000 caracteres)
         context_preview = document_context[:3000] if document_context else ""
         
@@ -440,49 +780,439 @@ Descreva brevemente:
 1. Tipo de elemento visual
 2. Conteúdo/mensagem principal"""
         
-        response = model.generate_content(prompt, safety_settings={
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-        })
+        response = gemini_registry.generate("document", prompt)
         return response.text.strip(), texto_ocr
     except Exception as e:
         print(f"Erro OCR: {e}")
         return None, ""
 
 
+PAGES_PROMPT = """Este PDF contém apenas algumas páginas de um documento maior: as páginas {paginas}, nesta ordem.
+
+Para cada página, extraia TODO o texto (títulos, parágrafos, tabelas, legendas e texto dentro de imagens).
+Se a página tiver imagens, gráficos ou diagramas, descreva cada um brevemente numa linha começando com [IMAGENS]:
+
+Formato da resposta, uma seção por página, com o número ORIGINAL da página:
+===== PÁGINA {primeira} =====
+[texto extraído]
+[IMAGENS]: [descrição das imagens, se houver]
+"""
+
+PAGE_SECTION = re.compile(r"=====\s*P[ÁA]GINA\s+(\d+)\s*=====", re.IGNORECASE)
+
+
+class RemotePageCost:
+    """
+    Tempo médio do Gemini por página de PDF (média móvel exponencial)
+
+    Usado para estimar quanto tempo as páginas extraídas localmente
+    economizaram. Começa em REMOTE_MS_PER_PAGE e é atualizado a cada
+    chamada de documento observada.
+    """
+
+    def __init__(self, initial_ms: float, alpha: float = 0.2):
+        self.lock = threading.Lock()
+        self.ms_per_page = initial_ms
+        self.alpha = alpha
+
+    def observe(self, pages: int, elapsed_ms: float) -> None:
+        if pages <= 0:
+            return
+        with self.lock:
+            self.ms_per_page += self.alpha * (elapsed_ms / pages - self.ms_per_page)
+
+    def estimate(self, pages: int) -> float:
+        with self.lock:
+            return pages * self.ms_per_page
+
+
+remote_page_cost = RemotePageCost(DOCUMENT_CONFIG['REMOTE_MS_PER_PAGE'])
+
+
+def classify_pdf_page(page, analisar_imagens=True):
+    """
+    Decide se uma página de PDF pode ser extraída localmente
+
+    - digitalizada: menos de MIN_PAGE_TEXT_CHARS caracteres na camada de
+      texto (página escaneada ou só imagem) -> Gemini
+    - figuras: imagens cobrem FIGURE_COVERAGE da página ou mais e
+      analisar_imagens está ligado -> Gemini, para descrevê-las
+    - texto: texto nativo -> extração local
+    Retorna (rota "local" ou "gemini", motivo).
+    """
+    chars = len(page.get_text("text").strip())
+    if chars < DOCUMENT_CONFIG['MIN_PAGE_TEXT_CHARS']:
+        return "gemini", "digitalizada"
+
+    if analisar_imagens:
+        page_area = page.rect.get_area() or 1
+        covered = sum((fitz.Rect(info["bbox"]) & page.rect).get_area() for info in page.get_image_info())
+        if covered / page_area >= DOCUMENT_CONFIG['FIGURE_COVERAGE']:
+            return "gemini", "figuras"
+
+    return "local", "texto"
+
+
+def _split_remote_pages(texto, page_numbers):
+    """
+    Separa a resposta do Gemini por página (números originais, base 0)
+
+    Retorna {página: (texto, descrição das imagens)}. Se a resposta não
+    vier no formato pedido, tudo fica na primeira página remota, para não
+    perder texto.
+    """
+    partes = PAGE_SECTION.split(texto)
+    secoes = {}
+    for i in range(1, len(partes) - 1, 2):
+        secoes[int(partes[i]) - 1] = partes[i + 1]
+    if not any(n in secoes for n in page_numbers):
+        secoes = {page_numbers[0]: texto}
+
+    paginas = {}
+    for n in page_numbers:
+        linhas_texto, linhas_imagens = [], []
+        for linha in secoes.get(n, "").strip().splitlines():
+            if linha.strip().upper().startswith("[IMAGENS]:"):
+                linhas_imagens.append(linha.split(":", 1)[1].strip())
+            else:
+                linhas_texto.append(linha)
+        paginas[n] = ("\n".join(linhas_texto).strip(), " ".join(linhas_imagens))
+    return paginas
+
+
+def _process_remote_pages(pdf_doc, page_numbers, file_name):
+    """Envia ao Gemini só as páginas remotas, num PDF menor. Retorna (páginas, envio, tempos_ms)"""
+    subset = fitz.open()
+    for n in page_numbers:
+        subset.insert_pdf(pdf_doc, from_page=n, to_page=n)
+    subset_bytes = subset.tobytes(garbage=3, deflate=True)
+    subset.close()
+
+    prompt = PAGES_PROMPT.format(
+        paginas=", ".join(str(n + 1) for n in page_numbers),
+        primeira=page_numbers[0] + 1
+    )
+    response, envio, tempos = _generate_with_document(
+        subset_bytes, f"{file_name} (páginas)", "application/pdf", prompt
+    )
+    remote_page_cost.observe(len(page_numbers), tempos.get("upload", 0) + tempos["geracao"])
+    return _split_remote_pages(response.text, page_numbers), envio, tempos
+
+
+def process_pdf_hybrid(file_content, file_name, gerar_resumo=True, analisar_imagens=True):
+    """
+    Extração híbrida de PDF: local para páginas com texto nativo, Gemini para o resto
+
+    Cada página é classificada (classify_pdf_page). As de texto nativo
+    passam por _extract_pdf_page em milissegundos; as digitalizadas ou com
+    figuras vão juntas ao Gemini num PDF só com elas. O texto é montado na
+    ordem das páginas, no mesmo formato de extract_text_from_pdf.
+
+    Se mais de MAX_REMOTE_FRACTION das páginas precisar do Gemini, o
+    documento inteiro vai numa chamada só (process_document_with_gemini).
+    "roteamento" informa páginas locais e remotas, o motivo de cada
+    página remota e a estimativa de tempo economizado.
+    """
+    inicio = time.perf_counter()
+    pdf_doc = fitz.open(stream=file_content, filetype="pdf")
+    try:
+        total_pages = len(pdf_doc)
+        rotas = [classify_pdf_page(pdf_doc.load_page(n), analisar_imagens) for n in range(total_pages)]
+        remote = [n for n, (rota, _) in enumerate(rotas) if rota == "gemini"]
+        classificacao_ms = round((time.perf_counter() - inicio) * 1000, 1)
+
+        roteamento = {
+            "paginas_locais": total_pages - len(remote),
+            "paginas_remotas": len(remote),
+            "motivos_remotos": {str(n + 1): rotas[n][1] for n in remote},
+            "classificacao_ms": classificacao_ms
+        }
+
+        if total_pages == 0 or len(remote) / total_pages > DOCUMENT_CONFIG['MAX_REMOTE_FRACTION']:
+            pdf_doc.close()
+            resultado = process_document_with_gemini(file_content, file_name, "application/pdf")
+            if "erro" not in resultado:
+                tempos = resultado["arquivo_info"]["tempos_ms"]
+                remote_page_cost.observe(total_pages, tempos.get("upload", 0) + tempos["geracao"])
+                roteamento.update(paginas_locais=0, paginas_remotas=total_pages, tempo_economizado_ms_estimado=0)
+                resultado["roteamento"] = roteamento
+            return resultado
+
+        resultado = {
+            "text_content": "",
+            "structure": {"pages": [], "headings": [], "paragraphs": [], "tables": []},
+            "metadata": {
+                "total_pages": total_pages,
+                "title": pdf_doc.metadata.get("title", ""),
+                "author": pdf_doc.metadata.get("author", "")
+            },
+            "resumo": "",
+            "imagens_info": "",
+            "arquivo_info": {
+                "nome": file_name,
+                "tamanho_bytes": len(file_content),
+                "processado_com": "Local + Gemini 2.0 Flash" if remote else "Local",
+                "envio": None,
+                "tempos_ms": {"classificacao": classificacao_ms}
+            }
+        }
+        tempos = resultado["arquivo_info"]["tempos_ms"]
+
+        remote_pages = {}
+        if remote:
+            remote_pages, envio, tempos_remotos = _process_remote_pages(pdf_doc, remote, file_name)
+            resultado["arquivo_info"]["envio"] = envio
+            tempos.update(tempos_remotos)
+
+        start = time.perf_counter()
+        local = [n for n in range(total_pages) if n not in remote_pages]
+        local_pages = dict(zip(local, _extract_pdf_pages(pdf_doc, file_content, local)))
+        page_texts = []
+        imagens = []
+        for n in range(total_pages):
+            if n in remote_pages:
+                texto, descricao = remote_pages[n]
+                page_text = f"\n--- Página {n + 1} ---\n{texto}\n"
+                page_structure = {"page_number": n + 1, "headings": [], "paragraphs": [], "images": []}
+                if descricao:
+                    imagens.append(f"Página {n + 1}: {descricao}")
+            else:
+                page_text, page_structure = local_pages[n]
+            page_structure["origem"] = rotas[n][0]
+            _add_page_structure(resultado["structure"], page_structure)
+            page_texts.append(page_text)
+        full_text = "".join(page_texts)
+        tempos["extracao_local"] = round((time.perf_counter() - start) * 1000, 1)
+    finally:
+        if not pdf_doc.is_closed:
+            pdf_doc.close()
+
+    resultado["text_content"] = full_text
+    resultado["imagens_info"] = "\n".join(imagens)
+    resultado["palavras_chave"] = extract_keywords_from_text(full_text)
+
+    if gerar_resumo and full_text.strip():
+        start = time.perf_counter()
+        resumo = generate_document_summary(full_text, resultado["structure"]["headings"])
+        tempos["resumo"] = round((time.perf_counter() - start) * 1000, 1)
+        if "erro" not in resumo:
+            resultado["resumo"] = resumo["resumo"]
+            resultado["resumo_info"] = resumo["resumo_info"]
+
+    tempos["total"] = round((time.perf_counter() - inicio) * 1000, 1)
+    roteamento["tempo_economizado_ms_estimado"] = round(
+        remote_page_cost.estimate(roteamento["paginas_locais"]) - tempos["classificacao"] - tempos["extracao_local"]
+    )
+    resultado["roteamento"] = roteamento
+    print(f"✅ {file_name}: {roteamento['paginas_locais']} páginas locais, "
+          f"{roteamento['paginas_remotas']} no Gemini ({tempos})")
+    return resultado
+
+
+def process_docx_local(file_content, file_name, gerar_resumo=True, analisar_imagens=True):
+    """
+    DOCX sem imagens a analisar é extraído localmente (extract_text_from_docx)
+
+    Retorna None quando o documento tem imagens e analisar_imagens está
+    ligado: aí ele segue inteiro para o Gemini.
+    """
+    inicio = time.perf_counter()
+    if analisar_imagens and extract_images_from_docx(file_content):
+        return None
+
+    resultado = extract_text_from_docx(file_content)
+    if "erro" in resultado:
+        return resultado
+    tempos = {"extracao_local": round((time.perf_counter() - inicio) * 1000, 1)}
+
+    resultado["resumo"] = ""
+    resultado["imagens_info"] = ""
+    resultado["palavras_chave"] = extract_keywords_from_text(resultado["text_content"])
+    if gerar_resumo and resultado["text_content"].strip():
+        start = time.perf_counter()
+        resumo = generate_document_summary(resultado["text_content"], resultado["structure"]["headings"])
+        tempos["resumo"] = round((time.perf_counter() - start) * 1000, 1)
+        if "erro" not in resumo:
+            resultado["resumo"] = resumo["resumo"]
+            resultado["resumo_info"] = resumo["resumo_info"]
+    tempos["total"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    resultado["arquivo_info"] = {
+        "nome": file_name,
+        "tamanho_bytes": len(file_content),
+        "processado_com": "Local",
+        "envio": None,
+        "tempos_ms": tempos
+    }
+    resultado["roteamento"] = {"documento": "local"}
+    print(f"✅ {file_name} extraído localmente ({tempos})")
+    return resultado
+
+
+def _document_kind(file_name, file_type):
+    """"pdf", "docx" ou None (tipo não suportado)"""
+    if 'pdf' in file_type.lower() or file_name.lower().endswith('.pdf'):
+        return "pdf"
+    if ('word' in file_type.lower() or
+            'document' in file_type.lower() or
+            file_name.lower().endswith(('.docx', '.doc'))):
+        return "docx"
+    return None
+
+
+def stream_document(file_content, file_name, file_type):
+    """
+    Extração local em eventos, parte por parte, para /documento/processar-stream
+
+    - inicio: tipo, total de páginas e metadados (PDF)
+    - pagina (PDF) ou secao/tabela (DOCX): texto e estrutura da parte,
+      assim que ela fica pronta
+    - fim: partes enviadas, palavras-chave do documento inteiro e tempo
+    - erro: tipo não suportado (primeiro evento) ou falha no meio
+
+    Nada do documento é acumulado: as palavras-chave são contadas parte a
+    parte (count_keywords). Concatenar os "texto" das partes dá o mesmo
+    text_content de extract_text_from_pdf/extract_text_from_docx. Não
+    passa pelo Gemini: páginas escaneadas saem sem texto (ou com o OCR
+    local) e não há resumo.
+    """
+    inicio = time.perf_counter()
+    kind = _document_kind(file_name, file_type)
+    if kind is None:
+        yield {
+            "evento": "erro",
+            "mensagem": "Tipo de arquivo não suportado. Use PDF ou DOCX.",
+            "tipos_aceitos": ["PDF", "DOCX"]
+        }
+        return
+    
+    word_count = {}
+    partes = 0
+    if kind == "pdf":
+        pdf_doc = fitz.open(stream=file_content, filetype="pdf")
+        try:
+            yield {
+                "evento": "inicio",
+                "arquivo": file_name,
+                "tipo": kind,
+                "total_paginas": len(pdf_doc),
+                "metadata": {
+                    "title": pdf_doc.metadata.get("title", ""),
+                    "author": pdf_doc.metadata.get("author", "")
+                }
+            }
+            for page_text, page_structure in iter_pdf_pages(pdf_doc):
+                count_keywords(page_text, word_count)
+                partes += 1
+                yield {
+                    "evento": "pagina",
+                    "pagina": page_structure["page_number"],
+                    "texto": page_text,
+                    "estrutura": page_structure
+                }
+        finally:
+            pdf_doc.close()
+    else:
+        yield {"evento": "inicio", "arquivo": file_name, "tipo": kind}
+        for section_kind, item in iter_docx_sections(file_content):
+            partes += 1
+            if section_kind == "tabela":
+                yield {"evento": "tabela", "indice": partes, "tabela": item}
+                continue
+            count_keywords(item["text"], word_count)
+            yield {
+                "evento": "secao",
+                "indice": partes,
+                "titulo": item["heading"],
+                "texto": item["text"],
+                "paragrafos": item["paragraphs"]
+            }
+    
+    yield {
+        "evento": "fim",
+        "partes": partes,
+        "palavras_chave": top_keywords(word_count),
+        "tempo_ms": round((time.perf_counter() - inicio) * 1000, 1)
+    }
+
+
+def _prompt_version():
+    """Versão do cache de documentos: muda com qualquer prompt usado no processamento"""
+    prompts = (DOCUMENT_PROMPT, PAGES_PROMPT, SUMMARY_PROMPT, CHUNK_SUMMARY_PROMPT, REDUCE_SUMMARY_PROMPT)
+    digest = hashlib.blake2b("\0".join(prompts).encode("utf-8"), digest_size=6).hexdigest()
+    return f"v{DOCUMENT_CONFIG['RESULT_CACHE_VERSION']}-{digest}"
+
+
+PROMPT_VERSION = _prompt_version()
+
+
 def process_document(file_content, file_name, file_type, gerar_resumo=True, analisar_imagens=True):
     """
-    Processa documentos PDF e DOCX enviando direto pro Gemini 2.0 Flash
-    - Análise completa: texto, imagens, tabelas
-    - Resumo automático incluído
+    Processa documentos PDF e DOCX
+    - Com HYBRID_ROUTING: páginas de texto nativo são extraídas localmente
+      e só as digitalizadas ou com figuras vão ao Gemini (process_pdf_hybrid);
+      DOCX sem imagens a analisar não passa pelo Gemini
+    - Sem ele, ou para DOCX com imagens: documento inteiro pro Gemini 2.0 Flash
+    - Resumo automático incluído (se gerar_resumo)
+    - O mesmo arquivo com as mesmas opções sai do document_cache (em disco,
+      comprimido) sem reprocessar; "cache" na resposta diz se foi hit
     """
     try:
-        is_pdf = 'pdf' in file_type.lower() or file_name.lower().endswith('.pdf')
-        is_docx = ('word' in file_type.lower() or 
-                   'document' in file_type.lower() or 
-                   file_name.lower().endswith(('.docx', '.doc')))
+        kind = _document_kind(file_name, file_type)
         
-        if not (is_pdf or is_docx):
+        if kind is None:
             return {
                 "erro": "Tipo de arquivo não suportado. Use PDF ou DOCX.",
                 "tipos_aceitos": ["PDF", "DOCX"]
             }
         
-        print(f"🚀 Processando {file_name} com Gemini 2.0 Flash...")
-        
-        # Determinar MIME type
-        if is_pdf:
-            mime_type = "application/pdf"
-        else:
-            mime_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        
-        # Processar com Gemini
-        resultado = process_document_with_gemini(file_content, file_name, mime_type)
+        options = {
+            "resumo": gerar_resumo,
+            "imagens": analisar_imagens,
+            "hibrido": DOCUMENT_CONFIG['HYBRID_ROUTING']
+        }
+        key = document_cache.key_for(file_content, kind, options, PROMPT_VERSION)
+        cached = document_cache.get(key)
+        if cached is not None:
+            resultado, age = cached
+            if isinstance(resultado.get("arquivo_info"), dict):
+                resultado["arquivo_info"]["nome"] = file_name
+            resultado["cache"] = {"hit": True, "idade_segundos": round(age, 1)}
+            print(f"⚡ {file_name} servido do cache de documentos")
+            return resultado
         
+        resultado = _process_document_uncached(file_content, file_name, kind, gerar_resumo, analisar_imagens)
+        # Resumo pedido que falhou: não guarda, a próxima tentativa refaz
+        if not (gerar_resumo and not resultado.get("resumo")):
+            document_cache.set(key, resultado)
+        resultado["cache"] = {"hit": False, "idade_segundos": 0}
         return resultado
         
     except Exception as e:
         print(f"❌ Erro: {str(e)}")
         return {"erro": f"Erro ao processar documento: {str(e)}"}
+
+
+def _process_document_uncached(file_content, file_name, kind, gerar_resumo, analisar_imagens):
+    """process_document sem o cache: escolhe entre o caminho híbrido/local e o Gemini"""
+    is_pdf = kind == "pdf"
+    
+    print(f"🚀 Processando {file_name}...")
+    
+    # Determinar MIME type
+    if is_pdf:
+        mime_type = "application/pdf"
+    else:
+        mime_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    
+    if DOCUMENT_CONFIG['HYBRID_ROUTING']:
+        if is_pdf:
+            return process_pdf_hybrid(file_content, file_name, gerar_resumo, analisar_imagens)
+        resultado = process_docx_local(file_content, file_name, gerar_resumo, analisar_imagens)
+        if resultado is not None:
+            return resultado
+    
+    # Processar com Gemini
+    resultado = process_document_with_gemini(file_content, file_name, mime_type)
+    
+    return resultado
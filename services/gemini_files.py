@@ -0,0 +1,188 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import google.generativeai as genai
+from google.generativeai.types import file_types
+from config import DOCUMENT_CONFIG
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    digest TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+def document_digest(file_content: bytes, mime_type: str) -> str:
+    return hashlib.sha256(mime_type.encode() + b"\0" + file_content).hexdigest()
+
+
+class GeminiFileRegistry:
+    """
+    Registro dos documentos já enviados ao Files API do Gemini
+
+    O mesmo PDF enviado de novo (reprocessamento, resumo, perguntas sobre o
+    documento) reaproveita o arquivo que já está no servidor em vez de
+    fazer outro upload. A chave é o SHA-256 do conteúdo com o MIME type; o
+    valor é o nome/URI devolvidos pelo upload e a expiração do arquivo no
+    servidor. Arquivos que expiram em menos de FILE_REUSE_MARGIN_SECONDS
+    são reenviados.
+
+    - Memória do processo na frente, SQLite local (WAL) atrás, para os
+      workers do gunicorn compartilharem os uploads uns dos outros
+    - Falhas do SQLite só fazem o registro se comportar como um miss
+    """
+
+    def __init__(self, path: Optional[str], lifetime_seconds: int = 48 * 3600,
+                 reuse_margin_seconds: int = 600):
+        self.path = path
+        self.lifetime_seconds = lifetime_seconds
+        self.reuse_margin_seconds = reuse_margin_seconds
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        self._local = threading.local()
+
+        self.uploads = 0
+        self.reuses = 0
+        self.expired = 0
+        self.bytes_saved = 0
+        self.upload_ms = 0.0
+        self.errors = 0
+
+        if path:
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, mode=0o700, exist_ok=True)
+                self._connection().executescript(SCHEMA)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Registro de arquivos compartilhado indisponível, usando só memória: {e}")
+                self.path = None
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, digest: str) -> Optional[Dict]:
+        """Arquivo registrado para o digest, se ainda vale a pena reaproveitar"""
+        with self.lock:
+            entry = self.entries.get(digest)
+
+        if entry is None and self.path:
+            try:
+                row = self._connection().execute(
+                    "SELECT name, uri, mime_type, expires FROM files WHERE digest = ?", (digest,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Erro no registro de arquivos (get): {e}")
+                row = None
+            if row is not None:
+                entry = {"name": row[0], "uri": row[1], "mime_type": row[2], "expires": row[3]}
+                with self.lock:
+                    self.entries[digest] = entry
+
+        if entry is None:
+            return None
+        if entry["expires"] - time.time() < self.reuse_margin_seconds:
+            with self.lock:
+                self.expired += 1
+            self.forget(digest)
+            return None
+        return entry
+
+    def register(self, digest: str, uploaded: file_types.File) -> Dict:
+        now = time.time()
+        try:
+            expires = uploaded.expiration_time.timestamp()
+        except Exception:
+            expires = 0
+        if expires <= now:
+            # Resposta sem expiração: assume o tempo de vida padrão do Files API
+            expires = now + self.lifetime_seconds
+
+        entry = {"name": uploaded.name, "uri": uploaded.uri, "mime_type": uploaded.mime_type, "expires": expires}
+        with self.lock:
+            self.entries[digest] = entry
+        if self.path:
+            try:
+                self._connection().execute(
+                    "INSERT INTO files(digest, name, uri, mime_type, expires) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(digest) DO UPDATE SET name = excluded.name, uri = excluded.uri, "
+                    "mime_type = excluded.mime_type, expires = excluded.expires",
+                    (digest, entry["name"], entry["uri"], entry["mime_type"], expires)
+                )
+                # Aproveita a escrita para limpar o que já expirou
+                self._connection().execute("DELETE FROM files WHERE expires < ?", (now,))
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Erro no registro de arquivos (set): {e}")
+        return entry
+
+    def forget(self, digest: str) -> None:
+        """Remove o registro (arquivo expirado ou apagado no servidor)"""
+        with self.lock:
+            self.entries.pop(digest, None)
+        if self.path:
+            try:
+                self._connection().execute("DELETE FROM files WHERE digest = ?", (digest,))
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Erro no registro de arquivos (delete): {e}")
+
+    def get_or_upload(self, file_content: bytes, mime_type: str,
+                      display_name: Optional[str] = None) -> Tuple[file_types.File, bool]:
+        """
+        Arquivo pronto para usar em generate_content
+
+        Retorna (arquivo, reaproveitado). O upload sai direto da memória,
+        sem arquivo temporário.
+        """
+        digest = document_digest(file_content, mime_type)
+        entry = self.lookup(digest)
+        if entry is not None:
+            with self.lock:
+                self.reuses += 1
+                self.bytes_saved += len(file_content)
+            handle = file_types.File({"name": entry["name"], "uri": entry["uri"], "mime_type": entry["mime_type"]})
+            return handle, True
+
+        start = time.perf_counter()
+        uploaded = genai.upload_file(io.BytesIO(file_content), mime_type=mime_type, display_name=display_name)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.register(digest, uploaded)
+        with self.lock:
+            self.uploads += 1
+            self.upload_ms += elapsed_ms
+        return uploaded, False
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "uploads": self.uploads,
+                "reaproveitados": self.reuses,
+                "expirados": self.expired,
+                "bytes_nao_reenviados": self.bytes_saved,
+                "upload_ms_medio": round(self.upload_ms / self.uploads, 1) if self.uploads else None,
+                "compartilhado": self.path,
+                "erros": self.errors,
+            }
+
+
+gemini_files = GeminiFileRegistry(
+    DOCUMENT_CONFIG['FILE_REGISTRY_PATH'],
+    lifetime_seconds=DOCUMENT_CONFIG['FILE_LIFETIME_SECONDS'],
+    reuse_margin_seconds=DOCUMENT_CONFIG['FILE_REUSE_MARGIN_SECONDS']
+)
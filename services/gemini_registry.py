@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
+
+IMAGE_GENERATION_CONFIG = {
+    "temperature": 0.1,
+    "top_p": 0.8,
+    "top_k": 20,
+    "max_output_tokens": 1024,
+    "candidate_count": 1,
+}
+
+# Um handle pré-configurado por caso de uso
+MODEL_PROFILES = {
+    "image-fast": {
+        "model_name": "gemini-2.5-flash",
+        "generation_config": IMAGE_GENERATION_CONFIG,
+    },
+    "image-detailed": {
+        "model_name": "gemini-2.5-flash",
+        "generation_config": IMAGE_GENERATION_CONFIG,
+    },
+    "document": {
+        "model_name": "gemini-2.5-flash",
+        "generation_config": None,
+    },
+    "summary": {
+        "model_name": "gemini-2.5-flash",
+        "generation_config": None,
+    },
+}
+
+
+class GeminiRegistry:
+    """
+    Registro de modelos Gemini do processo
+
+    genai.configure() descarta os clientes criados até então, então chamá-lo
+    a cada requisição também jogava fora a conexão gRPC aquecida. Aqui ele é
+    chamado uma única vez e cada perfil de MODEL_PROFILES vira um
+    GenerativeModel reutilizado por todas as requisições (os modelos não
+    guardam estado por chamada e o cliente gRPC é thread-safe). Todos os
+    perfis compartilham o mesmo cliente padrão, e portanto o mesmo canal.
+
+    Também mede o tempo de construção de cada perfil e o tempo das chamadas,
+    para mostrar quanto o reuso economiza.
+    """
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.lock = threading.Lock()
+        self.models = {}
+        self.configured = False
+        self.configure_ms = 0.0
+        self.metrics = {
+            name: {
+                "construcao_ms": None,
+                "reusos": 0,
+                "chamadas": 0,
+                "tempo_chamadas_ms": 0.0,
+                "primeira_chamada_ms": None
+            }
+            for name in profiles
+        }
+
+    def ensure_configured(self):
+        """Configura o SDK uma única vez por processo"""
+        if self.configured:
+            return
+
+        with self.lock:
+            if self.configured:
+                return
+            start = time.perf_counter()
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            self.configure_ms = (time.perf_counter() - start) * 1000
+            self.configured = True
+
+    def get(self, name):
+        """Retorna o modelo pré-configurado do perfil, criando-o na primeira vez"""
+        model = self.models.get(name)
+        if model is not None:
+            with self.lock:
+                self.metrics[name]["reusos"] += 1
+            return model
+
+        self.ensure_configured()
+
+        with self.lock:
+            model = self.models.get(name)
+            if model is None:
+                profile = self.profiles[name]
+                start = time.perf_counter()
+                model = genai.GenerativeModel(
+                    model_name=profile["model_name"],
+                    generation_config=profile["generation_config"],
+                    safety_settings=SAFETY_SETTINGS
+                )
+                self.metrics[name]["construcao_ms"] = (time.perf_counter() - start) * 1000
+                self.models[name] = model
+        return model
+
+    def generate(self, name, contents, **kwargs):
+        """generate_content no modelo do perfil, medindo o tempo da chamada"""
+        model = self.get(name)
+        start = time.perf_counter()
+        try:
+            return model.generate_content(contents, **kwargs)
+        finally:
+            self._record_call(name, (time.perf_counter() - start) * 1000)
+
+    def _record_call(self, name, elapsed_ms):
+        with self.lock:
+            metrics = self.metrics[name]
+            metrics["chamadas"] += 1
+            metrics["tempo_chamadas_ms"] += elapsed_ms
+            if metrics["primeira_chamada_ms"] is None:
+                # Inclui o handshake da conexão, que as seguintes reaproveitam
+                metrics["primeira_chamada_ms"] = elapsed_ms
+
+    async def generate_async(self, name, contents, **kwargs):
+        """Versão assíncrona de generate (cliente gRPC async do SDK)"""
+        model = self.get(name)
+        start = time.perf_counter()
+        try:
+            return await model.generate_content_async(contents, **kwargs)
+        finally:
+            self._record_call(name, (time.perf_counter() - start) * 1000)
+
+    def warm_up(self):
+        """Cria todos os perfis e o cliente compartilhado no boot do worker"""
+        try:
+            for name in self.profiles:
+                self.get(name)
+            # Cria o cliente padrão agora, e não na primeira requisição
+            genai_client.get_default_generative_client()
+        except Exception as e:
+            print(f"Aviso: não foi possível pré-aquecer os modelos Gemini: {e}")
+
+    def stats(self):
+        with self.lock:
+            profiles = {}
+            for name, metrics in self.metrics.items():
+                construction = metrics["construcao_ms"] or 0.0
+                calls = metrics["chamadas"]
+                profiles[name] = {
+                    "construcao_ms": round(construction, 3),
+                    "reusos": metrics["reusos"],
+                    "chamadas": calls,
+                    "primeira_chamada_ms": round(metrics["primeira_chamada_ms"], 1) if calls else None,
+                    "tempo_medio_chamada_ms": round(metrics["tempo_chamadas_ms"] / calls, 1) if calls else None,
+                    # Construção + configure que seriam pagos a cada reuso sem o registro
+                    "economia_estimada_ms": round(metrics["reusos"] * (construction + self.configure_ms), 1)
+                }
+
+            return {
+                "configure_ms": round(self.configure_ms, 3),
+                "perfis": profiles
+            }
+
+
+gemini_registry = GeminiRegistry(MODEL_PROFILES)
@@ -1,146 +1,456 @@
-import os
-import io
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import json
+import time
+import concurrent.futures
+from config import CACHE_CONFIG, BATCH_CONFIG, ASYNC_CONFIG
+from services.gemini_registry import gemini_registry
+from utils.adaptive_encoder import encoder_stats
+from utils.async_runtime import async_runtime
+from utils.cache import image_cache
+from utils.image_optimizer import ImageOptimizer
+from utils.image_payload import ImagePayload
+from utils.perceptual_index import perceptual_index
+from utils.singleflight import image_singleflight
 
-genai_api_key = os.getenv("GOOGLE_API_KEY")
-if genai_api_key:
+
+IMAGE_PROMPT = "Em 2 frases: o que você vê nesta imagem? Seja direto e claro."
+
+BATCH_PROMPT = """Você receberá {total} imagens numeradas de 1 a {total}.
+Para cada imagem, em 2 frases: o que você vê nela? Seja direto e claro.
+Responda APENAS com um array JSON de {total} strings, uma por imagem, na mesma ordem."""
+
+
+def _profile_for_mode(mode):
+    """Perfil do registro de modelos usado por cada modo de análise"""
+    return "image-detailed" if mode == "detalhado" else "image-fast"
+
+
+def _call_gemini(profile, contents, **kwargs):
+    """Chamada bloqueante ao Gemini para as rotas síncronas.
+
+    Com ASYNC_CONFIG['ENABLED'] a chamada roda no loop assíncrono do worker
+    (limitada pelo semáforo do Gemini) e a thread da requisição só espera;
+    caso contrário usa o cliente síncrono.
+    """
+    if ASYNC_CONFIG['ENABLED'] and not kwargs.get("stream"):
+        return async_runtime.run(
+            async_runtime.limited("gemini", gemini_registry.generate_async(profile, contents, **kwargs)),
+            timeout=ASYNC_CONFIG['UPSTREAM_TIMEOUT']
+        )
+    return gemini_registry.generate(profile, contents, **kwargs)
+
+
+def _empty_response_result(candidates):
+    """Interpreta uma resposta sem texto a partir do finish_reason.
+
+    Retorna (resultado, cacheavel).
+    """
+    if candidates:
+        finish_reason = candidates[0].finish_reason
+        safety_ratings = candidates[0].safety_ratings
+        
+        print(f"[DEBUG] Imagem bloqueada. Finish reason: {finish_reason}, Safety: {safety_ratings}")
+        
+        if finish_reason == 3:
+            return [{
+                "objeto": f"A API bloqueou esta imagem por segurança mesmo com filtros desabilitados. Ratings: {safety_ratings}",
+                "confianca": None
+            }], True
+        elif finish_reason == 4:
+            return [{
+                "objeto": "Imagem bloqueada por conter conteúdo protegido por direitos autorais.",
+                "confianca": None
+            }], True
+        else:
+            return [{
+                "objeto": f"Resposta vazia da API. Finish reason: {finish_reason}. Tente outra imagem.",
+                "confianca": None
+            }], False
+    
+    return [{
+        "objeto": "Não foi possível processar esta imagem. Verifique o formato e tente novamente.",
+        "confianca": None
+    }], False
+
+
+def _generate_description(payload, prompt, profile="image-detailed"):
+    """Chama o Gemini e interpreta a resposta.
+
+    Retorna (resultado, cacheavel). Respostas vazias não são cacheáveis,
+    pois costumam ser falhas transitórias; bloqueios de segurança são.
+    Exceções da API são propagadas para quem chamou.
+    """
+    response = _call_gemini(profile, [prompt, payload.part()])
+    return _interpret_response(response)
+
+
+def _timed_description(payload, prompt, mode):
+    """_generate_description com a latência registrada no histograma de bytes do preset (modo)"""
+    start = time.perf_counter()
+    resultado = _generate_description(payload, prompt, _profile_for_mode(mode))
+    encoder_stats.record_call(mode, len(payload), (time.perf_counter() - start) * 1000)
+    return resultado
+
+
+def _interpret_response(response):
+    """Converte a resposta do Gemini em (resultado, cacheavel)"""
+    print(f"[DEBUG] Response candidates: {len(response.candidates) if response.candidates else 0}")
+    if response.candidates:
+        candidate = response.candidates[0]
+        print(f"[DEBUG] Finish reason: {candidate.finish_reason}")
+        print(f"[DEBUG] Safety ratings: {candidate.safety_ratings}")
+        print(f"[DEBUG] Has parts: {bool(response.parts)}")
+    
     try:
-        genai.configure(api_key=genai_api_key)
-    except Exception as _:
-        pass
+        text_result = response.text.strip()
+        if text_result:
+            return [{
+                "objeto": text_result,
+                "confianca": None
+            }], True
+    except ValueError as ve:
+        print(f"[DEBUG] Erro ao acessar response.text: {ve}")
+    
+    return _empty_response_result(response.candidates)
 
 
-def _detect_mime_type_from_filename(filename: str) -> str:
-    if not filename:
-        return "image/jpeg"
-    ext = filename.split('.')[-1].lower()
-    return {
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'png': 'image/png',
-        'webp': 'image/webp',
-        'gif': 'image/gif'
-    }.get(ext, 'image/jpeg')
+def _error_result(error_msg):
+    print(f"Erro no Gemini: {error_msg}")
+    
+    if "finish_reason" in error_msg and "2" in error_msg:
+        return [{
+            "objeto": "Não foi possível analisar esta imagem devido a restrições de segurança. Tente outra imagem.",
+            "confianca": None
+        }]
+    elif "Invalid image" in error_msg or "invalid" in error_msg.lower():
+        return [{
+            "objeto": "Formato de imagem inválido. Use JPG, PNG ou WebP.",
+            "confianca": None
+        }]
+    else:
+        return [{
+            "objeto": f"Erro ao processar imagem: {error_msg}",
+            "confianca": None
+        }]
 
 
-def process_image_gemini(image_file):
+def process_image_gemini(image_file, prompt=IMAGE_PROMPT):
     """Processa uma imagem usando o Gemini (flash) e retorna um dict simples.
 
-    image_file pode ser um FileStorage (Flask), BytesIO ou bytes.
+    image_file pode ser um ImagePayload, FileStorage (Flask), BytesIO ou bytes.
     """
     try:
-        if not getattr(genai, '_api_key', None):
-            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        resultado, _ = _generate_description(ImagePayload.from_upload(image_file), prompt)
+        return resultado
+    except Exception as e:
+        return _error_result(str(e))
 
-        if hasattr(image_file, 'seek'):
-            try:
-                image_file.seek(0)
-            except Exception:
-                pass
-
-        if hasattr(image_file, 'getvalue'):
-            content = image_file.getvalue()
-        elif hasattr(image_file, 'read'):
-            content = image_file.read()
-        elif isinstance(image_file, (bytes, bytearray)):
-            content = bytes(image_file)
-        else:
-            content = b''
 
-        filename = getattr(image_file, 'filename', None)
-        mime_type = _detect_mime_type_from_filename(filename)
+def _perceptual_hash_for(payload):
+    """dHash do payload: o que veio do otimizador ou calculado dos bytes"""
+    if payload.perceptual_hash is not None or not CACHE_CONFIG['NEAR_DUPLICATE_ENABLED']:
+        return payload.perceptual_hash
+    return ImageOptimizer.perceptual_hash_from_bytes(payload.content)
 
-        generation_config = {
-            "temperature": 0.1,
-            "top_p": 0.8,
-            "top_k": 20,
-            "max_output_tokens": 1024,
-            "candidate_count": 1,
-        }
 
-        model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
-            generation_config=generation_config
-        )
+def _quality_short_circuit(payload):
+    """Resposta local para fotos recusadas pelo quality_gate; None se a foto seguir para o Gemini.
 
-        prompt = "Em 2 frases: o que você vê nesta imagem? Seja direto e claro."
-        response = model.generate_content(
-            [
-                prompt,
-                {
-                    "mime_type": mime_type,
-                    "data": content
-                }
-            ],
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    Retorna (resultado, cache_info) no mesmo formato de process_image_cached.
+    """
+    quality = payload.quality
+    if quality is None or quality["aprovada"]:
+        return None
+    resultado = [{
+        "objeto": quality["mensagem"],
+        "confianca": None,
+        "curto_circuito": True,
+        "qualidade": quality
+    }]
+    return resultado, {"hit": False, "idade_segundos": 0}
+
+
+def _lookup_cached(payload, mode, prompt, perceptual_hash):
+    """Procura resultado exato e, se não houver, uma foto quase igual.
+
+    Retorna (resultado, cache_info) ou None.
+    """
+    cached = image_cache.lookup(payload, mode, prompt)
+    if cached is not None:
+        resultado, age = cached
+        return resultado, {"hit": True, "tipo": "exato", "idade_segundos": round(age, 1)}
+    
+    if CACHE_CONFIG['NEAR_DUPLICATE_ENABLED'] and perceptual_hash is not None:
+        similar = perceptual_index.find(perceptual_hash, f"{mode}:{prompt}")
+        if similar is not None:
+            resultado, distance, age = similar
+            return resultado, {
+                "hit": True,
+                "tipo": "similar",
+                "distancia": distance,
+                "idade_segundos": round(age, 1)
             }
+    
+    return None
+
+
+def _store_cached(payload, mode, prompt, perceptual_hash, resultado):
+    image_cache.set(payload, mode, resultado, prompt)
+    if perceptual_hash is not None:
+        perceptual_index.add(perceptual_hash, f"{mode}:{prompt}", resultado)
+
+
+def process_image_cached(image_file, mode, prompt=IMAGE_PROMPT):
+    """Versão de process_image_gemini com cache de resultados.
+
+    A chave cobre os bytes já otimizados, o modo/preset e o prompt. Se não
+    houver entrada exata, procura uma foto quase igual no índice perceptual
+    (dHash da imagem reduzida) e reaproveita a descrição dela.
+    Retorna (resultado, cache_info), onde cache_info traz o flag de hit,
+    o tipo de acerto e a idade da entrada em segundos.
+    
+    Em um miss, requisições idênticas simultâneas (mesmo processo ou outro
+    worker) são coalescidas: só a primeira chama o Gemini e as demais
+    recebem o mesmo resultado, marcadas com "coalescido".
+    
+    image_file é normalmente o ImagePayload gerado pelo ImageOptimizer,
+    que já traz digest, MIME e dHash; arquivos e bytes são convertidos.
+    Fotos recusadas pelo quality_gate (escuras, lisas, borradas) voltam na
+    hora com a orientação ao usuário e "curto_circuito": True, sem passar
+    pelo cache nem pelo Gemini.
+    """
+    try:
+        payload = ImagePayload.from_upload(image_file)
+        recusada = _quality_short_circuit(payload)
+        if recusada is not None:
+            return recusada
+        
+        perceptual_hash = _perceptual_hash_for(payload)
+        
+        cached = _lookup_cached(payload, mode, prompt, perceptual_hash)
+        if cached is not None:
+            return cached
+        
+        def call_upstream():
+            resultado, cacheavel = _timed_description(payload, prompt, mode)
+            # Grava antes de liberar o lease, para os outros workers encontrarem
+            if cacheavel:
+                _store_cached(payload, mode, prompt, perceptual_hash, resultado)
+            return resultado
+        
+        def poll_shared():
+            cached = image_cache.peek(payload, mode, prompt)
+            return cached[0] if cached else None
+        
+        resultado, coalesced = image_singleflight.do(
+            image_cache.key_for(payload, mode, prompt), call_upstream, poll_shared
         )
+        
+        cache_info = {"hit": False, "idade_segundos": 0}
+        if coalesced:
+            cache_info["coalescido"] = True
+        return resultado, cache_info
+    
+    except Exception as e:
+        return _error_result(str(e)), {"hit": False, "idade_segundos": 0}
+
+
+def _finish_reason_name(candidates):
+    if not candidates:
+        return None
+    finish_reason = candidates[0].finish_reason
+    return getattr(finish_reason, "name", str(finish_reason))
+
+
+def result_events(resultado, cache_info, **extra):
+    """Um resultado já pronto (cache, quality_gate, OCR local) como eventos de streaming:
+    um único trecho seguido do fim, com os campos de extra no evento final.
+    """
+    yield {"evento": "parcial", "texto": resultado[0]["objeto"]}
+    fim = {"evento": "fim", "objeto": resultado[0]["objeto"], "finish_reason": None, "cache": cache_info}
+    fim.update(extra)
+    yield fim
+
 
-        print(f"[DEBUG] Response candidates: {len(response.candidates) if response.candidates else 0}")
-        if response.candidates:
-            candidate = response.candidates[0]
-            print(f"[DEBUG] Finish reason: {candidate.finish_reason}")
-            print(f"[DEBUG] Safety ratings: {candidate.safety_ratings}")
-            print(f"[DEBUG] Has parts: {bool(response.parts)}")
+def stream_image_cached(image_file, mode, prompt=IMAGE_PROMPT):
+    """Versão em streaming de process_image_cached.
+
+    Gera eventos (dicts) à medida que o Gemini devolve o texto:
+    - {"evento": "parcial", "texto": ...} para cada trecho recebido
+    - {"evento": "fim", "objeto": texto completo, "finish_reason": ..., "cache": ...}
+    Um acerto de cache sai como um único trecho seguido do fim. O conteúdo
+    é lido antes do primeiro evento, então o arquivo pode ser descartado
+    pelo chamador assim que o gerador começar.
+    """
+    payload = ImagePayload.from_upload(image_file)
+    
+    recusada = _quality_short_circuit(payload)
+    if recusada is not None:
+        resultado, cache_info = recusada
+        yield from result_events(
+            resultado, cache_info, curto_circuito=True, qualidade=resultado[0]["qualidade"]
+        )
+        return
+    
+    perceptual_hash = _perceptual_hash_for(payload)
+    cached = _lookup_cached(payload, mode, prompt, perceptual_hash)
+    if cached is not None:
+        yield from result_events(*cached)
+        return
+    
+    cache_info = {"hit": False, "idade_segundos": 0}
+    partes = []
+    start = time.perf_counter()
+    
+    try:
+        response = gemini_registry.generate(
+            _profile_for_mode(mode),
+            [prompt, payload.part()],
+            stream=True
+        )
         
-        try:
-            text_result = response.text.strip()
-            if text_result:
-                return [{
-                    "objeto": text_result,
-                    "confianca": None
-                }]
-        except ValueError as ve:
-            print(f"[DEBUG] Erro ao acessar response.text: {ve}")
+        for chunk in response:
+            try:
+                texto = chunk.text
+            except ValueError:
+                # Trecho sem partes (ex.: bloqueio no meio do streaming)
+                continue
+            if texto:
+                partes.append(texto)
+                yield {"evento": "parcial", "texto": texto}
+        
+        texto_completo = "".join(partes).strip()
+        if texto_completo:
+            resultado, cacheavel = [{"objeto": texto_completo, "confianca": None}], True
+        else:
+            resultado, cacheavel = _empty_response_result(response.candidates)
+            yield {"evento": "parcial", "texto": resultado[0]["objeto"]}
         
-        if response.candidates:
-            finish_reason = response.candidates[0].finish_reason
-            safety_ratings = response.candidates[0].safety_ratings
+        if cacheavel:
+            _store_cached(payload, mode, prompt, perceptual_hash, resultado)
+        encoder_stats.record_call(mode, len(payload), (time.perf_counter() - start) * 1000)
+        
+        yield {
+            "evento": "fim",
+            "objeto": resultado[0]["objeto"],
+            "finish_reason": _finish_reason_name(response.candidates),
+            "cache": cache_info
+        }
+    
+    except Exception as e:
+        resultado = _error_result(str(e))
+        yield {
+            "evento": "fim",
+            "objeto": "".join(partes).strip() or resultado[0]["objeto"],
+            "erro": resultado[0]["objeto"],
+            "finish_reason": None,
+            "cache": cache_info
+        }
+
+
+def _pack_batch(items):
+    """Divide os itens em grupos que cabem no orçamento de tokens de uma chamada"""
+    per_request = min(
+        BATCH_CONFIG['MAX_IMAGES_PER_REQUEST'],
+        BATCH_CONFIG['INPUT_TOKEN_BUDGET'] // BATCH_CONFIG['TOKENS_PER_IMAGE'],
+        BATCH_CONFIG['OUTPUT_TOKEN_BUDGET'] // BATCH_CONFIG['OUTPUT_TOKENS_PER_IMAGE']
+    )
+    per_request = max(1, per_request)
+    return [items[i:i + per_request] for i in range(0, len(items), per_request)]
+
+
+def _describe_group(group):
+    """Descreve um grupo de imagens numa única chamada multimodal.
+
+    Retorna (lista de (resultado, cacheavel) na ordem do grupo, chamadas
+    feitas, prompt que gerou os resultados). Se a resposta vier bloqueada,
+    vazia ou fora do formato, cada imagem é reenviada sozinha com o
+    IMAGE_PROMPT, para que bloqueios e falhas fiquem no item certo.
+    """
+    chamadas = 0
+    if len(group) > 1:
+        try:
+            parts = [BATCH_PROMPT.format(total=len(group))]
+            for position, item in enumerate(group, start=1):
+                parts.append(f"Imagem {position}:")
+                parts.append(item.part())
             
-            print(f"[DEBUG] Imagem bloqueada. Finish reason: {finish_reason}, Safety: {safety_ratings}")
+            chamadas += 1
+            # Mesmo perfil do /analisar, só com mais tokens de saída e JSON
+            response = _call_gemini(
+                "image-detailed",
+                parts,
+                generation_config={
+                    "max_output_tokens": BATCH_CONFIG['OUTPUT_TOKENS_PER_IMAGE'] * len(group) + 1024,
+                    "response_mime_type": "application/json",
+                }
+            )
+            descricoes = json.loads(response.text)
             
-            if finish_reason == 3:
-                return [{
-                    "objeto": f"A API bloqueou esta imagem por segurança mesmo com filtros desabilitados. Ratings: {safety_ratings}",
-                    "confianca": None
-                }]
-            elif finish_reason == 4:
-                return [{
-                    "objeto": "Imagem bloqueada por conter conteúdo protegido por direitos autorais.",
-                    "confianca": None
-                }]
-            else:
-                return [{
-                    "objeto": f"Resposta vazia da API. Finish reason: {finish_reason}. Tente outra imagem.",
-                    "confianca": None
-                }]
-        
-        return [{
-            "objeto": "Não foi possível processar esta imagem. Verifique o formato e tente novamente.",
-            "confianca": None
-        }]
+            if (isinstance(descricoes, list) and len(descricoes) == len(group)
+                    and all(isinstance(d, str) and d.strip() for d in descricoes)):
+                return [([{"objeto": d.strip(), "confianca": None}], True) for d in descricoes], chamadas, BATCH_PROMPT
+            
+            print(f"[DEBUG] Lote com resposta fora do formato, reenviando {len(group)} imagens uma a uma")
+        except Exception as e:
+            print(f"[DEBUG] Lote falhou ({e}), reenviando {len(group)} imagens uma a uma")
+    
+    chamadas += len(group)
+    if ASYNC_CONFIG['ENABLED']:
+        # Reenvios disparados juntos no loop do worker
+        from utils.async_processor import async_processor
+        return async_processor.describe_all(group), chamadas, IMAGE_PROMPT
+    
+    resultados = []
+    for item in group:
+        try:
+            resultados.append(_generate_description(item, IMAGE_PROMPT))
+        except Exception as e:
+            resultados.append((_error_result(str(e)), False))
+    return resultados, chamadas, IMAGE_PROMPT
 
-    except Exception as e:
-        error_msg = str(e)
-        print(f"Erro no Gemini: {error_msg}")
-        
-        if "finish_reason" in error_msg and "2" in error_msg:
-            return [{
-                "objeto": "Não foi possível analisar esta imagem devido a restrições de segurança. Tente outra imagem.",
-                "confianca": None
-            }]
-        elif "Invalid image" in error_msg or "invalid" in error_msg.lower():
-            return [{
-                "objeto": "Formato de imagem inválido. Use JPG, PNG ou WebP.",
-                "confianca": None
-            }]
+
+def process_images_batch(items, mode="detalhado"):
+    """Descreve várias imagens empacotando-as em poucas chamadas ao Gemini.
+
+    items: lista de ImagePayload já otimizados. Usa o cache das rotas
+    individuais com a chave do BATCH_PROMPT (as descrições do lote saem de
+    outro prompt e não devem responder o /analisar); só os misses vão para
+    o Gemini, agrupados conforme BATCH_CONFIG. Itens reenviados sozinhos
+    depois de um lote falho são gravados na chave do IMAGE_PROMPT, que é o
+    prompt que os gerou. Fotos recusadas pelo quality_gate são respondidas
+    localmente. Retorna (resultados na ordem de entrada, número de
+    chamadas feitas).
+    """
+    resultados = [None] * len(items)
+    pendentes = []
+    hashes = [_perceptual_hash_for(item) for item in items]
+    
+    for index, item in enumerate(items):
+        cached = _quality_short_circuit(item) or _lookup_cached(item, mode, BATCH_PROMPT, hashes[index])
+        if cached is not None:
+            resultados[index] = cached
         else:
-            return [{
-                "objeto": f"Erro ao processar imagem: {error_msg}",
-                "confianca": None
-            }]
\ No newline at end of file
+            pendentes.append(index)
+    
+    groups = _pack_batch(pendentes)
+    chamadas = 0
+    if not groups:
+        return resultados, chamadas
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_CONFIG['MAX_PARALLEL_REQUESTS']) as executor:
+        futures = [
+            executor.submit(_describe_group, [items[index] for index in group])
+            for group in groups
+        ]
+        
+        for group, future in zip(groups, futures):
+            group_results, group_calls, prompt = future.result()
+            chamadas += group_calls
+            for index, (resultado, cacheavel) in zip(group, group_results):
+                item = items[index]
+                # Reenvios individuais vêm do IMAGE_PROMPT: ficam na chave dele
+                if cacheavel:
+                    _store_cached(item, mode, prompt, hashes[index], resultado)
+                resultados[index] = (resultado, {"hit": False, "idade_segundos": 0})
+    
+    return resultados, chamadas
@@ -0,0 +1,293 @@
+import collections
+import concurrent.futures
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+import fitz
+import numpy as np
+from PIL import Image
+from config import OCR_CONFIG
+from services.ocr_service import TESSERACT_AVAILABLE, pytesseract
+from utils.process_pool import ProcessPool, shared_file
+
+try:
+    # Mantém o motor do tesseract carregado no processo entre as páginas
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Estado de cada processo do pool (não é usado no processo do servidor)
+_api = None
+
+
+def estimate_line_height(gray: np.ndarray) -> Optional[float]:
+    """
+    Altura mediana das linhas de texto, em pixels, pelo perfil horizontal de tinta
+
+    Linhas da imagem com pelo menos 1% de pixels escuros são texto; cada
+    sequência delas é uma linha. None se houver menos de 3 linhas.
+    """
+    ink = gray < min(160, gray.mean() * 0.75)
+    rows = ink.mean(axis=1) > 0.01
+    heights = []
+    run = 0
+    for is_text in rows:
+        if is_text:
+            run += 1
+        elif run:
+            heights.append(run)
+            run = 0
+    if run:
+        heights.append(run)
+    heights = [h for h in heights if h >= 2]
+    return float(statistics.median(heights)) if len(heights) >= 3 else None
+
+
+def choose_dpi(page) -> int:
+    """
+    DPI para o OCR a partir do tamanho do texto da página
+
+    Uma prévia em PDF_PROBE_DPI mede a altura das linhas; o DPI escolhido
+    leva essa altura a PDF_TARGET_LINE_HEIGHT_PX (texto pequeno ganha mais
+    resolução, títulos grandes menos), entre PDF_MIN_DPI e PDF_MAX_DPI.
+    Nunca passa da resolução da digitalização embutida na página.
+    """
+    probe_dpi = OCR_CONFIG['PDF_PROBE_DPI']
+    probe = page.get_pixmap(dpi=probe_dpi, colorspace=fitz.csGRAY)
+    gray = np.frombuffer(probe.samples, dtype=np.uint8).reshape(probe.height, probe.stride)[:, :probe.width]
+    line_height = estimate_line_height(gray)
+
+    if line_height is None:
+        dpi = OCR_CONFIG['PDF_DEFAULT_DPI']
+    else:
+        dpi = OCR_CONFIG['PDF_TARGET_LINE_HEIGHT_PX'] * probe_dpi / line_height
+    dpi = min(max(dpi, OCR_CONFIG['PDF_MIN_DPI']), OCR_CONFIG['PDF_MAX_DPI'])
+
+    native = [info["width"] * 72 / (info["bbox"][2] - info["bbox"][0])
+              for info in page.get_image_info() if info["bbox"][2] > info["bbox"][0]]
+    if native:
+        dpi = min(dpi, max(max(native), OCR_CONFIG['PDF_MIN_DPI']))
+    return int(round(dpi))
+
+
+def _recognize(samples: bytes, width: int, height: int, stride: int, timeout: float) -> str:
+    """
+    Roda o tesseract sobre pixels em tons de cinza (1 byte por pixel)
+
+    Com tesserocr os pixels vão direto para o motor já carregado; sem ele,
+    viram um PGM (cabeçalho + bytes crus, sem compressão) em /dev/shm que
+    o binário do tesseract lê, em vez do PNG que o pytesseract geraria.
+    Nos dois caminhos o reconhecimento para em timeout segundos e levanta
+    RuntimeError, como o pytesseract.
+    """
+    global _api
+    if tesserocr is not None:
+        if _api is None:
+            _api = tesserocr.PyTessBaseAPI(lang=OCR_CONFIG['LANG'], psm=tesserocr.PSM.SINGLE_BLOCK,
+                                           oem=tesserocr.OEM.DEFAULT)
+        _api.SetImageBytes(samples, width, height, 1, stride)
+        # Recognize(timeout) em ms: o motor abandona a página e devolve False
+        if not _api.Recognize(int(timeout * 1000)):
+            _api.Clear()
+            raise RuntimeError("Tesseract process timeout")
+        return _api.GetUTF8Text().strip()
+
+    if stride != width:
+        rows = np.frombuffer(samples, dtype=np.uint8).reshape(height, stride)[:, :width]
+        samples = rows.tobytes()
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".pgm") as image_file:
+        image_file.write(b"P5\n%d %d\n255\n" % (width, height))
+        image_file.write(samples)
+        image_file.flush()
+        return pytesseract.image_to_string(
+            image_file.name,
+            lang=OCR_CONFIG['LANG'],
+            config=OCR_CONFIG['TESSERACT_CONFIG'],
+            timeout=timeout
+        ).strip()
+
+
+def _ocr_pdf_page_task(path: str, page_number: int, timeout: float) -> Tuple[str, int, float]:
+    """Tarefa do pool: renderiza a página em tons de cinza no DPI escolhido e lê o texto"""
+    start = time.perf_counter()
+    # Abre e fecha a cada página (~3 ms, contra centenas de ms de OCR): um
+    # documento aberto no processo seguraria o arquivo de /dev/shm, já
+    # apagado, até chegar outro PDF
+    pdf_doc = fitz.open(path, filetype="pdf")
+    try:
+        page = pdf_doc.load_page(page_number)
+        dpi = choose_dpi(page)
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    finally:
+        pdf_doc.close()
+    text = _recognize(pix.samples, pix.width, pix.height, pix.stride, timeout)
+    return text, dpi, (time.perf_counter() - start) * 1000
+
+
+def _ocr_pixels_task(samples: bytes, width: int, height: int, stride: int,
+                     timeout: float) -> Tuple[str, Optional[int], float]:
+    """Tarefa do pool: lê o texto de pixels já renderizados no processo do servidor"""
+    start = time.perf_counter()
+    text = _recognize(samples, width, height, stride, timeout)
+    return text, None, (time.perf_counter() - start) * 1000
+
+
+class OcrPool:
+    """
+    OCR de páginas escaneadas e de imagens de documentos num pool de processos
+
+    - PDF_WORKERS processos ficam de pé entre as requisições (com
+      tesserocr, cada um mantém o motor carregado)
+    - A fila é limitada: no máximo PDF_MAX_QUEUE páginas entre agendadas
+      e em andamento; além disso quem chama espera uma vaga
+    - Cada página tem PDF_PAGE_TIMEOUT_SECONDS no tesseract; a que estoura
+      fica sem texto e as outras seguem
+    - Um documento tem um prazo único (request_timeout) para esperar vagas
+      e resultados de todas as páginas, em vez de um por página: com a
+      fila cheia, N páginas não esperam N vezes. As que não cabem no
+      prazo ficam sem texto e nem são agendadas
+    - Páginas de PDF são renderizadas no próprio processo do pool, a partir
+      do arquivo compartilhado, em tons de cinza e com DPI adaptado ao
+      tamanho do texto (choose_dpi)
+
+    stats() traz páginas por segundo (últimas conclusões), profundidade da
+    fila, tempo médio e DPI médio por página.
+    """
+
+    def __init__(self, workers: int, max_queue: int, page_timeout: float, request_timeout: float,
+                 window: int = 200):
+        self.pool = ProcessPool("ocr", workers)
+        self.max_queue = max_queue
+        self.page_timeout = page_timeout
+        self.request_timeout = request_timeout
+        self.slots = threading.BoundedSemaphore(max_queue)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.max_queued = 0
+        self.pages = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.rejected = 0
+        self.completed_at = collections.deque(maxlen=window)
+        self.page_ms = collections.deque(maxlen=window)
+        self.dpis = collections.deque(maxlen=window)
+
+    def _submit(self, fn, *args, deadline: float) -> Optional[concurrent.futures.Future]:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self.slots.acquire(timeout=remaining):
+            with self.lock:
+                self.rejected += 1
+            return None
+        with self.lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        try:
+            try:
+                future = self.pool.submit(fn, *args)
+            except BrokenProcessPool:
+                # Um processo morreu numa página anterior: o pool já foi descartado, tenta no novo
+                future = self.pool.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self) -> None:
+        with self.lock:
+            self.queued -= 1
+        self.slots.release()
+
+    def _collect(self, future: Optional[concurrent.futures.Future], label: str, deadline: float) -> str:
+        if future is None:
+            print(f"  OCR {label}: sem vaga na fila dentro do prazo, seguindo sem texto")
+            return ""
+        try:
+            # O timeout real é o do tesseract no processo; este só protege a requisição
+            text, dpi, page_ms = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception as e:
+            timed_out = isinstance(e, concurrent.futures.TimeoutError) or "timeout" in str(e).lower()
+            with self.lock:
+                if timed_out:
+                    self.timeouts += 1
+                else:
+                    self.errors += 1
+            print(f"  Erro no OCR {label}: {'tempo esgotado' if timed_out else e}")
+            return ""
+
+        with self.lock:
+            self.pages += 1
+            self.completed_at.append(time.monotonic())
+            self.page_ms.append(page_ms)
+            if dpi is not None:
+                self.dpis.append(dpi)
+        return text
+
+    def ocr_pdf_pages(self, file_content: bytes, page_numbers: List[int]) -> List[str]:
+        """Texto de cada página pedida (números base 0), na mesma ordem; "" quando falha"""
+        deadline = time.monotonic() + self.request_timeout
+        with shared_file(file_content, ".pdf") as path:
+            futures = []
+            try:
+                for n in page_numbers:
+                    futures.append(self._submit(_ocr_pdf_page_task, path, n, self.page_timeout, deadline=deadline))
+                return [self._collect(future, f"página {n + 1}", deadline)
+                        for future, n in zip(futures, page_numbers)]
+            finally:
+                # Páginas que nem começaram não servem mais depois que o arquivo sumir
+                for future in futures:
+                    if future is not None:
+                        future.cancel()
+
+    def ocr_page(self, page) -> str:
+        """Uma página já aberta: renderiza aqui (tons de cinza, DPI adaptado) e lê no pool"""
+        pix = page.get_pixmap(dpi=choose_dpi(page), colorspace=fitz.csGRAY)
+        deadline = time.monotonic() + self.page_timeout * 2
+        future = self._submit(_ocr_pixels_task, pix.samples, pix.width, pix.height, pix.stride,
+                              self.page_timeout, deadline=deadline)
+        return self._collect(future, f"página {page.number + 1}", deadline)
+
+    def ocr_image(self, image: Image.Image) -> str:
+        """Imagem extraída de um documento, em tons de cinza e com até MAX_SIDE de lado"""
+        gray = image.convert('L')
+        max_side = OCR_CONFIG['MAX_SIDE']
+        if max(gray.size) > max_side:
+            gray.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+        deadline = time.monotonic() + self.page_timeout * 2
+        future = self._submit(_ocr_pixels_task, gray.tobytes(), gray.width, gray.height, gray.width,
+                              OCR_CONFIG['TIMEOUT_SECONDS'], deadline=deadline)
+        return self._collect(future, "da imagem", deadline)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            rate = None
+            if len(self.completed_at) >= 2 and self.completed_at[-1] > self.completed_at[0]:
+                rate = round((len(self.completed_at) - 1) / (self.completed_at[-1] - self.completed_at[0]), 2)
+            return {
+                "tesseract_disponivel": TESSERACT_AVAILABLE,
+                "motor": "tesserocr" if tesserocr is not None else "pytesseract",
+                "processos": self.pool.workers,
+                "fila": self.queued,
+                "fila_max": self.max_queued,
+                "limite_fila": self.max_queue,
+                "paginas": self.pages,
+                "paginas_por_segundo": rate,
+                "pagina_ms_medio": round(statistics.fmean(self.page_ms), 1) if self.page_ms else None,
+                "dpi_medio": round(statistics.fmean(self.dpis)) if self.dpis else None,
+                "timeouts": self.timeouts,
+                "erros": self.errors,
+                "sem_vaga": self.rejected,
+            }
+
+
+ocr_pool = OcrPool(
+    OCR_CONFIG['PDF_WORKERS'],
+    max_queue=OCR_CONFIG['PDF_MAX_QUEUE'],
+    page_timeout=OCR_CONFIG['PDF_PAGE_TIMEOUT_SECONDS'],
+    request_timeout=OCR_CONFIG['PDF_REQUEST_TIMEOUT_SECONDS']
+)
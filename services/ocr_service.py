@@ -0,0 +1,191 @@
+import collections
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+import numpy as np
+from config import OCR_CONFIG
+from utils.image_optimizer import ImageOptimizer
+from utils.image_payload import ImagePayload
+from utils.streaming_upload import StreamedImage
+
+try:
+    import pytesseract
+    # Confere o binário e o pacote de idioma, não só o módulo Python
+    TESSERACT_AVAILABLE = OCR_CONFIG['LANG'] in pytesseract.get_languages(config='')
+except Exception:
+    pytesseract = None
+    TESSERACT_AVAILABLE = False
+
+
+class RouteStats:
+    """Latência por rota de atendimento das rotas de imagem (últimas N requisições por rota)"""
+
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.window = window
+        self.latencies: Dict[str, collections.deque] = {}
+        self.counts: Dict[str, int] = collections.Counter()
+
+    def record(self, route: str, elapsed_ms: float) -> None:
+        with self.lock:
+            self.counts[route] += 1
+            self.latencies.setdefault(route, collections.deque(maxlen=self.window)).append(elapsed_ms)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            routes = {}
+            for route, latencies in self.latencies.items():
+                ordered = sorted(latencies)
+                routes[route] = {
+                    "requisicoes": self.counts[route],
+                    "p50_ms": round(statistics.median(ordered), 1),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+                }
+            return {"tesseract_disponivel": TESSERACT_AVAILABLE, "rotas": routes}
+
+
+route_stats = RouteStats()
+
+
+def _detection_image(imagem) -> Image.Image:
+    """
+    Versão pequena (perto de DETECTION_SIZE) em tons de cinza para a triagem
+
+    Não altera a imagem recebida: reduce() e convert() devolvem cópias, e o
+    ImageOptimizer continua usando a imagem do StreamedImage depois. Um
+    ImagePayload JPEG é decodificado já reduzido (draft).
+    """
+    size = OCR_CONFIG['DETECTION_SIZE']
+    if isinstance(imagem, StreamedImage):
+        image = imagem.image
+        if image.mode not in ('L', 'RGB'):
+            # reduce() não trabalha com paleta (GIF/PNG indexado)
+            image = image.convert('L')
+        factor = max(image.size) // size
+        return (image.reduce(factor) if factor > 1 else image).convert('L')
+    return ImageOptimizer.open_reduced(ImagePayload.from_upload(imagem), (size, size), reducing_gap=1, mode='L')
+
+
+def _ocr_image(imagem) -> Image.Image:
+    """Versão em tons de cinza com até MAX_SIDE de lado para o tesseract, sem alterar o original"""
+    max_side = OCR_CONFIG['MAX_SIDE']
+    if isinstance(imagem, StreamedImage):
+        gray = imagem.image.convert('L')
+    else:
+        gray = ImageOptimizer.open_reduced(ImagePayload.from_upload(imagem), (max_side, max_side),
+                                           reducing_gap=1, mode='L')
+    if max(gray.size) > max_side:
+        gray.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+    return gray
+
+
+def text_dominance(gray: Image.Image) -> Dict[str, float]:
+    """
+    Mede, numa versão de até DETECTION_SIZE de lado, se a foto é dominada por texto
+
+    - densidade_bordas: fração de pixels com |Laplaciano| acima de
+      EDGE_THRESHOLD (traços de letras geram muitas bordas)
+    - bimodalidade: fração dos pixels nas duas faixas mais cheias de um
+      histograma de 16 faixas (papel e tinta concentram quase tudo)
+    """
+    factor = max(gray.size) // OCR_CONFIG['DETECTION_SIZE']
+    small = gray.reduce(factor) if factor > 1 else gray
+    pixels = np.asarray(small, dtype=np.float32)
+
+    laplacian = (4 * pixels[1:-1, 1:-1]
+                 - pixels[:-2, 1:-1] - pixels[2:, 1:-1]
+                 - pixels[1:-1, :-2] - pixels[1:-1, 2:])
+    histogram = np.bincount((pixels.astype(np.uint8) >> 4).ravel(), minlength=16)
+    return {
+        "densidade_bordas": round(float((np.abs(laplacian) > OCR_CONFIG['EDGE_THRESHOLD']).mean()), 3),
+        "bimodalidade": round(float(np.sort(histogram)[-2:].sum() / pixels.size), 3),
+    }
+
+
+def is_text_dominant(metricas: Dict[str, float]) -> bool:
+    return (metricas["densidade_bordas"] >= OCR_CONFIG['MIN_EDGE_DENSITY']
+            and metricas["bimodalidade"] >= OCR_CONFIG['MIN_BIMODALITY'])
+
+
+def read_text(gray: Image.Image) -> Tuple[str, float, int]:
+    """
+    Lê o texto com tesseract
+
+    Retorna (texto com uma linha por linha detectada, confiança média das
+    palavras de 0 a 100, número de palavras).
+    """
+    data = pytesseract.image_to_data(
+        gray,
+        lang=OCR_CONFIG['LANG'],
+        config=OCR_CONFIG['TESSERACT_CONFIG'],
+        output_type=pytesseract.Output.DICT,
+        timeout=OCR_CONFIG['TIMEOUT_SECONDS']
+    )
+
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    confidences = []
+    for word, conf, block, par, line in zip(data["text"], data["conf"], data["block_num"],
+                                            data["par_num"], data["line_num"]):
+        word = word.strip()
+        if not word or float(conf) < 0:
+            continue
+        lines.setdefault((block, par, line), []).append(word)
+        confidences.append(float(conf))
+
+    texto = "\n".join(" ".join(words) for words in lines.values())
+    confianca = sum(confidences) / len(confidences) if confidences else 0.0
+    return texto, confianca, len(confidences)
+
+
+def try_local_ocr(imagem) -> Tuple[Optional[List[Dict]], Dict]:
+    """
+    Triagem na frente do Gemini: fotos de rótulos, notas e placas são lidas localmente
+
+    imagem é o que o controller recebeu (StreamedImage ou ImagePayload),
+    antes do ImageOptimizer, para o tesseract ter resolução suficiente.
+    Retorna (resultado no formato de process_image_cached ou None, triagem),
+    onde triagem traz as métricas, se o OCR rodou, a confiança e o tempo de
+    cada etapa. Resultado None significa que a foto segue para o Gemini:
+    não parece texto, o OCR está desligado/indisponível ou a confiança da
+    leitura ficou abaixo de MIN_CONFIDENCE.
+    """
+    triagem = {"ocr_tentado": False}
+    if not OCR_CONFIG['ENABLED'] or not TESSERACT_AVAILABLE:
+        return None, triagem
+
+    start = time.perf_counter()
+    try:
+        metricas = text_dominance(_detection_image(imagem))
+    except Exception as e:
+        print(f"[DEBUG] Triagem de texto falhou: {e}")
+        return None, triagem
+    triagem["metricas"] = metricas
+    triagem["triagem_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    if not is_text_dominant(metricas):
+        return None, triagem
+
+    start = time.perf_counter()
+    triagem["ocr_tentado"] = True
+    try:
+        texto, confianca, palavras = read_text(_ocr_image(imagem))
+    except Exception as e:
+        # Inclui o timeout do tesseract (RuntimeError)
+        print(f"[DEBUG] OCR local falhou: {e}")
+        triagem["ocr_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return None, triagem
+    triagem["ocr_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    triagem["confianca_ocr"] = round(confianca, 1)
+    triagem["palavras"] = palavras
+
+    if palavras < OCR_CONFIG['MIN_WORDS'] or confianca < OCR_CONFIG['MIN_CONFIDENCE']:
+        print(f"[DEBUG] OCR local com baixa confiança ({confianca:.0f}, {palavras} palavras), usando Gemini")
+        return None, triagem
+
+    return [{
+        "objeto": f"Texto na imagem:\n{texto}",
+        "confianca": round(confianca / 100, 2),
+        "texto": texto
+    }], triagem
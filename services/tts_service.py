@@ -1,9 +1,12 @@
 import os
 import io
+import asyncio
 import base64
 import tempfile
 import uuid
 from google.cloud import texttospeech
+from config import ASYNC_CONFIG
+from utils.async_runtime import async_runtime
 class TTSService:
     def __init__(self):
         self.client = texttospeech.TextToSpeechClient()
@@ -237,16 +240,23 @@ def prepare_document_audio(document_text, options=None):
     prepared = tts.prepare_text_for_speech(document_text, options)
     
     chunks = tts.split_long_text(prepared["text"])
+    synthesize = tts.generate_ssml_audio if prepared["type"] == "ssml" else tts.generate_audio
+    
+    async def synthesize_all():
+        # As partes são sintetizadas em paralelo; gather preserva a ordem
+        return await asyncio.gather(*(
+            async_runtime.run_blocking("tts", synthesize, chunk) for chunk in chunks
+        ))
+    
+    if ASYNC_CONFIG['ENABLED'] and len(chunks) > 1:
+        results = async_runtime.run(synthesize_all(), timeout=ASYNC_CONFIG['UPSTREAM_TIMEOUT'])
+    else:
+        results = [synthesize(chunk) for chunk in chunks]
     
     audio_parts = []
     total_duration = 0
     
-    for i, chunk in enumerate(chunks):
-        if prepared["type"] == "ssml":
-            result = tts.generate_ssml_audio(chunk)
-        else:
-            result = tts.generate_audio(chunk)
-        
+    for i, result in enumerate(results):
         if result["sucesso"]:
             audio_parts.append({
                 "parte": i + 1,
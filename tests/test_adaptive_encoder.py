@@ -0,0 +1,89 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from config import ENCODER_PRESETS
+from utils.adaptive_encoder import encode, estimate_image_tokens, fit_size
+
+
+def make_photo(size=(1600, 1200)):
+    # Ruído em blocos de 4 px: sobrevive à redução e não comprime trivialmente
+    noise = [Image.effect_noise((size[0] // 4, size[1] // 4), 60).resize(size) for _ in range(2)]
+    gradient = Image.linear_gradient("L").resize(size)
+    return Image.merge("RGB", (noise[0], gradient, noise[1]))
+
+
+def make_screenshot(size=(1280, 800)):
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, size[0], 40), fill=(40, 60, 120))
+    for i in range(20):
+        draw.text((24, 60 + i * 25), f"Item {i:02d}  Arquivo  Editar", fill="black")
+    return image
+
+
+def decode(result):
+    return Image.open(io.BytesIO(result["data"]))
+
+
+def test_fit_size_keeps_aspect_and_single_tile_budget():
+    assert fit_size((4000, 3000), (512, 512), 258) == (384, 288)
+    assert estimate_image_tokens((384, 288)) == 258
+
+
+def test_fit_size_uses_larger_budget_when_allowed():
+    assert fit_size((4000, 3000), (512, 512), 258 * 4) == (512, 384)
+
+
+def test_fit_size_never_upscales():
+    assert fit_size((200, 100), (512, 512), 258) == (200, 100)
+
+
+def test_fit_size_panorama_stays_within_max_size():
+    assert fit_size((4000, 1000), (256, 256), 258) == (256, 64)
+
+
+def test_encode_photo_within_budget_uses_max_quality():
+    preset = {**ENCODER_PRESETS['detalhado'], 'TARGET_BYTES': 1024 * 1024}
+    result = encode(make_photo(), preset)
+
+    assert result["format"] in preset['FORMATS']
+    assert result["quality"] == preset['QUALITY_RANGE'][1]
+    assert not result["line_art"]
+    assert decode(result).size == result["image"].size == (384, 288)
+
+
+def test_encode_lowers_quality_to_fit_target_bytes():
+    generous = encode(make_photo(), {**ENCODER_PRESETS['detalhado'], 'TARGET_BYTES': 1024 * 1024})
+    target = len(generous["data"]) * 2 // 3
+    result = encode(make_photo(), {**ENCODER_PRESETS['detalhado'], 'TARGET_BYTES': target})
+
+    assert len(result["data"]) <= target
+    assert result["quality"] < generous["quality"]
+    assert result["image"].size == generous["image"].size
+
+
+def test_encode_downscales_when_minimum_quality_does_not_fit():
+    preset = {**ENCODER_PRESETS['detalhado'], 'TARGET_BYTES': 2048}
+    result = encode(make_photo(), preset)
+
+    assert result["image"].size[0] < 384
+    assert result["quality"] == preset['QUALITY_RANGE'][0] or len(result["data"]) <= 2048
+
+
+def test_encode_sends_line_art_as_png_palette():
+    result = encode(make_screenshot(), ENCODER_PRESETS['detalhado'])
+
+    assert result["format"] == "PNG"
+    assert result["line_art"]
+    assert result["quality"] is None
+    assert decode(result).mode == "P"
+
+
+def test_ultra_preset_is_single_jpeg_at_fixed_quality():
+    preset = ENCODER_PRESETS['ultra']
+    result = encode(make_photo(), preset)
+
+    assert result["format"] == "JPEG"
+    assert result["quality"] == preset['QUALITY_RANGE'][0]
+    assert max(result["image"].size) == 256
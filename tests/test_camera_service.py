@@ -0,0 +1,48 @@
+import io
+
+import pytest
+from PIL import Image, ImageFile
+
+from config import UPLOAD_CONFIG
+from services import camera_service
+from services.camera_service import CameraSession, FrameTooLarge, frame_thumbnail
+from utils.image_payload import ImagePayload
+
+
+def encode(size, fmt="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (90, 120, 150)).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setitem(UPLOAD_CONFIG, 'MAX_PIXELS', 64 * 64)
+
+
+@pytest.fixture
+def no_decode(monkeypatch):
+    def fail(self):
+        raise AssertionError("pixels decodificados antes do limite")
+    monkeypatch.setattr(ImageFile.ImageFile, "load", fail)
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_oversized_frame_rejected_from_header(small_limit, no_decode, fmt):
+    with pytest.raises(FrameTooLarge, match="65x64"):
+        frame_thumbnail(ImagePayload(encode((65, 64), fmt)))
+
+
+def test_handle_frame_reports_oversized_frame(small_limit, no_decode, monkeypatch):
+    monkeypatch.setattr(camera_service, "_call_gemini", lambda *a, **k: pytest.fail("chamou o Gemini"))
+    session = CameraSession()
+
+    events = session.handle_frame(encode((128, 128)))
+
+    assert events == [{"evento": "erro", "mensagem": "Quadro grande demais (128x128 pixels)."}]
+    assert session.reference is None
+
+
+def test_frame_at_limit_is_decoded(small_limit):
+    thumbnail = frame_thumbnail(ImagePayload(encode((64, 64))))
+    assert thumbnail.shape == (32, 32)
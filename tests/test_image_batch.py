@@ -0,0 +1,63 @@
+import io
+import types
+
+import pytest
+from PIL import Image
+
+import services.image_service as image_service
+from config import ASYNC_CONFIG
+from utils.cache import ImageCache
+from utils.image_payload import ImagePayload
+from utils.perceptual_index import PerceptualIndex
+
+
+def make_payload(seed):
+    buffer = io.BytesIO()
+    Image.effect_noise((64, 64), 40 + seed).convert("RGB").save(buffer, format="JPEG")
+    return ImagePayload(buffer.getvalue(), "image/jpeg")
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(image_service, "image_cache", ImageCache())
+    monkeypatch.setattr(image_service, "perceptual_index", PerceptualIndex())
+    monkeypatch.setitem(ASYNC_CONFIG, "ENABLED", False)
+    calls = []
+
+    def describe(payload, prompt, profile="image-detailed"):
+        calls.append(prompt)
+        return [{"objeto": "descrição individual", "confianca": None}], True
+
+    monkeypatch.setattr(image_service, "_generate_description", describe)
+    return types.SimpleNamespace(calls=calls, cache=image_service.image_cache)
+
+
+def test_batch_results_are_cached_under_the_batch_prompt(service, monkeypatch):
+    monkeypatch.setattr(image_service, "_call_gemini",
+                        lambda *args, **kwargs: types.SimpleNamespace(text='["a", "b"]'))
+    items = [make_payload(1), make_payload(2)]
+
+    resultados, chamadas = image_service.process_images_batch(items)
+    assert chamadas == 1
+    assert resultados[0][0] == [{"objeto": "a", "confianca": None}]
+    assert service.cache.get(items[0], "detalhado", image_service.BATCH_PROMPT) is not None
+    assert service.cache.get(items[0], "detalhado", image_service.IMAGE_PROMPT) is None
+
+    resultados, chamadas = image_service.process_images_batch(items)
+    assert chamadas == 0
+    assert resultados[1][1]["hit"]
+
+
+def test_fallback_results_are_cached_under_the_image_prompt(service, monkeypatch):
+    def failing_batch(*args, **kwargs):
+        raise RuntimeError("lote recusado")
+
+    monkeypatch.setattr(image_service, "_call_gemini", failing_batch)
+    items = [make_payload(1), make_payload(2)]
+
+    resultados, chamadas = image_service.process_images_batch(items)
+    assert chamadas == 3
+    assert service.calls == [image_service.IMAGE_PROMPT] * 2
+    for item in items:
+        assert service.cache.get(item, "detalhado", image_service.IMAGE_PROMPT) is not None
+        assert service.cache.get(item, "detalhado", image_service.BATCH_PROMPT) is None
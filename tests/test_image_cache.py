@@ -0,0 +1,43 @@
+import json
+import pickle
+import time
+
+from utils.cache import ImageCache
+from utils.shared_cache import SQLiteCacheBackend
+
+RESULT = [{"objeto": "Uma caneca azul sobre a mesa.", "confianca": None}]
+
+
+def test_round_trip_through_shared_backend_is_json(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+    ImageCache(backend=backend).set(b"foto", "detalhado", RESULT, "prompt")
+
+    key = ImageCache().key_for(b"foto", "detalhado", "prompt")
+    assert json.loads(backend.get(key)[0]) == RESULT
+
+    # Outro worker: LRU vazio, lê do backend
+    result, age = ImageCache(backend=backend).lookup(b"foto", "detalhado", "prompt")
+    assert result == RESULT
+    assert age >= 0
+
+
+def test_pickled_entry_is_never_unpickled(tmp_path):
+    class Explode:
+        def __reduce__(self):
+            return (exec, ("raise SystemExit('pickle executado')",))
+
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+    cache = ImageCache(backend=backend)
+    key = cache.key_for(b"foto", "detalhado", "prompt")
+    backend.set(key, pickle.dumps(Explode()), time.time())
+
+    assert cache.lookup(b"foto", "detalhado", "prompt") is None
+    assert cache.peek(b"foto", "detalhado", "prompt") is None
+
+
+def test_lookup_returns_independent_copies():
+    cache = ImageCache()
+    cache.set(b"foto", "detalhado", RESULT)
+    cache.get(b"foto", "detalhado")[0]["objeto"] = "alterado"
+
+    assert cache.get(b"foto", "detalhado") == RESULT
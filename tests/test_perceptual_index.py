@@ -0,0 +1,69 @@
+import types
+
+import utils.perceptual_index as perceptual_index_module
+from utils.perceptual_index import PerceptualIndex
+
+BASE = 0x0F0F_3C3C_A5A5_F00F
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_finds_near_duplicate_within_max_distance():
+    index = PerceptualIndex(max_distance=4)
+    index.add(BASE, "detalhado:p", {"objeto": "gato"})
+
+    result, distance, age = index.find(flip(BASE, 0, 17, 40, 63), "detalhado:p")
+    assert result == {"objeto": "gato"}
+    assert distance == 4
+    assert age >= 0
+
+
+def test_ignores_hashes_beyond_max_distance_and_other_scopes():
+    index = PerceptualIndex(max_distance=4)
+    index.add(BASE, "detalhado:p", "gato")
+
+    assert index.find(flip(BASE, 0, 10, 20, 30, 40), "detalhado:p") is None
+    assert index.find(BASE, "ultra:p") is None
+
+
+def test_returns_closest_entry():
+    index = PerceptualIndex(max_distance=4)
+    index.add(flip(BASE, 1, 2, 3), "s", "longe")
+    index.add(flip(BASE, 5), "s", "perto")
+
+    assert index.find(BASE, "s")[:2] == ("perto", 1)
+
+
+def test_returns_independent_copies():
+    index = PerceptualIndex()
+    index.add(BASE, "s", {"objeto": "gato"})
+    index.find(BASE, "s")[0]["objeto"] = "alterado"
+
+    assert index.find(BASE, "s")[0] == {"objeto": "gato"}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(perceptual_index_module, "time", types.SimpleNamespace(time=lambda: clock.now))
+    index = PerceptualIndex(ttl_seconds=60)
+    index.add(BASE, "s", "antigo")
+
+    clock.now += 59
+    assert index.find(BASE, "s")[0] == "antigo"
+
+    clock.now += 2
+    assert index.find(BASE, "s") is None
+    assert index.stats()["total_items"] == 0
+
+
+def test_oldest_entry_leaves_when_full():
+    index = PerceptualIndex(max_entries=2)
+    for n, value in enumerate((BASE, ~BASE & (2 ** 64 - 1), 0)):
+        index.add(value, "s", n)
+
+    assert index.find(BASE, "s") is None
+    assert index.find(0, "s")[0] == 2
@@ -0,0 +1,65 @@
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from config import QUALITY_GATE_CONFIG
+from utils.quality_gate import _classify, assess
+
+SHARP = QUALITY_GATE_CONFIG['MIN_SHARPNESS'] * 10
+
+
+def metrics(luminancia, contraste, nitidez=SHARP):
+    return {"luminancia": luminancia, "contraste": contraste, "nitidez": nitidez}
+
+
+@pytest.mark.parametrize("luminancia, contraste, nitidez, motivo", [
+    (130, 40, SHARP, None),
+    (8, 0.5, 1, "coberta"),
+    (250, 1, 1, "clara"),
+    (160, 0.5, 0, "uniforme"),
+    (15, 10, SHARP, "escura"),
+    (130, 40, 2, "borrada"),
+    # Página branca com texto: clara, mas com contraste, não é defeito
+    (254, 8, SHARP, None),
+])
+def test_classify(luminancia, contraste, nitidez, motivo):
+    assert _classify(metrics(luminancia, contraste, nitidez)) == motivo
+
+
+def test_bright_with_contrast_is_only_rejected_when_blurred():
+    assert _classify(metrics(250, 20, 1)) == "borrada"
+
+
+def make_scene(size=(512, 384)):
+    scene = Image.new("RGB", size, (120, 130, 140))
+    draw = ImageDraw.Draw(scene)
+    for i in range(0, size[0], 32):
+        draw.rectangle((i, 40, i + 14, size[1] - 40), fill=(30 + i % 200, 200, 90))
+    return scene
+
+
+def make_receipt(size=(384, 512)):
+    page = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(page)
+    for i in range(4):
+        draw.text((30, 40 + i * 30), f"Item {i + 1}  Total R$ 12,50", fill="black")
+    return page
+
+
+@pytest.mark.parametrize("image, aprovada, motivo", [
+    (make_scene(), True, None),
+    (make_receipt(), True, None),
+    (Image.new("RGB", (384, 384), (250, 250, 250)), False, "clara"),
+    (make_scene().filter(ImageFilter.GaussianBlur(12)), False, "borrada"),
+    (Image.new("RGB", (384, 384), (3, 3, 3)), False, "coberta"),
+])
+def test_assess(image, aprovada, motivo):
+    report = assess(image)
+    assert report["aprovada"] is aprovada
+    assert report["motivo"] == motivo
+    assert (report["mensagem"] is None) == aprovada
+
+
+@pytest.mark.parametrize("side", [256, 384, 512])
+def test_blur_is_detected_at_every_thumbnail_size(side):
+    blurred = make_scene((side, side * 3 // 4)).filter(ImageFilter.GaussianBlur(side / 40))
+    assert assess(blurred)["motivo"] == "borrada"
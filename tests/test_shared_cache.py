@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+import utils.shared_cache as shared_cache_module
+from utils.shared_cache import SQLiteCacheBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_bytes=1024 * 1024)
+
+
+def test_lease_has_a_single_owner_until_released(backend):
+    assert backend.acquire_lease("k", "worker-a", 30)
+    assert backend.lease_active("k")
+    assert not backend.acquire_lease("k", "worker-b", 30)
+
+    backend.release_lease("k", "worker-a")
+    assert not backend.lease_active("k")
+    assert backend.acquire_lease("k", "worker-b", 30)
+
+
+def test_only_the_owner_releases_the_lease(backend):
+    backend.acquire_lease("k", "worker-a", 30)
+    backend.release_lease("k", "worker-b")
+
+    assert backend.lease_active("k")
+    assert not backend.acquire_lease("k", "worker-b", 30)
+
+
+def test_expired_lease_can_be_taken_over(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache_module.time, "time", lambda: now[0])
+    backend.acquire_lease("k", "worker-a", 10)
+
+    now[0] += 11
+    assert not backend.lease_active("k")
+    assert backend.acquire_lease("k", "worker-b", 10)
+    # O dono antigo não apaga o lease novo
+    backend.release_lease("k", "worker-a")
+    assert backend.lease_active("k")
+
+
+def test_leases_are_shared_between_connections(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = SQLiteCacheBackend(path), SQLiteCacheBackend(path)
+
+    assert first.acquire_lease("k", "worker-a", 30)
+    assert second.lease_active("k")
+    assert not second.acquire_lease("k", "worker-b", 30)
+
+
+def test_set_and_get_round_trip(backend):
+    backend.set("k", b"valor", time.time())
+    assert backend.get("k")[0] == b"valor"
+    assert backend.get("outra") is None
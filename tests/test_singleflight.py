@@ -0,0 +1,46 @@
+from utils.shared_cache import SQLiteCacheBackend
+from utils.singleflight import SingleFlight
+
+
+class InterleavedBackend(SQLiteCacheBackend):
+    """Backend em que outro worker termina entre o poll() e o lease_active() do seguidor"""
+
+    def __init__(self, path, on_lease_check):
+        super().__init__(path)
+        self.on_lease_check = on_lease_check
+
+    def lease_active(self, key):
+        self.on_lease_check()
+        return super().lease_active(key)
+
+
+def test_follower_uses_result_stored_between_poll_and_lease_check(tmp_path):
+    published = {}
+
+    def leader_finishes():
+        # O líder grava o resultado e solta o lease logo antes da checagem
+        published["valor"] = "descrição do líder"
+        backend.release_lease("chave", "outro-worker")
+
+    backend = InterleavedBackend(str(tmp_path / "cache.sqlite3"), leader_finishes)
+    assert backend.acquire_lease("chave", "outro-worker", 30)
+
+    calls = []
+    flight = SingleFlight(backend=backend, lease_seconds=30, poll_interval=0)
+    value, coalesced = flight.do("chave", lambda: calls.append(1) or "chamada duplicada",
+                                 poll=lambda: published.get("valor"))
+
+    assert value == "descrição do líder"
+    assert coalesced
+    assert calls == []
+    assert not backend.lease_active("chave")
+    assert flight.stats()["coalesced_shared"] == 1
+
+
+def test_leader_calls_upstream_when_nothing_was_published(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+    flight = SingleFlight(backend=backend, lease_seconds=30, poll_interval=0)
+
+    assert flight.do("chave", lambda: "novo", poll=lambda: None) == ("novo", False)
+    assert flight.stats()["upstream_calls"] == 1
+    assert not backend.lease_active("chave")
@@ -0,0 +1,56 @@
+from services.document_service import split_into_chunks
+
+
+def make_document(pages=12, lines=30):
+    text = []
+    headings = []
+    for page in range(1, pages + 1):
+        text.append(f"--- Página {page} ---\n")
+        if page % 4 == 1:
+            title = f"Capítulo {page // 4 + 1}"
+            headings.append({"text": title, "level": 1})
+            text.append(f"{title}\n")
+        for line in range(1, lines + 1):
+            text.append(f"Linha {line} da página {page}: texto de exemplo para o resumo.\n")
+    return "".join(text), headings
+
+
+def test_short_text_is_a_single_chunk():
+    assert split_into_chunks("texto curto", max_chars=100) == ["texto curto"]
+
+
+def test_chunks_cover_the_text_in_order_within_the_limit():
+    text, headings = make_document()
+    chunks = split_into_chunks(text, headings, max_chars=4000)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= 4000 for chunk in chunks)
+
+
+def test_chunks_start_at_headings_or_page_markers():
+    text, headings = make_document()
+    titles = {heading["text"] for heading in headings}
+    for chunk in split_into_chunks(text, headings, max_chars=4000)[1:]:
+        first_line = chunk.splitlines()[0]
+        assert first_line in titles or first_line.startswith("--- Página ")
+
+
+def test_line_longer_than_limit_is_cut():
+    text = "a" * 2500 + "\n" + "b" * 100
+    chunks = split_into_chunks(text, max_chars=1000)
+
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+
+
+def test_edit_only_changes_nearby_chunks():
+    text, headings = make_document(pages=20)
+    before = split_into_chunks(text, headings, max_chars=4000)
+
+    middle = "Linha 10 da página 10:"
+    after = split_into_chunks(text.replace(middle, middle + " (editada)"), headings, max_chars=4000)
+
+    changed = [chunk for chunk in after if chunk not in before]
+    assert len(changed) == 1
+    assert middle + " (editada)" in changed[0]
@@ -0,0 +1,91 @@
+import io
+
+import pytest
+from flask import Flask, request
+from PIL import Image
+
+from utils.streaming_upload import DraftParser, UploadError, receive_image
+
+
+def make_jpeg(size=(1600, 1200)):
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    buffer = io.BytesIO()
+    Image.blend(noise, gradient, 0.5).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def feed_in_chunks(parser, data, chunk=4096):
+    for start in range(0, len(data), chunk):
+        parser.feed(data[start:start + chunk])
+    return parser.close()
+
+
+def multipart(data, boundary="limite"):
+    return (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="imagem"; filename="foto.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+
+
+def test_chunked_jpeg_is_decoded_while_fed_at_draft_scale():
+    data = make_jpeg()
+    parser = DraftParser((256, 256))
+    parser.feed(data[:4096])
+    parser.feed(data[4096:8192])
+    assert parser.decoder is not None
+
+    image = feed_in_chunks(parser, data[8192:])
+    assert parser.original_size == (1600, 1200)
+    # draft escolhe a menor escala DCT que ainda cobre o tamanho pedido
+    assert image.size == (400, 300)
+
+    reference = Image.open(io.BytesIO(data))
+    reference.draft("RGB", (256, 256))
+    assert image.tobytes() == reference.convert("RGB").tobytes()
+
+
+def test_jpeg_falls_back_to_buffered_decode_without_incremental_decoder(monkeypatch):
+    data = make_jpeg((800, 600))
+    monkeypatch.setattr(DraftParser, "_start_decoder", lambda self, im: False)
+
+    parser = DraftParser((256, 256))
+    image = feed_in_chunks(parser, data)
+    assert parser.decoder is None
+    assert image.size == (400, 300)
+
+
+def test_png_is_buffered_until_close():
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 200), "white").save(buffer, format="PNG")
+    image = feed_in_chunks(DraftParser((256, 256)), buffer.getvalue(), chunk=64)
+    assert image.size == (300, 200)
+
+
+def test_rejects_unknown_format_and_oversized_images():
+    with pytest.raises(UploadError):
+        DraftParser().feed(b"nao e uma imagem")
+
+    with pytest.raises(UploadError) as error:
+        feed_in_chunks(DraftParser(max_pixels=1000), make_jpeg((100, 100)))
+    assert error.value.status == 413
+
+
+def test_receive_image_reads_multipart_in_chunks():
+    data = make_jpeg()
+    body = multipart(data)
+    app = Flask(__name__)
+    environ = {
+        "wsgi.input": io.BytesIO(body),
+        "CONTENT_TYPE": "multipart/form-data; boundary=limite",
+        "CONTENT_LENGTH": str(len(body)),
+    }
+    with app.test_request_context("/analisar-ultra", method="POST", environ_overrides=environ):
+        streamed = receive_image(request, "imagem", (256, 256))
+
+    assert streamed.size_bytes == len(data)
+    assert streamed.filename == "foto.jpg"
+    assert streamed.original_size == (1600, 1200)
+    assert streamed.image.size == (400, 300)
+    assert streamed.incremental
@@ -0,0 +1,229 @@
+import collections
+import io
+import math
+import statistics
+import threading
+import time
+from typing import Dict, Tuple
+from PIL import Image
+import numpy as np
+from config import BATCH_CONFIG, ENCODER_CONFIG
+
+# Imagens com os dois lados até este limite custam um único bloco de tokens
+SINGLE_TILE_SIDE = 384
+
+RESAMPLING = {
+    'LANCZOS': Image.Resampling.LANCZOS,
+    'BILINEAR': Image.Resampling.BILINEAR,
+}
+
+
+def estimate_image_tokens(size: Tuple[int, int]) -> int:
+    """
+    Tokens de entrada que o Gemini cobra por uma imagem deste tamanho
+
+    Até 384px nos dois lados: um bloco (TOKENS_PER_IMAGE). Acima disso a
+    imagem é dividida em blocos de lado min(largura, altura) / 1.5, entre
+    256 e 768px, e cada bloco custa o mesmo.
+    """
+    width, height = size
+    tokens_per_tile = BATCH_CONFIG['TOKENS_PER_IMAGE']
+    if width <= SINGLE_TILE_SIDE and height <= SINGLE_TILE_SIDE:
+        return tokens_per_tile
+    unit = min(max(min(width, height) / 1.5, 256), 768)
+    return tokens_per_tile * math.ceil(width / unit) * math.ceil(height / unit)
+
+
+def fit_size(size: Tuple[int, int], max_size: Tuple[int, int], target_tokens: int) -> Tuple[int, int]:
+    """Maior tamanho com a proporção original dentro de max_size e do orçamento de tokens"""
+    width, height = size
+    scale = min(1.0, max_size[0] / width, max_size[1] / height)
+    fitted = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    if estimate_image_tokens(fitted) > target_tokens:
+        # Tenta o tamanho de um bloco; orçamentos maiores aceitam mais blocos
+        scale = min(scale, SINGLE_TILE_SIDE / max(width, height))
+        fitted = (max(1, round(width * scale)), max(1, round(height * scale)))
+        while estimate_image_tokens(fitted) > target_tokens and max(fitted) > 1:
+            fitted = (max(1, fitted[0] * 9 // 10), max(1, fitted[1] * 9 // 10))
+    return fitted
+
+
+def is_line_art(image: Image.Image) -> bool:
+    """
+    Desenhos, diagramas, capturas de tela: poucas cores cobrem quase tudo
+
+    Conta, numa amostra 64x64 (vizinho mais próximo, sem misturar cores),
+    quanto as LINE_ART_COLORS cores mais frequentes cobrem, com 5 bits por
+    canal para absorver ruído de compressão.
+    """
+    sample = np.asarray(image.resize((64, 64), Image.Resampling.NEAREST), dtype=np.uint8) >> 3
+    if sample.ndim == 3:
+        sample = sample.astype(np.int32)
+        codes = (sample[..., 0] << 10) | (sample[..., 1] << 5) | sample[..., 2]
+    else:
+        codes = sample.astype(np.int32)
+    counts = np.bincount(codes.ravel())
+    top = np.sort(counts)[-ENCODER_CONFIG['LINE_ART_COLORS']:].sum()
+    return top / codes.size >= ENCODER_CONFIG['LINE_ART_COVERAGE']
+
+
+def _save(image: Image.Image, image_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == 'WEBP':
+        # method=0 é o codificador mais rápido do libwebp
+        image.save(buffer, format='WEBP', quality=quality, method=0)
+    elif image_format == 'PNG':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def encode(image: Image.Image, preset: Dict) -> Dict:
+    """
+    Escolhe tamanho, formato e qualidade de uma imagem para um preset de ENCODER_PRESETS
+
+    1. Tamanho: o maior dentro de MAX_SIZE e de TARGET_TOKENS, mantendo a
+       proporção (fotos panorâmicas não pagam blocos extras).
+    2. Line art vai em PNG com paleta quando cabe em TARGET_BYTES.
+    3. Fotos: codifica na qualidade máxima em cada formato de FORMATS e
+       fica com o menor; se passar de TARGET_BYTES, busca (bissecção) a
+       maior qualidade que cabe. Os bytes da primeira tentativa medem a
+       complexidade do conteúdo. Se nem a qualidade mínima cabe, reduz o
+       tamanho em 25% e repete.
+
+    Retorna dict com image (a versão reduzida), data, format, quality,
+    tokens, line_art, complexity (bits por pixel na qualidade máxima),
+    attempts e encode_ms.
+    """
+    start = time.perf_counter()
+    resample = RESAMPLING[preset['RESAMPLE']]
+    size = fit_size(image.size, preset['MAX_SIZE'], preset['TARGET_TOKENS'])
+    target_bytes = preset['TARGET_BYTES']
+    quality_min, quality_max = preset['QUALITY_RANGE']
+    attempts = 0
+
+    for downscale in range(ENCODER_CONFIG['MAX_DOWNSCALES'] + 1):
+        resized = image if size == image.size else image.resize(size, resample, reducing_gap=3.0)
+
+        if downscale == 0 and is_line_art(resized):
+            # FASTOCTREE: ~4x mais rápido que o median cut e paleta tão boa em line art
+            palette = resized.quantize(ENCODER_CONFIG['PNG_PALETTE_COLORS'], method=Image.Quantize.FASTOCTREE)
+            data = _save(palette, 'PNG', 0)
+            attempts += 1
+            if len(data) <= target_bytes:
+                return _result(resized, data, 'PNG', None, True, None, attempts, start)
+
+        # Formato: o menor na qualidade máxima
+        best_format, best_data = None, None
+        for image_format in preset['FORMATS']:
+            data = _save(resized, image_format, quality_max)
+            attempts += 1
+            if best_data is None or len(data) < len(best_data):
+                best_format, best_data = image_format, data
+        complexity = len(best_data) * 8 / (size[0] * size[1])
+
+        if len(best_data) <= target_bytes:
+            return _result(resized, best_data, best_format, quality_max, False, complexity, attempts, start)
+
+        # Bissecção da qualidade: maior valor que cabe no orçamento
+        low, high = quality_min, quality_max - 1
+        chosen, chosen_quality = None, None
+        for _ in range(ENCODER_CONFIG['MAX_ATTEMPTS']):
+            if low > high:
+                break
+            quality = (low + high) // 2
+            data = _save(resized, best_format, quality)
+            attempts += 1
+            if len(data) <= target_bytes:
+                chosen, chosen_quality = data, quality
+                low = quality + 1
+            else:
+                high = quality - 1
+
+        if chosen is not None:
+            return _result(resized, chosen, best_format, chosen_quality, False, complexity, attempts, start)
+
+        if downscale == ENCODER_CONFIG['MAX_DOWNSCALES']:
+            # Orçamento inalcançável: envia o menor resultado possível
+            data = _save(resized, best_format, quality_min)
+            return _result(resized, data, best_format, quality_min, False, complexity, attempts + 1, start)
+        size = (max(1, size[0] * 3 // 4), max(1, size[1] * 3 // 4))
+
+
+def _result(image, data, image_format, quality, line_art, complexity, attempts, start) -> Dict:
+    return {
+        "image": image,
+        "data": data,
+        "format": image_format,
+        "quality": quality,
+        "tokens": estimate_image_tokens(image.size),
+        "line_art": line_art,
+        "complexity": round(complexity, 3) if complexity is not None else None,
+        "attempts": attempts,
+        "encode_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def _bucket_label(size_bytes: int) -> str:
+    previous = 0
+    for limit in ENCODER_CONFIG['HISTOGRAM_BUCKETS_KB']:
+        if size_bytes < limit * 1024:
+            return f"{previous}-{limit}KB"
+        previous = limit
+    return f">={previous}KB"
+
+
+class EncoderStats:
+    """
+    Por preset: decisões do codificador e histograma de bytes enviados vs. latência do Gemini
+
+    Cada faixa de tamanho guarda as últimas latências observadas, para
+    ajustar TARGET_BYTES/QUALITY_RANGE dos presets a partir dos dados.
+    """
+
+    def __init__(self, window: int = 500):
+        self.lock = threading.Lock()
+        self.window = window
+        self.encodings: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        self.encoded_bytes: Dict[str, int] = collections.Counter()
+        self.encode_ms: Dict[str, float] = collections.Counter()
+        self.latencies: Dict[str, Dict[str, collections.deque]] = collections.defaultdict(dict)
+        self.calls: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+
+    def record_encoding(self, preset: str, result: Dict) -> None:
+        with self.lock:
+            self.encodings[preset][result["format"]] += 1
+            self.encoded_bytes[preset] += len(result["data"])
+            self.encode_ms[preset] += result["encode_ms"]
+
+    def record_call(self, preset: str, size_bytes: int, elapsed_ms: float) -> None:
+        bucket = _bucket_label(size_bytes)
+        with self.lock:
+            self.calls[preset][bucket] += 1
+            self.latencies[preset].setdefault(bucket, collections.deque(maxlen=self.window)).append(elapsed_ms)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            presets = {}
+            for preset in set(self.encodings) | set(self.calls):
+                encoded = sum(self.encodings[preset].values())
+                histogram = {}
+                for bucket, latencies in self.latencies[preset].items():
+                    histogram[bucket] = {
+                        "chamadas": self.calls[preset][bucket],
+                        "latencia_p50_ms": round(statistics.median(latencies), 1),
+                        "latencia_media_ms": round(statistics.fmean(latencies), 1),
+                    }
+                presets[preset] = {
+                    "codificacoes": encoded,
+                    "formatos": dict(self.encodings[preset]),
+                    "bytes_medio": round(self.encoded_bytes[preset] / encoded) if encoded else None,
+                    "codificacao_ms_medio": round(self.encode_ms[preset] / encoded, 2) if encoded else None,
+                    "histograma": histogram,
+                }
+            return presets
+
+
+encoder_stats = EncoderStats()
@@ -1,67 +1,124 @@
 import asyncio
-import concurrent.futures
-from services.image_service import process_image_vision, process_image_gemini
+from config import ASYNC_CONFIG
+from services.gemini_registry import gemini_registry
+from services.image_service import (
+    IMAGE_PROMPT,
+    _error_result,
+    _interpret_response,
+    _lookup_cached,
+    _perceptual_hash_for,
+    _profile_for_mode,
+    _quality_short_circuit,
+    _store_cached,
+)
+from utils.adaptive_encoder import encoder_stats
+from utils.async_runtime import async_runtime
 from utils.cache import image_cache
+from utils.image_payload import ImagePayload
 import time
 
+
 class AsyncImageProcessor:
-    def __init__(self, max_workers: int = 3):
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
-    
-    async def process_vision_async(self, image_file):
-        """Processa Vision API de forma assíncrona"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, process_image_vision, image_file)
-    
-    async def process_gemini_async(self, image_file):
-        """Processa Gemini de forma assíncrona"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, process_image_gemini, image_file)
-    
-    async def process_with_cache(self, image_file, mode: str):
-        """Processa com cache para evitar reprocessamento"""
-        content = image_file.read()
-        image_file.seek(0)
-        
-        cached_result = image_cache.get(content, mode)
-        if cached_result:
-            return cached_result
-        
+    """
+    Processamento assíncrono de imagens no loop do worker
+
+    Várias descrições são disparadas juntas com asyncio.gather; cada chamada
+    ao Gemini usa o cliente assíncrono do SDK e respeita o semáforo do
+    upstream. Chamadas idênticas em andamento no mesmo loop são coalescidas.
+    As rotas síncronas usam os wrappers describe_all e run_parallel.
+    """
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        # Chave do cache -> Future da chamada em andamento (só acessado no loop)
+        self.pending = {}
+
+    async def _describe_upstream(self, payload, prompt, profile):
+        response = await self.runtime.limited(
+            "gemini",
+            gemini_registry.generate_async(profile, [prompt, payload.part()])
+        )
+        return _interpret_response(response)
+
+    async def process_with_cache(self, payload, mode, prompt=IMAGE_PROMPT):
+        """Processa com cache para evitar reprocessamento
+
+        Retorna (resultado, cache_info), como process_image_cached.
+        """
+        recusada = _quality_short_circuit(payload)
+        if recusada is not None:
+            return recusada
+
+        perceptual_hash = _perceptual_hash_for(payload)
+        cached = _lookup_cached(payload, mode, prompt, perceptual_hash)
+        if cached is not None:
+            return cached
+
+        key = image_cache.key_for(payload, mode, prompt)
+        pending = self.pending.get(key)
+        if pending is not None:
+            resultado = await asyncio.shield(pending)
+            return resultado, {"hit": False, "idade_segundos": 0, "coalescido": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
         start_time = time.time()
-        
-        if mode == "vision":
-            result = await self.process_vision_async(image_file)
-        elif mode == "gemini":
-            result = await self.process_gemini_async(image_file)
-        else:
-            raise ValueError(f"Modo inválido: {mode}")
-        
-        processing_time = time.time() - start_time
-        print(f"Processamento {mode}: {processing_time:.2f}s")
-        
-        image_cache.set(content, mode, result)
-        
-        return result
-    
-    async def process_parallel(self, image_file, modes: list):
-        """Processa múltiplos modos em paralelo"""
-        tasks = []
-        
-        for mode in modes:
-            image_file.seek(0)
-            content = image_file.read()
-            image_copy = type(image_file)(content)
-            
-            task = self.process_with_cache(image_copy, mode)
-            tasks.append((mode, task))
-        
+        try:
+            resultado, cacheavel = await self._describe_upstream(payload, prompt, _profile_for_mode(mode))
+            encoder_stats.record_call(mode, len(payload), (time.time() - start_time) * 1000)
+            if cacheavel:
+                _store_cached(payload, mode, prompt, perceptual_hash, resultado)
+            future.set_result(resultado)
+        except Exception as e:
+            future.set_exception(e)
+            # Evita o aviso de exceção não lida quando ninguém estava esperando
+            future.exception()
+            raise
+        finally:
+            del self.pending[key]
+
+        print(f"Processamento {mode}: {time.time() - start_time:.2f}s")
+        return resultado, {"hit": False, "idade_segundos": 0}
+
+    async def process_parallel(self, payload, modes):
+        """Processa múltiplos modos em paralelo; todos compartilham o mesmo payload"""
+        outcomes = await asyncio.gather(
+            *(self.process_with_cache(payload, mode) for mode in modes),
+            return_exceptions=True
+        )
+
         results = {}
-        for mode, task in tasks:
-            try:
-                results[mode] = await task
-            except Exception as e:
-                results[mode] = {"erro": str(e)}
-        
+        for mode, outcome in zip(modes, outcomes):
+            if isinstance(outcome, Exception):
+                results[mode] = {"erro": str(outcome)}
+            else:
+                results[mode] = outcome[0]
         return results
 
-async_processor = AsyncImageProcessor(max_workers=2)
+    async def describe_items(self, items, prompt=IMAGE_PROMPT):
+        """Descreve cada ImagePayload numa chamada própria, todas em paralelo
+
+        Retorna uma lista de (resultado, cacheavel) na ordem dos itens.
+        """
+        outcomes = await asyncio.gather(
+            *(self._describe_upstream(item, prompt, "image-detailed") for item in items),
+            return_exceptions=True
+        )
+        return [
+            (_error_result(str(outcome)), False) if isinstance(outcome, Exception) else outcome
+            for outcome in outcomes
+        ]
+
+    def describe_all(self, items, prompt=IMAGE_PROMPT):
+        """Versão síncrona de describe_items, para as rotas Flask"""
+        return self.runtime.run(self.describe_items(items, prompt), timeout=ASYNC_CONFIG['UPSTREAM_TIMEOUT'])
+
+    def run_parallel(self, image_file, modes):
+        """Versão síncrona de process_parallel, para as rotas Flask"""
+        return self.runtime.run(
+            self.process_parallel(ImagePayload.from_upload(image_file), modes),
+            timeout=ASYNC_CONFIG['UPSTREAM_TIMEOUT']
+        )
+
+
+async_processor = AsyncImageProcessor(async_runtime)
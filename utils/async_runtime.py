@@ -0,0 +1,104 @@
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+from typing import Any, Dict
+from config import ASYNC_CONFIG
+
+
+class AsyncRuntime:
+    """
+    Loop de eventos único por worker, rodando numa thread própria
+
+    As rotas Flask continuam síncronas, mas entregam as chamadas de upstream
+    para este loop e só esperam o resultado. As chamadas ao Gemini usam o
+    cliente gRPC assíncrono do SDK num único canal, sem uma thread de
+    sistema por chamada. SDKs sem API assíncrona (TTS) rodam num pool de
+    threads limitado. Cada tipo de upstream tem seu próprio semáforo.
+
+    Isto não é um servidor assíncrono: cada requisição HTTP ainda ocupa uma
+    thread do gthread bloqueada em run(), então as requisições em voo por
+    worker continuam limitadas a --threads. O loop só permite que uma
+    requisição dispare várias chamadas juntas (/analisar-modos, lotes) e
+    que as esperas não segurem um worker sync inteiro.
+
+    O loop é criado na primeira chamada dentro do worker (depois do fork do
+    gunicorn) e recriado se o processo mudar.
+    """
+
+    def __init__(self, limits: Dict[str, int], blocking_workers: int = 16):
+        self.limits = limits
+        self.blocking_workers = blocking_workers
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._semaphores = {}
+        self.in_flight = {kind: 0 for kind in limits}
+        self.completed = {kind: 0 for kind in limits}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="async-runtime", daemon=True)
+                thread.start()
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.blocking_workers, thread_name_prefix="upstream"
+                )
+                # Os semáforos pertencem ao loop em que são usados
+                self._semaphores = {kind: asyncio.Semaphore(limit) for kind, limit in self.limits.items()}
+                self._thread = thread
+                self._pid = os.getpid()
+                self._loop = loop
+        return self._loop
+
+    def run(self, coro, timeout=None) -> Any:
+        """Executa a corrotina no loop do worker e bloqueia até o resultado"""
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRuntime.run não pode ser chamado de dentro do próprio loop")
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Sem isso a chamada seguiria no loop, segurando a vaga do semáforo
+            future.cancel()
+            raise
+
+    async def limited(self, kind: str, coro) -> Any:
+        """Aguarda a corrotina respeitando o limite de concorrência do upstream"""
+        async with self._semaphores[kind]:
+            self.in_flight[kind] += 1
+            try:
+                return await coro
+            finally:
+                self.in_flight[kind] -= 1
+                self.completed[kind] += 1
+
+    async def run_blocking(self, kind: str, fn, *args, **kwargs) -> Any:
+        """Roda uma chamada síncrona de SDK no pool, limitada pelo semáforo do upstream"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        return await self.limited(kind, loop.run_in_executor(self._executor, call))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limites": dict(self.limits),
+            "em_andamento": dict(self.in_flight),
+            "concluidas": dict(self.completed)
+        }
+
+
+async_runtime = AsyncRuntime(
+    limits={
+        "gemini": ASYNC_CONFIG['GEMINI_CONCURRENCY'],
+        "tts": ASYNC_CONFIG['TTS_CONCURRENCY'],
+    },
+    blocking_workers=ASYNC_CONFIG['BLOCKING_WORKERS']
+)
@@ -1,61 +1,287 @@
+import functools
 import hashlib
+import json
+import threading
 import time
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Union
+from config import CACHE_CONFIG
+from utils.image_payload import ImagePayload, content_digest
+from utils.shared_cache import SQLiteCacheBackend
+
+# Custo aproximado da chave e da tupla de cada entrada, somado ao payload
+ENTRY_OVERHEAD_BYTES = 128
+
+
+def _dumps(result: Any) -> bytes:
+    return json.dumps(result, ensure_ascii=False).encode("utf-8")
+
+
+def _loads(blob: bytes) -> Optional[Any]:
+    """Valor gravado; None se não for JSON (ex.: entrada antiga em pickle, tratada como miss)"""
+    try:
+        return json.loads(blob)
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=64)
+def _prompt_digest(prompt: str) -> str:
+    # Os prompts são poucos e fixos: o hash de cada um é calculado uma vez
+    return hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class _CacheStripe:
+    """Fatia independente do cache: um LRU com lock e orçamento próprios"""
+
+    def __init__(self, max_bytes: int):
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[bytes, float, int]]" = OrderedDict()
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def pop_oldest(self, now: float, ttl_seconds: float) -> None:
+        """Remove a entrada menos usada recentemente (O(1))"""
+        _, (_, timestamp, size) = self.entries.popitem(last=False)
+        self.bytes_used -= size
+        if now - timestamp >= ttl_seconds:
+            self.expirations += 1
+        else:
+            self.evictions += 1
+
 
 class ImageCache:
-    def __init__(self, max_size: int = 100, ttl_seconds: int = 3600):
-        self.cache: Dict[str, Dict[str, Any]] = {}
-        self.max_size = max_size
+    """
+    Cache LRU de resultados com orçamento em bytes e TTL preguiçoso
+
+    - get/set/evict em O(1) (OrderedDict por fatia)
+    - Limite de memória em bytes, não em número de entradas
+    - Entradas expiradas só são removidas quando acessadas ou quando
+      chegam ao fim da fila do LRU; nunca há varredura
+    - Lock striping: cada fatia tem seu próprio lock, então threads
+      diferentes (gunicorn gthread) raramente disputam o mesmo lock
+
+    Os resultados são guardados serializados em JSON, o que dá o tamanho
+    exato da entrada e devolve sempre uma cópia independente a quem lê.
+    Nunca pickle: o arquivo do backend é lido de volta, e um pickle
+    adulterado executaria código no servidor.
+
+    Com um backend compartilhado (SQLiteCacheBackend), o LRU em memória vira
+    o primeiro nível: um miss local consulta o backend, que é comum a todos
+    os workers e persiste entre reinícios.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: int = 3600, stripes: int = 8,
+                 backend: Optional[SQLiteCacheBackend] = None):
+        self.max_bytes = max_bytes
         self.ttl_seconds = ttl_seconds
-    
-    def _generate_key(self, image_content: bytes, mode: str) -> str:
-        """Gera chave única baseada no conteúdo da imagem e modo"""
-        hash_obj = hashlib.md5(image_content)
-        return f"{mode}_{hash_obj.hexdigest()}"
-    
-    def get(self, image_content: bytes, mode: str) -> Optional[Dict[str, Any]]:
+        self.stripes = [_CacheStripe(max(1, max_bytes // stripes)) for _ in range(stripes)]
+        self.backend = backend
+        self.shared_hits = 0
+
+    def _generate_key(self, image_content: Union[bytes, ImagePayload], mode: str, prompt: str = "") -> str:
+        """Gera chave única baseada no conteúdo da imagem, modo e prompt
+
+        Com um ImagePayload reaproveita o digest já calculado; com bytes
+        calcula o mesmo blake2b, então as duas formas geram a mesma chave.
+        """
+        if isinstance(image_content, ImagePayload):
+            digest = image_content.digest
+        else:
+            digest = content_digest(image_content)
+        if prompt:
+            return f"{mode}_{digest}_{_prompt_digest(prompt)}"
+        return f"{mode}_{digest}"
+
+    def key_for(self, image_content: Union[bytes, ImagePayload], mode: str, prompt: str = "") -> str:
+        """Chave da entrada (digest do conteúdo + modo + prompt); também usada pelo single-flight"""
+        return self._generate_key(image_content, mode, prompt)
+
+    def _stripe_for(self, key: str) -> _CacheStripe:
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    def lookup(self, image_content: Union[bytes, ImagePayload], mode: str, prompt: str = "") -> Optional[Tuple[Any, float]]:
+        """Busca resultado no cache e retorna (resultado, idade em segundos)"""
+        key = self._generate_key(image_content, mode, prompt)
+        item = self._lookup_local(key)
+
+        if item is None and self.backend is not None:
+            item = self.backend.get(key)
+            if item is not None:
+                self.shared_hits += 1
+                self._store_local(key, item[0], item[1])
+
+        if item is None:
+            return None
+
+        blob, timestamp = item
+        result = _loads(blob)
+        if result is None:
+            return None
+        return result, time.time() - timestamp
+
+    def peek(self, image_content: Union[bytes, ImagePayload], mode: str, prompt: str = "") -> Optional[Tuple[Any, float]]:
+        """
+        Como lookup, mas sem contar hits/misses nem mexer na ordem do LRU
+
+        Para consultas repetidas de quem espera um resultado (poll do
+        single-flight), que inflariam os misses a cada intervalo.
+        """
+        key = self._generate_key(image_content, mode, prompt)
+        stripe = self._stripe_for(key)
+        with stripe.lock:
+            item = stripe.entries.get(key)
+        if item is not None and time.time() - item[1] < self.ttl_seconds:
+            item = item[:2]
+        elif self.backend is not None:
+            item = self.backend.get(key)
+            if item is not None:
+                self._store_local(key, item[0], item[1])
+        else:
+            item = None
+
+        if item is None:
+            return None
+
+        blob, timestamp = item
+        result = _loads(blob)
+        if result is None:
+            return None
+        return result, time.time() - timestamp
+
+    def _lookup_local(self, key: str) -> Optional[Tuple[bytes, float]]:
+        stripe = self._stripe_for(key)
+        now = time.time()
+
+        with stripe.lock:
+            item = stripe.entries.get(key)
+            if item is None:
+                stripe.misses += 1
+                return None
+
+            blob, timestamp, size = item
+
+            if now - timestamp >= self.ttl_seconds:
+                del stripe.entries[key]
+                stripe.bytes_used -= size
+                stripe.expirations += 1
+                stripe.misses += 1
+                return None
+
+            stripe.entries.move_to_end(key)
+            stripe.hits += 1
+
+        return blob, timestamp
+
+    def get(self, image_content: Union[bytes, ImagePayload], mode: str, prompt: str = "") -> Optional[Dict[str, Any]]:
         """Busca resultado no cache"""
-        key = self._generate_key(image_content, mode)
-        
-        if key in self.cache:
-            cached_item = self.cache[key]
-            
-            if time.time() - cached_item["timestamp"] < self.ttl_seconds:
-                print(f"Cache HIT para {mode}")
-                return cached_item["result"]
-            else:
-                del self.cache[key]
-                print(f"Cache EXPIRED para {mode}")
-        
-        print(f"Cache MISS para {mode}")
-        return None
-    
-    def set(self, image_content: bytes, mode: str, result: Dict[str, Any]) -> None:
+        cached = self.lookup(image_content, mode, prompt)
+        return cached[0] if cached else None
+
+    def set(self, image_content: Union[bytes, ImagePayload], mode: str, result: Dict[str, Any], prompt: str = "") -> None:
         """Armazena resultado no cache"""
-        key = self._generate_key(image_content, mode)
-        
-        if len(self.cache) >= self.max_size:
-            oldest_key = min(self.cache.keys(), 
-                           key=lambda k: self.cache[k]["timestamp"])
-            del self.cache[oldest_key]
-        
-        self.cache[key] = {
-            "result": result,
-            "timestamp": time.time()
-        }
-        print(f"Cache SET para {mode}")
-    
+        key = self._generate_key(image_content, mode, prompt)
+        blob = _dumps(result)
+        now = time.time()
+
+        self._store_local(key, blob, now)
+        if self.backend is not None:
+            self.backend.set(key, blob, now)
+
+    def _store_local(self, key: str, blob: bytes, timestamp: float) -> None:
+        stripe = self._stripe_for(key)
+        size = len(blob) + len(key) + ENTRY_OVERHEAD_BYTES
+
+        # Entrada maior que a fatia inteira: não vale a pena despejar tudo por ela
+        if size > stripe.max_bytes:
+            return
+
+        now = time.time()
+
+        with stripe.lock:
+            previous = stripe.entries.pop(key, None)
+            if previous is not None:
+                stripe.bytes_used -= previous[2]
+
+            while stripe.entries and stripe.bytes_used + size > stripe.max_bytes:
+                stripe.pop_oldest(now, self.ttl_seconds)
+
+            stripe.entries[key] = (blob, timestamp, size)
+            stripe.bytes_used += size
+
+    def warm_from_backend(self, limit: int = 500) -> int:
+        """Carrega no LRU local o snapshot mais recente do backend (boot)"""
+        if self.backend is None:
+            return 0
+
+        entries = self.backend.recent(limit)
+        # Do menos para o mais recente, para que o mais recente fique no fim do LRU
+        for key, blob, created in reversed(entries):
+            self._store_local(key, blob, created)
+        return len(entries)
+
     def clear(self) -> None:
         """Limpa todo o cache"""
-        self.cache.clear()
-        print("Cache limpo")
-    
+        for stripe in self.stripes:
+            with stripe.lock:
+                stripe.entries.clear()
+                stripe.bytes_used = 0
+        if self.backend is not None:
+            self.backend.clear()
+
     def stats(self) -> Dict[str, Any]:
         """Retorna estatísticas do cache"""
-        return {
-            "total_items": len(self.cache),
-            "max_size": self.max_size,
-            "ttl_seconds": self.ttl_seconds
+        totals = {
+            "total_items": 0,
+            "bytes_used": 0,
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
         }
 
-image_cache = ImageCache(max_size=50, ttl_seconds=1800)
+        for stripe in self.stripes:
+            with stripe.lock:
+                totals["total_items"] += len(stripe.entries)
+                totals["bytes_used"] += stripe.bytes_used
+                totals["hits"] += stripe.hits
+                totals["misses"] += stripe.misses
+                totals["evictions"] += stripe.evictions
+                totals["expirations"] += stripe.expirations
+
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = round(totals["hits"] / lookups, 3) if lookups else 0.0
+        totals["max_bytes"] = self.max_bytes
+        totals["ttl_seconds"] = self.ttl_seconds
+        totals["stripes"] = len(self.stripes)
+        totals["shared_hits"] = self.shared_hits
+        totals["shared"] = self.backend.stats() if self.backend is not None else None
+        return totals
+
+
+def _create_shared_backend() -> Optional[SQLiteCacheBackend]:
+    path = CACHE_CONFIG['SHARED_CACHE_PATH']
+    if not path:
+        return None
+
+    try:
+        return SQLiteCacheBackend(
+            path,
+            max_bytes=CACHE_CONFIG['SHARED_CACHE_MAX_BYTES'],
+            ttl_seconds=CACHE_CONFIG['RESULT_TTL_SECONDS']
+        )
+    except Exception as e:
+        print(f"Cache compartilhado indisponível, usando só memória: {e}")
+        return None
+
+
+image_cache = ImageCache(
+    max_bytes=CACHE_CONFIG['LOCAL_CACHE_MAX_BYTES'],
+    ttl_seconds=CACHE_CONFIG['RESULT_TTL_SECONDS'],
+    backend=_create_shared_backend()
+)
+image_cache.warm_from_backend(CACHE_CONFIG['WARM_START_ENTRIES'])
@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from config import DOCUMENT_CONFIG
+from utils.shared_cache import SQLiteCacheBackend
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Primeiro byte do valor gravado: como descomprimir (entradas antigas continuam
+# legíveis se o zstandard for instalado ou removido depois)
+CODEC_ZSTD = b"Z"
+CODEC_GZIP = b"G"
+
+
+class DocumentResultCache:
+    """
+    Cache persistente dos resultados de process_document
+
+    - Chave: SHA-256 do arquivo + tipo + opções de processamento
+      (gerar_resumo, analisar_imagens, roteamento) + versão dos prompts
+    - Valor: o resultado em JSON comprimido com zstd (se instalado) ou
+      gzip, num SQLiteCacheBackend em disco local: sobrevive a reinícios,
+      é comum a todos os workers e tem limite em bytes com despejo LRU
+    - Só resultados sem "erro" são guardados
+    - Falhas de disco ou de um valor corrompido só contam como miss
+    """
+
+    def __init__(self, backend: Optional[SQLiteCacheBackend], zstd_level: int = 3, gzip_level: int = 6):
+        self.backend = backend
+        self.zstd_level = zstd_level
+        self.gzip_level = gzip_level
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bytes_raw = 0
+        self.bytes_stored = 0
+        self.hit_ms = 0.0
+        self.errors = 0
+
+    def key_for(self, file_content: bytes, kind: str, options: Dict[str, Any], version: str) -> str:
+        digest = hashlib.sha256(file_content).hexdigest()
+        flags = ",".join(f"{name}={int(bool(value))}" for name, value in sorted(options.items()))
+        return f"doc_{kind}_{digest}_{flags}_{version}"
+
+    def _compress(self, raw: bytes) -> bytes:
+        if zstandard is not None:
+            return CODEC_ZSTD + zstandard.ZstdCompressor(level=self.zstd_level).compress(raw)
+        return CODEC_GZIP + gzip.compress(raw, compresslevel=self.gzip_level, mtime=0)
+
+    @staticmethod
+    def _decompress(blob: bytes) -> bytes:
+        codec, data = blob[:1], blob[1:]
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("entrada em zstd sem o pacote zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == CODEC_GZIP:
+            return gzip.decompress(data)
+        raise ValueError(f"codec desconhecido: {codec!r}")
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Retorna (resultado, idade em segundos) ou None"""
+        if self.backend is None:
+            return None
+
+        start = time.perf_counter()
+        item = self.backend.get(key)
+        result = None
+        if item is not None:
+            try:
+                result = json.loads(self._decompress(item[0]))
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                print(f"Entrada inválida no cache de documentos: {e}")
+
+        with self.lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.hit_ms += (time.perf_counter() - start) * 1000
+        return result, time.time() - item[1]
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        if self.backend is None or "erro" in result:
+            return
+
+        raw = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        blob = self._compress(raw)
+        self.backend.set(key, blob, time.time())
+        with self.lock:
+            self.stores += 1
+            self.bytes_raw += len(raw)
+            self.bytes_stored += len(blob)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "ativo": self.backend is not None,
+                "compressao": "zstd" if zstandard is not None else "gzip",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "hit_ms_medio": round(self.hit_ms / self.hits, 2) if self.hits else None,
+                "gravados": self.stores,
+                "taxa_compressao": round(self.bytes_raw / self.bytes_stored, 2) if self.bytes_stored else None,
+                "erros": self.errors,
+                "disco": self.backend.stats() if self.backend is not None else None,
+            }
+
+
+def _create_backend() -> Optional[SQLiteCacheBackend]:
+    path = DOCUMENT_CONFIG['RESULT_CACHE_PATH']
+    if not path:
+        return None
+
+    try:
+        return SQLiteCacheBackend(
+            path,
+            max_bytes=DOCUMENT_CONFIG['RESULT_CACHE_MAX_BYTES'],
+            ttl_seconds=DOCUMENT_CONFIG['RESULT_CACHE_TTL_SECONDS']
+        )
+    except Exception as e:
+        print(f"Cache de documentos indisponível: {e}")
+        return None
+
+
+document_cache = DocumentResultCache(_create_backend())
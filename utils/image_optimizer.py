@@ -1,41 +1,119 @@
 from PIL import Image
+import numpy as np
 import io
 import os
+from config import ENCODER_PRESETS
+from utils.adaptive_encoder import encode, encoder_stats
+from utils.image_payload import ImagePayload
+from utils.quality_gate import assess
+from utils.streaming_upload import StreamedImage
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
 
 class ImageOptimizer:
     @staticmethod
-    def optimize_for_ai(image_file, max_size=(1024, 1024), quality=85):
+    def _source(image_file):
+        """Arquivo para o Pillow e tamanho original; aceita ImagePayload, StreamedImage ou arquivo"""
+        if isinstance(image_file, ImagePayload):
+            return image_file.stream(), len(image_file)
+        if isinstance(image_file, StreamedImage):
+            return image_file, image_file.size_bytes
+        original_size = image_file.seek(0, 2)
+        image_file.seek(0)
+        return image_file, original_size
+    
+    @staticmethod
+    def _rewind(source):
+        if not isinstance(source, StreamedImage):
+            source.seek(0)
+    
+    @staticmethod
+    def open_reduced(image_file, target_size, reducing_gap=2, mode='RGB'):
         """
-        Otimiza imagem para processamento de IA
-        - Redimensiona para tamanho ideal
-        - Comprime mantendo qualidade
-        - Converte para formato eficiente
+        Abre a imagem já reduzida na decodificação quando o formato permite
+        
+        Para JPEG usa draft(): o decodificador aplica escala DCT (1/2, 1/4,
+        1/8) e entrega direto uma imagem perto de reducing_gap vezes o
+        tamanho alvo, sem decodificar os pixels que seriam descartados.
+        PNG/WebP não suportam isso e seguem pelo redimensionamento normal.
+        Com mode='L' o JPEG decodifica só a luminância.
+        
+        Um StreamedImage já chega decodificado (com draft aplicado durante o
+        upload) e só passa pela conversão de modo.
         """
-        try:
+        if isinstance(image_file, ImagePayload):
+            image_file = image_file.stream()
+        
+        if isinstance(image_file, StreamedImage):
+            image = image_file.image
+        else:
             image = Image.open(image_file)
+        
+        if image.format == 'JPEG' and image.tile:
+            image.draft(mode, (int(target_size[0] * reducing_gap), int(target_size[1] * reducing_gap)))
+        
+        if mode == 'L' and image.mode != 'L':
+            image = image.convert('L')
+        elif image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGB')
+        
+        return image
+    
+    @staticmethod
+    def encode_for_preset(image_file, preset='detalhado'):
+        """
+        Codificação adaptativa para um preset de ENCODER_PRESETS
+        
+        Em vez de tamanho e qualidade fixos, escolhe por imagem o maior
+        tamanho dentro do orçamento de tokens, o formato (JPEG/WebP para
+        fotos, PNG com paleta para line art) e a maior qualidade dentro do
+        orçamento de bytes (ver adaptive_encoder.encode). A decisão entra
+        nas estatísticas do preset.
+        
+        Retorna dict com success, "payload" (ImagePayload com dHash e
+        avaliação de qualidade), format, mime_type, tamanhos e os campos da
+        decisão: encode_quality, tokens, line_art.
+        """
+        config = ENCODER_PRESETS[preset]
+        try:
+            source, original_size = ImageOptimizer._source(image_file)
             
-            if image.mode in ('RGBA', 'LA', 'P'):
+            image = ImageOptimizer.open_reduced(
+                source, config['MAX_SIZE'], reducing_gap=config['REDUCING_GAP'],
+                mode='L' if config['GRAYSCALE'] else 'RGB'
+            )
+            if image.mode not in ('RGB', 'L'):
                 image = image.convert('RGB')
             
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+            encoded = encode(image, config)
+            ImageOptimizer._rewind(source)
+            encoder_stats.record_encoding(preset, encoded)
             
-            output_buffer = io.BytesIO()
-            image.save(output_buffer, format='JPEG', quality=quality, optimize=True)
-            output_buffer.seek(0)
-            
-            original_size = image_file.seek(0, 2)
-            image_file.seek(0)
-            optimized_size = len(output_buffer.getvalue())
-            
-            compression_ratio = (1 - optimized_size / original_size) * 100
+            thumbnail = encoded["image"]
+            perceptual_hash = ImageOptimizer.perceptual_hash(thumbnail)
+            quality_report = assess(thumbnail)
+            payload = ImagePayload(
+                encoded["data"], MIME_TYPES[encoded["format"]], thumbnail.size, perceptual_hash, quality=quality_report
+            )
             
             return {
                 "success": True,
-                "optimized_image": output_buffer,
+                "payload": payload,
+                "format": encoded["format"],
+                "mime_type": payload.mime_type,
+                "encode_quality": encoded["quality"],
+                "tokens": encoded["tokens"],
+                "line_art": encoded["line_art"],
                 "original_size": original_size,
-                "optimized_size": optimized_size,
-                "compression_ratio": round(compression_ratio, 1),
-                "new_dimensions": image.size
+                "optimized_size": len(payload),
+                "compression_ratio": round((1 - len(payload) / original_size) * 100, 1),
+                "new_dimensions": thumbnail.size,
+                "perceptual_hash": perceptual_hash,
+                "quality": quality_report
             }
             
         except Exception as e:
@@ -45,22 +123,25 @@ class ImageOptimizer:
             }
     
     @staticmethod
-    def quick_resize(image_file, target_size=(512, 512)):
+    def perceptual_hash(image):
         """
-        Redimensionamento rápido para análise preliminar
+        dHash de 64 bits da imagem (já reduzida)
+        
+        Compara cada pixel com o vizinho da direita numa versão 9x8 em tons
+        de cinza. Recompressão, EXIF e pequenas variações de enquadramento
+        mudam poucos bits, ao contrário de um hash dos bytes.
         """
+        gray = image.convert('L').resize((9, 8), Image.Resampling.BOX)
+        pixels = np.asarray(gray, dtype=np.int16)
+        bits = pixels[:, 1:] > pixels[:, :-1]
+        return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+    
+    @staticmethod
+    def perceptual_hash_from_bytes(content):
+        """dHash a partir dos bytes de uma imagem já reduzida; None se não decodificar"""
         try:
-            image = Image.open(image_file)
-            if image.mode in ('RGBA', 'LA', 'P'):
-                image = image.convert('RGB')
-            
-            image = image.resize(target_size, Image.Resampling.BILINEAR)
-            
-            output_buffer = io.BytesIO()
-            image.save(output_buffer, format='JPEG', quality=70)
-            output_buffer.seek(0)
-            
-            return output_buffer
-            
-        except Exception as e:
+            image = Image.open(io.BytesIO(content))
+            image.draft('L', (64, 64))
+            return ImageOptimizer.perceptual_hash(image)
+        except Exception:
             return None
@@ -0,0 +1,141 @@
+import hashlib
+import io
+from typing import Optional, Tuple
+from PIL import Image
+
+DIGEST_SIZE = 16
+
+_EXTENSION_MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'gif': 'image/gif'
+}
+
+
+def detect_image_signature(data) -> Optional[str]:
+    """MIME pela assinatura nos primeiros bytes; None se não for um formato aceito"""
+    head = bytes(data[:12])
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return None
+
+
+def sniff_mime_type(data, filename: Optional[str] = None) -> str:
+    """MIME pelos primeiros bytes (assinatura do formato); extensão do nome como reserva"""
+    mime_type = detect_image_signature(data)
+    if mime_type:
+        return mime_type
+    if filename:
+        return _EXTENSION_MIME_TYPES.get(filename.rsplit('.', 1)[-1].lower(), 'image/jpeg')
+    return 'image/jpeg'
+
+
+def content_digest(data) -> str:
+    """Digest blake2b (128 bits, hex) dos bytes; aceita bytes ou memoryview sem copiar"""
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+class ImagePayload:
+    """
+    Bytes de uma imagem e o que se sabe sobre eles, calculados uma única vez
+
+    Percorre o pipeline inteiro (controller -> ImageOptimizer -> cache ->
+    single-flight -> Gemini) no lugar de FileStorage/BytesIO. Antes, cada
+    etapa relia o arquivo (seek/read/getvalue), copiava os bytes e o cache
+    calculava o MD5 do mesmo conteúdo três vezes por requisição.
+
+    - data: memoryview somente leitura sobre os bytes (sem cópia)
+    - digest: blake2b do conteúdo, usado como chave do cache; calculado na
+      primeira leitura e memorizado (o upload bruto, que não vira chave,
+      nunca é hasheado)
+    - mime_type: detectado pela assinatura do formato
+    - dimensions: (largura, altura), lidas do cabeçalho quando não informadas
+    - perceptual_hash: dHash da imagem, quando quem a gerou já o calculou
+    - quality: avaliação do quality_gate feita sobre o thumbnail, quando houver
+
+    É imutável: atributos não podem ser alterados depois de criado.
+    """
+
+    __slots__ = ("_buffer", "data", "_digest", "mime_type", "filename", "perceptual_hash", "quality", "_dimensions")
+
+    def __init__(self, content: bytes, mime_type: Optional[str] = None, dimensions: Optional[Tuple[int, int]] = None,
+                 perceptual_hash: Optional[int] = None, filename: Optional[str] = None, digest: Optional[str] = None,
+                 quality: Optional[dict] = None):
+        if not isinstance(content, bytes):
+            content = bytes(content)
+        set_attr = object.__setattr__
+        set_attr(self, "_buffer", content)
+        set_attr(self, "data", memoryview(content).toreadonly())
+        set_attr(self, "_digest", digest)
+        set_attr(self, "mime_type", mime_type or sniff_mime_type(content, filename))
+        set_attr(self, "filename", filename)
+        set_attr(self, "perceptual_hash", perceptual_hash)
+        set_attr(self, "quality", quality)
+        set_attr(self, "_dimensions", tuple(dimensions) if dimensions else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ImagePayload é imutável")
+
+    def __delattr__(self, name):
+        raise AttributeError("ImagePayload é imutável")
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __repr__(self) -> str:
+        return f"ImagePayload({self.mime_type}, {len(self)} bytes, digest={self.digest[:12]})"
+
+    @classmethod
+    def from_upload(cls, upload) -> "ImagePayload":
+        """Lê um FileStorage (Flask), BytesIO ou bytes uma única vez"""
+        if isinstance(upload, ImagePayload):
+            return upload
+        if isinstance(upload, (bytes, bytearray, memoryview)):
+            return cls(upload)
+
+        stream = getattr(upload, "stream", upload)
+        try:
+            stream.seek(0)
+        except Exception:
+            pass
+        # getvalue() de um BytesIO devolve o próprio buffer quando não há cópia pendente
+        content = stream.getvalue() if hasattr(stream, "getvalue") else stream.read()
+        return cls(content, filename=getattr(upload, "filename", None))
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            object.__setattr__(self, "_digest", content_digest(self._buffer))
+        return self._digest
+
+    @property
+    def content(self) -> bytes:
+        """Os bytes originais (o mesmo objeto, sem cópia), para SDKs que exigem bytes"""
+        return self._buffer
+
+    @property
+    def dimensions(self) -> Optional[Tuple[int, int]]:
+        """(largura, altura); lidas só do cabeçalho, sem decodificar os pixels"""
+        if self._dimensions is None:
+            try:
+                with Image.open(self.stream()) as image:
+                    object.__setattr__(self, "_dimensions", image.size)
+            except Exception:
+                return None
+        return self._dimensions
+
+    def stream(self) -> io.BytesIO:
+        """Arquivo em memória para o Pillow; BytesIO sobre bytes compartilha o buffer até ser escrito"""
+        return io.BytesIO(self._buffer)
+
+    def part(self) -> dict:
+        """Parte inline da chamada ao Gemini"""
+        return {"mime_type": self.mime_type, "data": self._buffer}
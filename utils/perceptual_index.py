@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from config import CACHE_CONFIG
+
+HASH_BITS = 64
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PerceptualIndex:
+    """
+    Índice de quase-duplicatas por hash perceptual (dHash de 64 bits)
+
+    Usa multi-index hashing: o hash é dividido em max_distance + 1 blocos
+    e cada bloco tem sua própria tabela. Pelo princípio da casa dos pombos,
+    dois hashes a distância <= max_distance coincidem em pelo menos um
+    bloco inteiro, então só os candidatos desses baldes são comparados.
+    Com dezenas de milhares de entradas os baldes continuam pequenos e a
+    busca fica bem abaixo de 1 ms.
+
+    As entradas têm escopo (modo + prompt), TTL e limite de quantidade;
+    a mais antiga sai primeiro.
+    """
+
+    def __init__(self, max_distance: int = 4, max_entries: int = 20000, ttl_seconds: int = 1800):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+
+        chunk_count = max_distance + 1
+        bounds = [round(i * HASH_BITS / chunk_count) for i in range(chunk_count + 1)]
+        self._chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._tables: List[Dict[int, set]] = [{} for _ in self._chunks]
+
+        # id -> (hash, escopo, resultado serializado, timestamp)
+        self._entries: "OrderedDict[int, Tuple[int, str, bytes, float]]" = OrderedDict()
+        self._next_id = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _chunk_values(self, value: int) -> List[int]:
+        return [(value >> start) & mask for start, mask in self._chunks]
+
+    def add(self, value: int, scope: str, result: Any) -> None:
+        blob = json.dumps(result, ensure_ascii=False).encode("utf-8")
+
+        with self.lock:
+            entry_id = self._next_id
+            self._next_id += 1
+
+            self._entries[entry_id] = (value, scope, blob, time.time())
+            for table, chunk in zip(self._tables, self._chunk_values(value)):
+                table.setdefault(chunk, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove_oldest()
+
+    def _remove_oldest(self) -> None:
+        entry_id, (value, _, _, _) = self._entries.popitem(last=False)
+        for table, chunk in zip(self._tables, self._chunk_values(value)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[chunk]
+
+    def find(self, value: int, scope: str) -> Optional[Tuple[Any, int, float]]:
+        """Retorna (resultado, distância, idade em segundos) do vizinho mais próximo"""
+        now = time.time()
+        best = None
+
+        with self.lock:
+            # Entradas expiradas saem pela ponta antiga da fila, sem varredura
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if now - oldest[3] < self.ttl_seconds:
+                    break
+                self._remove_oldest()
+
+            candidates = set()
+            for table, chunk in zip(self._tables, self._chunk_values(value)):
+                bucket = table.get(chunk)
+                if bucket:
+                    candidates.update(bucket)
+
+            for entry_id in candidates:
+                entry_value, entry_scope, blob, timestamp = self._entries[entry_id]
+                if entry_scope != scope:
+                    continue
+                distance = hamming_distance(value, entry_value)
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (blob, distance, now - timestamp)
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        blob, distance, age = best
+        return json.loads(blob), distance, age
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "total_items": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "max_distance": self.max_distance,
+                "max_entries": self.max_entries
+            }
+
+
+perceptual_index = PerceptualIndex(
+    max_distance=CACHE_CONFIG['NEAR_DUPLICATE_MAX_DISTANCE'],
+    max_entries=CACHE_CONFIG['NEAR_DUPLICATE_MAX_ENTRIES'],
+    ttl_seconds=CACHE_CONFIG['RESULT_TTL_SECONDS']
+)
@@ -0,0 +1,127 @@
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+
+@contextlib.contextmanager
+def shared_file(data: bytes, suffix: str = "") -> Iterator[str]:
+    """
+    Bytes grandes num arquivo que os processos do pool reabrem pelo caminho
+
+    Fica em /dev/shm (memória) quando existe; assim as tarefas recebem só
+    o caminho, sem copiar os bytes por pickle para cada processo. O
+    arquivo é apagado na saída do bloco.
+    """
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=suffix) as shared:
+        shared.write(data)
+        shared.flush()
+        yield shared.name
+
+
+class ProcessPool:
+    """
+    Pool de processos por worker, para trabalho de CPU que segura o GIL
+
+    Criado na primeira chamada dentro do worker (depois do fork do
+    gunicorn) e recriado se o processo mudar ou se um processo filho
+    morrer (BrokenProcessPool). Os filhos são iniciados com "spawn": o
+    worker tem threads (gthread, loop assíncrono, gRPC) e um fork no meio
+    delas pode herdar locks travados.
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self.tasks = 0
+        self.restarts = 0
+
+    def _ensure_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                self._pid = os.getpid()
+        return self._executor
+
+    def _reset(self, executor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable, *args) -> concurrent.futures.Future:
+        """Agenda fn(*args) e devolve o Future; um pool quebrado é descartado e o erro sobe"""
+        executor = self._ensure_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise
+        self.tasks += 1
+        return future
+
+    def map_ordered(self, fn: Callable, tasks: Sequence[tuple], timeout: float = None) -> List[Any]:
+        """
+        Executa fn(*args) para cada tupla de tasks em paralelo
+
+        Retorna os resultados na ordem de tasks. timeout vale para o
+        conjunto, não para cada tarefa. Em timeout ou erro de uma tarefa, as
+        que ainda estão na fila são canceladas (as que já rodam terminam no
+        processo filho, sem ninguém esperar) e o erro sobe. Se o pool
+        quebrar, ele é descartado (a próxima chamada cria outro) e o erro
+        sobe para quem chamou decidir o fallback.
+        """
+        executor = self._ensure_executor()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = []
+        try:
+            futures = [executor.submit(fn, *args) for args in tasks]
+            self.tasks += len(futures)
+            return [
+                future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+                for future in futures
+            ]
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def warm_up(self) -> None:
+        """Sobe os processos filhos antes da primeira requisição (spawn leva ~1 s)"""
+        executor = self._ensure_executor()
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "nome": self.name,
+            "processos": self.workers,
+            "ativo": self._executor is not None and self._pid == os.getpid(),
+            "tarefas": self.tasks,
+            "reinicios": self.restarts
+        }
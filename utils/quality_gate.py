@@ -0,0 +1,88 @@
+from typing import Dict, Optional
+from PIL import Image
+import numpy as np
+from config import QUALITY_GATE_CONFIG
+
+MESSAGES = {
+    "coberta": "A imagem está toda escura. A lente pode estar coberta pelo dedo ou pela capa; verifique e tente de novo.",
+    "escura": "Imagem muito escura. Tente acender uma luz ou se aproximar de uma janela.",
+    "clara": "Imagem muito clara, quase toda branca. Evite apontar a câmera diretamente para uma luz.",
+    "uniforme": "A imagem não mostra detalhes, parece uma superfície lisa. Afaste um pouco o celular e aponte para o objeto.",
+    "borrada": "Imagem muito borrada. Segure o celular firme por um instante e tente de novo.",
+}
+
+
+def measure(image: Image.Image) -> Dict[str, float]:
+    """
+    Métricas de qualidade de uma imagem já reduzida (thumbnail do otimizador)
+
+    Converte para tons de cinza, reduz por média (BOX) para ANALYSIS_SIZE
+    de lado e calcula:
+    - luminancia: média (0-255)
+    - contraste: desvio padrão da luminância
+    - nitidez: variância do Laplaciano (4 vizinhos); bordas nítidas dão
+      valores altos, desfoque de movimento ou de foco dá valores baixos
+    """
+    gray = image if image.mode == 'L' else image.convert('L')
+    # Sempre na mesma escala (lado maior = ANALYSIS_SIZE): a nitidez depende
+    # da resolução, e thumbnails de 384 e 512 px teriam limiares diferentes
+    scale = QUALITY_GATE_CONFIG['ANALYSIS_SIZE'] / max(gray.size)
+    if scale < 1:
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.Resampling.BOX)
+
+    pixels = np.asarray(gray, dtype=np.float32)
+    if min(pixels.shape) < 3:
+        return {"luminancia": round(float(pixels.mean()), 1), "contraste": round(float(pixels.std()), 1), "nitidez": 0.0}
+
+    laplacian = (4 * pixels[1:-1, 1:-1]
+                 - pixels[:-2, 1:-1] - pixels[2:, 1:-1]
+                 - pixels[1:-1, :-2] - pixels[1:-1, 2:])
+    return {
+        "luminancia": round(float(pixels.mean()), 1),
+        "contraste": round(float(pixels.std()), 1),
+        "nitidez": round(float(laplacian.var()), 1),
+    }
+
+
+def _classify(metricas: Dict[str, float]) -> Optional[str]:
+    config = QUALITY_GATE_CONFIG
+    luminancia, contraste = metricas["luminancia"], metricas["contraste"]
+
+    if contraste < config['MIN_CONTRAST']:
+        # Quadro praticamente de uma cor só: lente tampada, parede, teto
+        if luminancia < config['MIN_LUMINANCE']:
+            return "coberta"
+        if luminancia > config['MAX_LUMINANCE']:
+            return "clara"
+        return "uniforme"
+    if luminancia < config['MIN_LUMINANCE']:
+        return "escura"
+    # Claro com contraste é página branca, recibo ou captura de tela com texto:
+    # o brilho só é defeito no quadro estourado (contraste baixo, acima)
+    if metricas["nitidez"] < config['MIN_SHARPNESS']:
+        return "borrada"
+    return None
+
+
+def assess(image: Image.Image) -> Optional[Dict]:
+    """
+    Avalia se vale a pena enviar a foto ao Gemini
+
+    Retorna None com QUALITY_GATE_CONFIG['ENABLED'] desligado; senão um dict:
+    - aprovada: False quando a foto deve ser recusada localmente
+    - motivo: "coberta", "escura", "clara", "uniforme" ou "borrada" (None se aprovada)
+    - mensagem: orientação acessível para o usuário refazer a foto
+    - metricas: luminancia, contraste e nitidez medidos
+    """
+    if not QUALITY_GATE_CONFIG['ENABLED']:
+        return None
+
+    metricas = measure(image)
+    motivo = _classify(metricas)
+    return {
+        "aprovada": motivo is None,
+        "motivo": motivo,
+        "mensagem": MESSAGES.get(motivo),
+        "metricas": metricas,
+    }
@@ -0,0 +1,218 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Só regrava o horário de acesso se o último tiver mais que isso,
+# para que leituras frequentes não virem uma escrita cada
+ACCESS_UPDATE_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta(name, value) VALUES ('bytes_used', 0);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'bytes_used';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'bytes_used';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE meta SET value = value - OLD.size + NEW.size WHERE name = 'bytes_used';
+END;
+"""
+
+
+class SQLiteCacheBackend:
+    """
+    Backend de cache compartilhado entre processos (workers do gunicorn)
+
+    - Arquivo SQLite local em modo WAL: leitores não bloqueiam o escritor
+    - Sobrevive a reinícios; o ImageCache usa recent() para se aquecer no boot
+    - Limite em bytes com despejo LRU pela coluna accessed (indexada)
+    - Não depende de nenhum serviço externo
+    - Também guarda leases curtos usados pelo single-flight entre workers
+
+    Cada thread tem sua própria conexão. Falhas do SQLite nunca derrubam a
+    requisição: o backend apenas se comporta como um miss.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: int = 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self.errors = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Retorna (valor serializado, timestamp de criação) ou None"""
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created, accessed FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created, accessed = row
+            now = time.time()
+
+            if now - created >= self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+
+            if now - accessed > ACCESS_UPDATE_INTERVAL:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+
+            return value, created
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Erro no cache compartilhado (get): {e}")
+            return None
+
+    def set(self, key: str, value: bytes, created: float) -> None:
+        """Grava a entrada e despeja as menos acessadas se passar do limite"""
+        size = len(value) + len(key)
+        if size > self.max_bytes:
+            return
+
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # UPSERT em vez de INSERT OR REPLACE: o REPLACE não dispara o
+                # trigger de DELETE e deixaria bytes_used errado
+                conn.execute(
+                    "INSERT INTO entries(key, value, created, accessed, size) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                    "created = excluded.created, accessed = excluded.accessed, "
+                    "size = excluded.size",
+                    (key, value, created, created, size)
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Erro no cache compartilhado (set): {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        bytes_used = conn.execute("SELECT value FROM meta WHERE name = 'bytes_used'").fetchone()[0]
+        while bytes_used > self.max_bytes:
+            # Lotes pequenos pelo índice de accessed, sem varrer a tabela
+            conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed LIMIT 16)"
+            )
+            remaining = conn.execute("SELECT value FROM meta WHERE name = 'bytes_used'").fetchone()[0]
+            if remaining == bytes_used:
+                break
+            bytes_used = remaining
+
+    def recent(self, limit: int) -> List[Tuple[str, bytes, float]]:
+        """Entradas válidas mais recentemente acessadas (snapshot para o boot)"""
+        try:
+            conn = self._connection()
+            return conn.execute(
+                "SELECT key, value, created FROM entries WHERE created > ? "
+                "ORDER BY accessed DESC LIMIT ?",
+                (time.time() - self.ttl_seconds, limit)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Erro no cache compartilhado (recent): {e}")
+            return []
+
+    def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """Tenta pegar o lease da chave; só um dono por vez até expirar"""
+        now = time.time()
+        try:
+            cursor = self._connection().execute(
+                "INSERT INTO leases(key, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.expires < ?",
+                (key, owner, now + ttl_seconds, now)
+            )
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Erro no cache compartilhado (lease): {e}")
+            # Sem lease confiável, cada worker segue por conta própria
+            return True
+
+    def lease_active(self, key: str) -> bool:
+        try:
+            row = self._connection().execute(
+                "SELECT expires FROM leases WHERE key = ?", (key,)
+            ).fetchone()
+            return row is not None and row[0] > time.time()
+        except sqlite3.Error:
+            return False
+
+    def release_lease(self, key: str, owner: str) -> None:
+        try:
+            self._connection().execute(
+                "DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner)
+            )
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Erro no cache compartilhado (lease): {e}")
+
+    def clear(self) -> None:
+        try:
+            self._connection().execute("DELETE FROM entries")
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Erro no cache compartilhado (clear): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            conn = self._connection()
+            total_items = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            bytes_used = conn.execute("SELECT value FROM meta WHERE name = 'bytes_used'").fetchone()[0]
+        except sqlite3.Error:
+            total_items, bytes_used = None, None
+
+        return {
+            "path": self.path,
+            "total_items": total_items,
+            "bytes_used": bytes_used,
+            "max_bytes": self.max_bytes,
+            "errors": self.errors
+        }
@@ -0,0 +1,131 @@
+import copy
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+from config import CACHE_CONFIG
+from utils.cache import image_cache
+from utils.shared_cache import SQLiteCacheBackend
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas simultâneas (single-flight)
+
+    A primeira requisição para uma chave faz a chamada ao upstream; as
+    duplicadas que chegam enquanto ela está em andamento esperam e recebem
+    uma cópia do mesmo resultado.
+
+    - No mesmo processo: um Event por chave em andamento
+    - Entre workers (quando há backend compartilhado): um lease curto no
+      SQLite. Quem não conseguiu o lease consulta poll() até o resultado
+      aparecer no cache compartilhado; se o lease expirar antes disso, faz
+      a chamada por conta própria.
+    """
+
+    def __init__(self, backend: Optional[SQLiteCacheBackend] = None, lease_seconds: float = 15,
+                 poll_interval: float = 0.05):
+        self.backend = backend
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.calls: Dict[str, _Call] = {}
+
+        self.leaders = 0
+        self.coalesced_local = 0
+        self.coalesced_shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any], poll: Optional[Callable[[], Any]] = None) -> Tuple[Any, bool]:
+        """
+        Executa fn() uma vez por chave em andamento
+
+        poll() deve devolver o resultado já publicado por outro worker (ou
+        None). Retorna (valor, coalescido).
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = _Call()
+                self.calls[key] = call
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            with self.lock:
+                self.coalesced_local += 1
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.value), True
+
+        try:
+            value, coalesced = self._run_across_workers(key, fn, poll)
+            call.value = value
+            return copy.deepcopy(value), coalesced
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def _run_across_workers(self, key, fn, poll):
+        if self.backend is None or poll is None:
+            return self._lead(fn), False
+
+        while not self.backend.acquire_lease(key, self.owner, self.lease_seconds):
+            # Outro worker está chamando o upstream: espera o resultado dele
+            deadline = time.time() + self.lease_seconds
+            while time.time() < deadline:
+                time.sleep(self.poll_interval)
+                value = poll()
+                if value is not None:
+                    with self.lock:
+                        self.coalesced_shared += 1
+                    return value, True
+                if not self.backend.lease_active(key):
+                    break
+
+        try:
+            # O líder anterior pode ter gravado e soltado o lease entre o
+            # último poll() e lease_active(): confere antes de chamar de novo
+            value = poll()
+            if value is not None:
+                with self.lock:
+                    self.coalesced_shared += 1
+                return value, True
+            return self._lead(fn), False
+        finally:
+            self.backend.release_lease(key, self.owner)
+
+    def _lead(self, fn):
+        with self.lock:
+            self.leaders += 1
+        return fn()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "upstream_calls": self.leaders,
+                "coalesced_local": self.coalesced_local,
+                "coalesced_shared": self.coalesced_shared,
+                "in_flight": len(self.calls)
+            }
+
+
+image_singleflight = SingleFlight(
+    backend=image_cache.backend,
+    lease_seconds=CACHE_CONFIG['SINGLE_FLIGHT_LEASE_SECONDS'],
+    poll_interval=CACHE_CONFIG['SINGLE_FLIGHT_POLL_SECONDS']
+)
@@ -0,0 +1,286 @@
+import io
+import time
+from typing import Dict, Optional, Tuple
+from PIL import Image, ImageFile
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from config import UPLOAD_CONFIG
+from utils.image_payload import detect_image_signature
+
+# Formatos cujo cabeçalho o Pillow consegue ler com o arquivo incompleto
+INCREMENTAL_FORMATS = ('image/jpeg', 'image/png')
+
+# Campos de texto do formulário (ex.: stream=true) são pequenos
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(Exception):
+    """Upload recusado; status é o código HTTP a devolver"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class DraftParser(ImageFile.Parser):
+    """
+    ImageFile.Parser que aplica draft() antes de criar o decodificador
+
+    O Parser do Pillow abre a imagem assim que o cabeçalho chega e já cria o
+    decodificador no tamanho cheio, sem chance de pedir a escala DCT. Aqui a
+    abertura é feita por nós: valida as dimensões (limite de pixels), chama
+    draft() e monta o decodificador no tamanho reduzido. Daí em diante o
+    Parser original decodifica cada trecho conforme ele chega.
+
+    Formatos sem decodificação incremental no Pillow (PNG, WebP, GIF)
+    ficam acumulados e são decodificados no close(), como no Parser original.
+
+    Montar o decodificador exige a mesma API interna que o Parser usa
+    (load_prepare, Image._getdecoder), por isso o Pillow fica fixo em
+    requirements.txt e tests/test_streaming_upload.py cobre JPEG em
+    trechos. Se uma versão nova mudar essa API, o JPEG cai no caminho
+    acumulado (draft() no close()) em vez de falhar.
+    """
+
+    def __init__(self, draft_size: Optional[Tuple[int, int]] = None, draft_mode: str = 'RGB',
+                 max_pixels: Optional[int] = None, max_header_bytes: Optional[int] = None):
+        super().__init__()
+        self.draft_size = draft_size
+        self.draft_mode = draft_mode
+        self.max_pixels = max_pixels
+        self.max_header_bytes = max_header_bytes
+        self.original_size = None
+        self.pending = []
+        self.buffer_all = False
+
+    def feed(self, data: bytes) -> None:
+        if self.buffer_all or (self.image is not None and self.decoder is None and not self.finished):
+            # Sem decodificação incremental: acumula sem concatenar a cada trecho
+            self.pending.append(data)
+            return
+        if self.image is not None or self.finished:
+            return super().feed(data)
+
+        self.data = data if self.data is None else self.data + data
+        if len(self.data) < 12:
+            return
+
+        signature = detect_image_signature(self.data)
+        if signature is None:
+            raise UploadError("Formato de imagem inválido. Use JPG, PNG ou WebP.")
+        if signature not in INCREMENTAL_FORMATS:
+            # O Pillow só abre WebP/GIF com o arquivo inteiro
+            self.buffer_all = True
+            self.pending.append(self.data)
+            self.data = None
+            return
+
+        try:
+            with io.BytesIO(self.data) as fp:
+                im = Image.open(fp)
+        except OSError:
+            # Cabeçalho ainda incompleto
+            if self.max_header_bytes and len(self.data) > self.max_header_bytes:
+                raise UploadError("Não foi possível identificar a imagem enviada.")
+            return
+
+        self._check_and_draft(im)
+
+        # JpegImageFile define load_read só para completar arquivos sem EOI, o
+        # que faz o Parser original nunca decodificar JPEG em trechos
+        custom_load = hasattr(im, "load_seek") or (hasattr(im, "load_read") and im.format != 'JPEG')
+        if not custom_load and len(im.tile) == 1 and self._start_decoder(im):
+            if self.offset <= len(self.data):
+                self.data = self.data[self.offset:]
+                self.offset = 0
+
+        self.image = im
+        if self.decoder and self.data:
+            # Processa o que já chegou além do cabeçalho
+            pending, self.data = self.data, None
+            super().feed(pending)
+        elif not self.decoder:
+            self.pending.append(self.data)
+            self.data = None
+
+    def _start_decoder(self, im) -> bool:
+        """Decodificador no tamanho já reduzido, como no Parser.feed; False se a API interna mudou"""
+        try:
+            decoder_name, extents, offset, args = im.tile[0]
+            im.load_prepare()
+            decoder = Image._getdecoder(im.mode, decoder_name, args, im.decoderconfig)
+            decoder.setimage(im.im, extents)
+        except (AttributeError, TypeError, ValueError) as e:
+            print(f"Decodificação incremental indisponível ({e}), acumulando o upload")
+            return False
+        im.tile = []
+        self.decoder = decoder
+        self.offset = offset
+        return True
+
+    def _check_and_draft(self, im) -> None:
+        """Recusa imagens acima do limite de pixels e pede a escala DCT (JPEG)"""
+        self.original_size = im.size
+        if self.max_pixels and im.size[0] * im.size[1] > self.max_pixels:
+            raise UploadError(f"Imagem grande demais ({im.size[0]}x{im.size[1]} pixels).", 413)
+        if self.draft_size and im.format == 'JPEG':
+            im.draft(self.draft_mode, self.draft_size)
+
+    def close(self) -> Image.Image:
+        if self.decoder:
+            return super().close()
+
+        # Sem decodificação incremental: abre com o arquivo inteiro
+        data = b"".join(self.pending) if self.pending else (self.data or b"")
+        self.data, self.pending = None, []
+        image = Image.open(io.BytesIO(data))
+        self._check_and_draft(image)
+        image.load()
+        self.image = image
+        return image
+
+
+class StreamedImage:
+    """
+    Imagem recebida e decodificada durante o upload
+
+    - image: imagem do Pillow já decodificada (reduzida por draft quando JPEG)
+    - size_bytes: bytes do arquivo recebidos
+    - original_size: dimensões declaradas no cabeçalho
+    - fields: demais campos de texto do formulário
+    - incremental: se a decodificação aconteceu durante a transferência
+    """
+
+    def __init__(self, image, size_bytes, original_size, fields, filename, incremental, upload_ms, tail_ms):
+        self.image = image
+        self.size_bytes = size_bytes
+        self.original_size = original_size
+        self.fields = fields
+        self.filename = filename
+        self.incremental = incremental
+        self.upload_ms = upload_ms
+        self.tail_ms = tail_ms
+
+    def stats(self) -> Dict:
+        return {
+            "bytes_recebidos": self.size_bytes,
+            "dimensoes_originais": self.original_size,
+            "decodificacao_incremental": self.incremental,
+            "tempo_upload_ms": round(self.upload_ms, 1),
+            # O que sobra de decodificação depois do último byte
+            "tempo_apos_upload_ms": round(self.tail_ms, 1)
+        }
+
+
+def wants_incremental_upload(request) -> bool:
+    """Só multipart ainda não lido pelo Flask pode ser consumido em trechos"""
+    return (UPLOAD_CONFIG['INCREMENTAL_DECODE']
+            and request.mimetype == 'multipart/form-data'
+            and 'form' not in request.__dict__)
+
+
+def receive_image(request, field: str = "imagem", draft_size: Optional[Tuple[int, int]] = None,
+                  draft_mode: str = 'RGB') -> StreamedImage:
+    """
+    Lê o corpo multipart em trechos e decodifica o campo de imagem enquanto chega
+
+    O corpo é lido de request.stream em blocos de UPLOAD_CONFIG['CHUNK_BYTES']
+    e cada trecho do arquivo vai direto para o DraftParser; os bytes do
+    arquivo não são guardados. Recusa com UploadError corpos acima de
+    MAX_BODY_BYTES (pelo Content-Length, antes de ler, ou pela contagem, em
+    uploads chunked), formatos desconhecidos e imagens acima de MAX_PIXELS.
+
+    Depois desta chamada request.form/request.files ficam vazios; os campos
+    de texto estão em StreamedImage.fields.
+    """
+    max_body = UPLOAD_CONFIG['MAX_BODY_BYTES']
+    if request.content_length is not None and request.content_length > max_body:
+        raise UploadError(f"Arquivo maior que o limite de {max_body // (1024 * 1024)} MB", 413)
+
+    _, options = parse_options_header(request.headers.get("Content-Type", ""))
+    boundary = options.get("boundary")
+    if not boundary:
+        raise UploadError("Requisição multipart sem boundary")
+
+    # Limita o buffer interno do decodificador multipart a poucos trechos
+    decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=4 * UPLOAD_CONFIG['CHUNK_BYTES'])
+    parser = None
+    fields, filename = {}, None
+    # Parte atual: o arquivo de imagem, um campo de texto ou algo ignorado
+    current, in_image, text_parts = None, False, None
+    received, file_bytes = 0, 0
+    decoded_during_upload = False
+    start = time.perf_counter()
+
+    try:
+        finished = False
+        while not finished:
+            chunk = request.stream.read(UPLOAD_CONFIG['CHUNK_BYTES'])
+            received += len(chunk)
+            if received > max_body:
+                raise UploadError(f"Arquivo maior que o limite de {max_body // (1024 * 1024)} MB", 413)
+            decoder.receive_data(chunk or None)
+
+            event = decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, File):
+                    current, text_parts = event.name, None
+                    in_image = event.name == field and parser is None
+                    if in_image:
+                        filename = event.filename
+                        parser = DraftParser(
+                            draft_size, draft_mode,
+                            UPLOAD_CONFIG['MAX_PIXELS'], UPLOAD_CONFIG['MAX_HEADER_BYTES']
+                        )
+                elif isinstance(event, Field):
+                    current, in_image, text_parts = event.name, False, []
+                elif isinstance(event, Data):
+                    if in_image:
+                        file_bytes += len(event.data)
+                        parser.feed(event.data)
+                        decoded_during_upload = decoded_during_upload or (parser.decoder is not None and event.more_data)
+                        in_image = event.more_data
+                    elif text_parts is not None:
+                        text_parts.append(event.data)
+                        if sum(len(part) for part in text_parts) > MAX_FIELD_BYTES:
+                            raise UploadError(f"Campo {current} grande demais", 413)
+                        if not event.more_data:
+                            fields[current] = b"".join(text_parts).decode("utf-8", "replace")
+                            text_parts = None
+                elif isinstance(event, Epilogue):
+                    finished = True
+                    break
+                event = decoder.next_event()
+
+            if not chunk:
+                break
+    except RequestEntityTooLarge:
+        raise UploadError("Corpo multipart malformado ou grande demais", 413)
+    except ValueError as e:
+        raise UploadError(f"Corpo multipart inválido: {e}")
+    except OSError:
+        # Erro do decodificador no meio do arquivo
+        raise UploadError("Formato de imagem inválido. Use JPG, PNG ou WebP.")
+
+    upload_ms = (time.perf_counter() - start) * 1000
+
+    if parser is None or file_bytes == 0:
+        raise UploadError("Nenhuma imagem foi enviada")
+
+    try:
+        image = parser.close()
+    except OSError:
+        raise UploadError("Formato de imagem inválido. Use JPG, PNG ou WebP.")
+    tail_ms = (time.perf_counter() - start) * 1000 - upload_ms
+
+    return StreamedImage(
+        image=image,
+        size_bytes=file_bytes,
+        original_size=parser.original_size or image.size,
+        fields=fields,
+        filename=filename,
+        incremental=decoded_during_upload,
+        upload_ms=upload_ms,
+        tail_ms=tail_ms
+    )